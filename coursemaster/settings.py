@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 
 from pathlib import Path
 from decouple import config
+from django.core.exceptions import ImproperlyConfigured
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -44,6 +45,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'courses.profiling.SQLProfilingMiddleware',  # Выключен, пока SQL_PROFILING_ENABLED=False
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -76,13 +78,51 @@ WSGI_APPLICATION = 'coursemaster.wsgi.application'
 
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
-
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+#
+# DB_ENGINE=sqlite (по умолчанию) - один узел: WAL, busy_timeout,
+# synchronous=NORMAL (PRAGMA применяются в courses/signals.py).
+# DB_ENGINE=postgresql - продакшен: постоянные соединения (DB_CONN_MAX_AGE)
+# с проверкой перед использованием; пул - PgBouncer перед PostgreSQL
+# (DB_PGBOUNCER=True отключает серверные курсоры, несовместимые с
+# transaction pooling). Требует psycopg2.
+
+DB_ENGINE = config('DB_ENGINE', default='sqlite')
+
+if DB_ENGINE == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': config('DB_NAME', default='coursemaster'),
+            'USER': config('DB_USER', default='coursemaster'),
+            'PASSWORD': config('DB_PASSWORD', default=''),
+            'HOST': config('DB_HOST', default='localhost'),
+            'PORT': config('DB_PORT', default='5432'),
+            'CONN_MAX_AGE': config('DB_CONN_MAX_AGE', default=60, cast=int),
+            'CONN_HEALTH_CHECKS': config('DB_CONN_HEALTH_CHECKS', default=True, cast=bool),
+            'DISABLE_SERVER_SIDE_CURSORS': config('DB_PGBOUNCER', default=False, cast=bool),
+            'OPTIONS': {
+                'connect_timeout': config('DB_CONNECT_TIMEOUT', default=5, cast=int),
+            },
+        }
+    }
+    SQLITE_PRAGMAS = {}
+elif DB_ENGINE == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': config('DB_NAME', default=str(BASE_DIR / 'db.sqlite3')),
+            'OPTIONS': {
+                # busy_timeout, секунды: ждать блокировку записи вместо "database is locked"
+                'timeout': config('SQLITE_BUSY_TIMEOUT', default=5, cast=int),
+            },
+        }
+    }
+    SQLITE_PRAGMAS = {
+        'journal_mode': config('SQLITE_JOURNAL_MODE', default='WAL'),
+        'synchronous': config('SQLITE_SYNCHRONOUS', default='NORMAL'),
     }
-}
+else:
+    raise ImproperlyConfigured(f'DB_ENGINE: ожидается sqlite или postgresql, получено {DB_ENGINE!r}')
 
 
 # Password validation
@@ -153,3 +193,61 @@ EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 LOGIN_URL = 'login'
 LOGIN_REDIRECT_URL = 'profile'
 LOGOUT_REDIRECT_URL = 'login'
+
+# Полнотекстовый поиск по каталогу (courses/search.py)
+COURSE_SEARCH_ENABLED = config('COURSE_SEARCH_ENABLED', default=True, cast=bool)
+COURSE_SEARCH_MAX_RESULTS = config('COURSE_SEARCH_MAX_RESULTS', default=1000, cast=int)
+COURSE_SEARCH_CONFIG = config('COURSE_SEARCH_CONFIG', default='russian')  # PostgreSQL
+
+# Кеш структуры курса для LessonView (courses/outline.py), секунды
+COURSE_OUTLINE_CACHE_TIMEOUT = config('COURSE_OUTLINE_CACHE_TIMEOUT', default=60 * 60 * 24, cast=int)
+
+# Кеш каталога (courses/catalog.py): страницы результатов для анонимных
+# пользователей и фрагменты карточек курсов, секунды
+CATALOG_CACHE_TIMEOUT = config('CATALOG_CACHE_TIMEOUT', default=60 * 10, cast=int)
+# Как часто изменения счётчиков (записи, рейтинг) обновляют страницы каталога, секунды
+CATALOG_STATS_REFRESH = config('CATALOG_STATS_REFRESH', default=60, cast=int)
+
+# Кеш HTML, отрендеренного из Markdown (courses/rendering.py):
+# размер in-process LRU и, опционально, алиас общего кеша из CACHES
+MARKDOWN_CACHE_SIZE = config('MARKDOWN_CACHE_SIZE', default=512, cast=int)
+MARKDOWN_CACHE_ALIAS = config('MARKDOWN_CACHE_ALIAS', default='')
+MARKDOWN_CACHE_TIMEOUT = config('MARKDOWN_CACHE_TIMEOUT', default=60 * 60 * 24 * 7, cast=int)
+
+# Проверка кода (courses/judge.py): число процессов пула
+# (0 - синхронно в процессе запроса), лимиты песочницы
+JUDGE_WORKERS = config('JUDGE_WORKERS', default=2, cast=int)
+JUDGE_MAX_TIME_LIMIT = config('JUDGE_MAX_TIME_LIMIT', default=10, cast=int)
+JUDGE_MEMORY_LIMIT_MB = config('JUDGE_MEMORY_LIMIT_MB', default=256, cast=int)
+# Первый uid диапазона непривилегированных пользователей песочницы
+# (courses/sandbox.py) и их число - не меньше одновременных проверок.
+# Требует запуска Django от root. Без uid код студента выполнялся бы от
+# пользователя Django (доступ к SECRET_KEY, БД и файлам проекта; audit hook
+# песочницы - не граница безопасности), поэтому шаги с тестами кода
+# отклоняются, пока uid не задан или не включён JUDGE_ALLOW_UNSANDBOXED
+# (только для локальной разработки и тестов).
+JUDGE_SANDBOX_UID = config('JUDGE_SANDBOX_UID', default=0, cast=int)
+JUDGE_SANDBOX_UID_COUNT = config('JUDGE_SANDBOX_UID_COUNT', default=8, cast=int)
+JUDGE_ALLOW_UNSANDBOXED = config('JUDGE_ALLOW_UNSANDBOXED', default=False, cast=bool)
+
+# Буфер отметок text/video шагов (courses/completions.py): отметок в пакете
+# (0 - синхронная запись), максимальная задержка записи (мс), каталог журнала
+STEP_COMPLETION_BUFFER_SIZE = config('STEP_COMPLETION_BUFFER_SIZE', default=0, cast=int)
+STEP_COMPLETION_FLUSH_INTERVAL_MS = config('STEP_COMPLETION_FLUSH_INTERVAL_MS', default=500, cast=int)
+STEP_COMPLETION_JOURNAL_DIR = config('STEP_COMPLETION_JOURNAL_DIR',
+                                     default=str(BASE_DIR / 'var' / 'step-completions'))
+
+# Проверка SQL-шагов (courses/grading.py): лимит времени запроса и схемы (с),
+# строк результата и размера базы шага (МБ)
+SQL_GRADER_TIMEOUT = config('SQL_GRADER_TIMEOUT', default=2, cast=float)
+SQL_GRADER_MAX_ROWS = config('SQL_GRADER_MAX_ROWS', default=1000, cast=int)
+SQL_GRADER_MAX_DB_MB = config('SQL_GRADER_MAX_DB_MB', default=16, cast=int)
+
+# Профилирование SQL по запросам (courses/profiling.py): доля профилируемых
+# запросов, число хранимых медленных запросов на URL, каталог и период
+# (с) JSON-дампа статистики процесса; отчёт - страница sql_profile
+SQL_PROFILING_ENABLED = config('SQL_PROFILING_ENABLED', default=False, cast=bool)
+SQL_PROFILING_SAMPLE_RATE = config('SQL_PROFILING_SAMPLE_RATE', default=0.05, cast=float)
+SQL_PROFILING_SLOW_QUERIES = config('SQL_PROFILING_SLOW_QUERIES', default=5, cast=int)
+SQL_PROFILING_DUMP_DIR = config('SQL_PROFILING_DUMP_DIR', default='')
+SQL_PROFILING_DUMP_INTERVAL = config('SQL_PROFILING_DUMP_INTERVAL', default=300, cast=int)
@@ -3,7 +3,7 @@ from django.utils.html import format_html
 from .models import (Category, Course, Section, Lesson, Enrollment, LessonProgress, Review, 
                      Quiz, Question, QuestionChoice, QuizAttempt, UserAnswer, Assignment, 
                      AssignmentSubmission, Certificate, LessonComment, PaymentMethod, Purchase, 
-                     Payment, PromoCode, Refund, CourseMedia, Step, StepProgress)
+                     Payment, PromoCode, Refund, CourseMedia, Step, StepProgress, CodeSubmission)
 
 
 @admin.register(Category)
@@ -445,4 +445,13 @@ class StepProgressAdmin(admin.ModelAdmin):
         ('Временные метки', {
             'fields': ('started_at', 'completed_at')
         }),
-    )
\ No newline at end of file
+    )
+
+
+@admin.register(CodeSubmission)
+class CodeSubmissionAdmin(admin.ModelAdmin):
+    list_display = ['id', 'enrollment', 'step', 'status', 'passed', 'total', 'created_at', 'finished_at']
+    list_filter = ['status']
+    search_fields = ['enrollment__student__username', 'step__lesson__title']
+    readonly_fields = ['id', 'enrollment', 'step', 'code', 'status', 'passed', 'total', 'results',
+                       'created_at', 'finished_at']
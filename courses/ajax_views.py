@@ -2,15 +2,23 @@
 AJAX API views для course builder и step editor
 """
 import json
+import sqlite3
 
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
-from django.db import models
+from django.db import models, transaction
 from django.http import JsonResponse
 from django.shortcuts import get_object_or_404
+from django.urls import reverse
 from django.utils import timezone
 from django.views.generic import DetailView, View
 
+from . import judge
+from .completions import buffer_completion, buffering_enabled
+from .grading import (InvalidAnswer, SQLResultTooLarge, SQLTimeout, grade,
+                      precompute_sql_expected, validate_answer)
 from .models import Category, Course, Lesson, Section, Step
+from .outline import get_course_outline, invalidate_outline
+from .progress import complete_step, complete_steps
 
 # ============================================================
 # COURSE BUILDER AJAX VIEWS
@@ -35,7 +43,9 @@ class CourseBuilderView(LoginRequiredMixin, UserPassesTestMixin, DetailView):
         context = super().get_context_data(**kwargs)
         course = self.object
 
-        context['sections'] = course.sections.prefetch_related('lessons').all()
+        context['sections'] = course.sections.prefetch_related(models.Prefetch(
+            'lessons', queryset=Lesson.objects.annotate(num_steps=models.Count('steps'))
+        )).all()
         context['total_lessons'] = Lesson.objects.filter(
             section__course=course).count()
         context['total_enrollments'] = course.enrollments.count()
@@ -525,6 +535,18 @@ class StepUpdateAjaxView(LoginRequiredMixin, View):
         if 'content' in data:
             step.content = data['content']
 
+        # SQL: эталонный результат считается один раз при сохранении
+        if step.step_type == 'sql' and isinstance(step.content, dict):
+            for key in ('expected_hash', 'expected_rows', 'expected_source'):
+                step.content.pop(key, None)
+            if (step.content.get('expected_query') or '').strip():
+                try:
+                    precompute_sql_expected(step.content)
+                except (sqlite3.Error, SQLTimeout, SQLResultTooLarge) as e:
+                    return JsonResponse(
+                        {'error': f'Ошибка в эталонном запросе: {str(e) or "превышено время"}'},
+                        status=400)
+
         step.save()
 
         return JsonResponse({
@@ -582,9 +604,17 @@ class StepReorderAjaxView(LoginRequiredMixin, View):
 
         step_ids = data.get('step_ids', [])
 
-        # Обновить порядок
-        for index, step_id in enumerate(step_ids):
-            Step.objects.filter(id=step_id, lesson=lesson).update(order=index)
+        # Обновить порядок одним UPDATE
+        if step_ids:
+            Step.objects.filter(id__in=step_ids, lesson=lesson).update(order=models.Case(
+                *[models.When(id=step_id, then=models.Value(index))
+                  for index, step_id in enumerate(step_ids)],
+                default=models.F('order'),
+                output_field=models.PositiveIntegerField(),
+            ))
+
+        # update() не отправляет сигналы - сбросить outline явно
+        invalidate_outline(pk=lesson.section.course_id)
 
         return JsonResponse({
             'success': True,
@@ -645,11 +675,10 @@ class StepCheckAnswerView(LoginRequiredMixin, View):
     """
 
     def post(self, request, step_id):
-        import re
-
         from .models import Enrollment, StepProgress
 
-        step = get_object_or_404(Step, id=step_id)
+        step = get_object_or_404(
+            Step.objects.select_related('lesson__section__course'), id=step_id)
         course = step.lesson.section.course
 
         # Проверка записи на курс
@@ -664,6 +693,14 @@ class StepCheckAnswerView(LoginRequiredMixin, View):
         except json.JSONDecodeError:
             return JsonResponse({'error': 'Некорректный JSON'}, status=400)
 
+        try:
+            validate_answer(step, data)
+        except InvalidAnswer as e:
+            return JsonResponse({'error': str(e)}, status=400)
+
+        if judge.is_judged(step) and not judge.is_available():
+            return JsonResponse({'error': judge.UNAVAILABLE_MESSAGE}, status=503)
+
         # Получить или создать прогресс
         progress, created = StepProgress.objects.get_or_create(
             enrollment=enrollment,
@@ -674,168 +711,292 @@ class StepCheckAnswerView(LoginRequiredMixin, View):
         # Увеличить счетчик попыток
         progress.attempts += 1
         progress.answer_data = data
-        progress.status = 'in_progress'
+        if not progress.completed:
+            progress.status = 'in_progress'
+
+        # Код с тестами проверяется асинхронно пулом (courses/judge.py)
+        if judge.is_judged(step):
+            progress.is_correct = None
+            with transaction.atomic():
+                progress.save(update_fields=[
+                    'attempts', 'answer_data', 'status', 'is_correct'])
+                submission = judge.submit(enrollment, step, str(data.get('code', '')))
+            response = judge.describe(submission)
+            response['attempts'] = progress.attempts
+            return JsonResponse(response, status=202 if response['pending'] else 200)
+
+        # Проверка ответа: проверяющий по типу шага (courses/grading.py)
+        result = grade(step, data)
+        is_correct = result.is_correct
+
+        # Сохранить результат (поля завершения и счётчики - через complete_step)
+        progress.is_correct = is_correct
+        with transaction.atomic():
+            progress.save(update_fields=[
+                'attempts', 'answer_data', 'status', 'is_correct'])
+            if is_correct:
+                complete_step(enrollment, step, progress)
 
-        # Проверка ответа в зависимости от типа шага
-        is_correct = False
-        message = ''
-        explanation = ''
+        return JsonResponse({
+            'success': True,
+            'is_correct': is_correct,
+            'message': result.message,
+            'explanation': result.explanation if not is_correct else '',
+            'attempts': progress.attempts,
+            'completed': progress.completed,
+        })
 
-        step_type = step.step_type
-        content = step.content or {}
 
-        if step_type == 'quiz_single':
-            # Один правильный ответ
-            correct_index = content.get('correct_index', 0)
-            selected_index = data.get('selected_index')
+class LessonCheckAnswersView(LoginRequiredMixin, View):
+    """
+    AJAX: Проверка ответов сразу на несколько шагов урока (экзамен)
 
-            is_correct = selected_index == correct_index
-            if is_correct:
-                message = 'Правильно! ✓'
-            else:
-                message = 'Неправильно. Попробуйте еще раз.'
-            explanation = content.get('explanation', '')
+    Тело запроса: {"answers": {"<step_id>": {...ответ как для api_step_check...}}}
+    Все шаги проверяются за один проход, StepProgress сохраняются
+    пакетно (bulk_create/bulk_update) в одной транзакции.
+    """
 
-        elif step_type == 'quiz_multiple':
-            # Несколько правильных ответов
-            correct_indexes = set(content.get('correct_indexes', []))
-            selected_indexes = set(data.get('selected_indexes', []))
+    def post(self, request, lesson_id):
+        from .models import Enrollment, StepProgress
 
-            is_correct = correct_indexes == selected_indexes
-            if is_correct:
-                message = 'Правильно! Все ответы верны. ✓'
-            else:
-                message = 'Неправильно. Не все ответы выбраны правильно.'
-            explanation = content.get('explanation', '')
-
-        elif step_type == 'numeric':
-            # Числовой ответ с погрешностью
-            correct_answer = content.get('answer', 0)
-            tolerance = content.get('tolerance', 0)
-            user_value = data.get('value', 0)
-
-            is_correct = abs(user_value - correct_answer) <= tolerance
-            if is_correct:
-                message = f'Правильно! Ответ: {correct_answer} ✓'
-            else:
-                message = 'Неправильно. Попробуйте еще раз.'
-            explanation = content.get('explanation', '')
-
-        elif step_type == 'text_answer':
-            # Текстовый ответ (проверка по паттернам)
-            patterns = content.get('patterns', [])
-            case_sensitive = content.get('case_sensitive', False)
-            user_text = data.get('text', '').strip()
-
-            is_correct = False
-            for pattern in patterns:
+        lesson = get_object_or_404(
+            Lesson.objects.select_related('section__course'), id=lesson_id)
+        course = lesson.section.course
+
+        # Проверка записи на курс
+        try:
+            enrollment = Enrollment.objects.get(
+                student=request.user, course=course)
+        except Enrollment.DoesNotExist:
+            return JsonResponse({'error': 'Вы не записаны на этот курс'}, status=403)
+
+        try:
+            data = json.loads(request.body)
+        except json.JSONDecodeError:
+            return JsonResponse({'error': 'Некорректный JSON'}, status=400)
+
+        answers = data.get('answers') if isinstance(data, dict) else None
+        if not isinstance(answers, dict) or not answers:
+            return JsonResponse({'error': 'Не переданы ответы'}, status=400)
+        try:
+            answers = {int(step_id): answer for step_id, answer in answers.items()}
+        except ValueError:
+            return JsonResponse({'error': 'Некорректный ID шага'}, status=400)
+
+        steps = {
+            step.id: step
+            for step in lesson.steps.filter(id__in=answers)
+            if step.is_interactive
+        }
+
+        results = []
+        completions = {}
+        judged = []  # (позиция в results, шаг, код)
+        with transaction.atomic():
+            # Недостающие записи прогресса - одним INSERT
+            StepProgress.objects.bulk_create(
+                [StepProgress(enrollment=enrollment, step_id=step_id, status='in_progress')
+                 for step_id in steps],
+                ignore_conflicts=True,
+            )
+            progress_by_step = {
+                progress.step_id: progress
+                for progress in StepProgress.objects.filter(
+                    enrollment=enrollment, step_id__in=steps)
+            }
+
+            for step_id, answer in answers.items():
+                step = steps.get(step_id)
+                if step is None:
+                    results.append({'step_id': step_id, 'error': 'Шаг не найден'})
+                    continue
                 try:
-                    flags = 0 if case_sensitive else re.IGNORECASE
-                    if re.match(pattern, user_text, flags):
-                        is_correct = True
-                        break
-                except re.error:
-                    # Если pattern не regex, сравниваем как текст
-                    if case_sensitive:
-                        is_correct = user_text == pattern
-                    else:
-                        is_correct = user_text.lower() == pattern.lower()
-                    if is_correct:
-                        break
+                    validate_answer(step, answer)
+                except InvalidAnswer as e:
+                    results.append({'step_id': step_id, 'error': str(e)})
+                    continue
+
+                progress = progress_by_step[step_id]
+                if judge.is_judged(step):
+                    if not judge.is_available():
+                        results.append({'step_id': step_id, 'error': judge.UNAVAILABLE_MESSAGE})
+                        continue
+                    # Код проверяется асинхронно - задание ставится после сохранения прогресса
+                    progress.attempts += 1
+                    progress.answer_data = answer
+                    progress.is_correct = None
+                    judged.append((len(results), step, str(answer.get('code', ''))))
+                    results.append(None)
+                    continue
+
+                result = grade(step, answer)
+
+                progress.attempts += 1
+                progress.answer_data = answer
+                progress.is_correct = result.is_correct
+                if not progress.completed:
+                    progress.status = 'in_progress'
+                    if result.is_correct:
+                        completions[progress.pk] = step
+
+                results.append({
+                    'step_id': step_id,
+                    'is_correct': result.is_correct,
+                    'message': result.message,
+                    'explanation': result.explanation if not result.is_correct else '',
+                    'attempts': progress.attempts,
+                    'completed': progress.completed or result.is_correct,
+                })
+
+            StepProgress.objects.bulk_update(
+                list(progress_by_step.values()),
+                ['attempts', 'answer_data', 'status', 'is_correct'],
+            )
+            lesson_progress = complete_steps(enrollment, lesson.id, completions)
+
+            for index, step, code in judged:
+                submission = judge.submit(enrollment, step, code)
+                results[index] = dict(
+                    judge.describe(submission),
+                    step_id=step.id,
+                    attempts=progress_by_step[step.id].attempts,
+                )
 
-            if is_correct:
-                message = 'Правильно! ✓'
-            else:
-                message = 'Неправильно. Попробуйте еще раз.'
-            explanation = content.get('explanation', '')
+        outline_lesson = get_course_outline(course).get_lesson(lesson.id)
+        steps_total = len(outline_lesson.step_ids) if outline_lesson else lesson.steps.count()
 
-        elif step_type == 'quiz_sorting':
-            # Сортировка
-            correct_order = content.get('correct_order', [])
-            user_order = data.get('user_order', [])
+        return JsonResponse({
+            'success': True,
+            'results': results,
+            'steps_completed': lesson_progress.completed_steps,
+            'steps_total': steps_total,
+        })
 
-            is_correct = correct_order == user_order
-            if is_correct:
-                message = 'Правильно! Порядок верный. ✓'
-            else:
-                message = 'Неправильный порядок. Попробуйте еще раз.'
 
-        elif step_type == 'quiz_matching':
-            # Сопоставление
-            correct_pairs = content.get('pairs', [])
-            user_pairs = data.get('pairs', [])
+class CodeSubmissionStatusView(LoginRequiredMixin, View):
+    """
+    AJAX: Статус асинхронной проверки кода (опрос по job_id)
+    """
 
-            # Преобразуем в set для сравнения
-            correct_set = set(tuple(p) for p in correct_pairs)
-            user_set = set(tuple(p) for p in user_pairs)
+    def get(self, request, job_id):
+        from .models import CodeSubmission, StepProgress
 
-            is_correct = correct_set == user_set
-            if is_correct:
-                message = 'Правильно! Все пары сопоставлены верно. ✓'
-            else:
-                message = 'Неправильно. Попробуйте еще раз.'
-
-        elif step_type == 'fill_blanks':
-            # Заполнение пропусков
-            correct_answers = content.get('answers', [])
-            user_answers = data.get('answers', [])
-
-            if len(correct_answers) == len(user_answers):
-                all_correct = all(
-                    ua.strip().lower() == ca.strip().lower()
-                    for ua, ca in zip(user_answers, correct_answers)
-                )
-                is_correct = all_correct
-            else:
-                is_correct = False
+        submission = get_object_or_404(
+            CodeSubmission.objects.select_related('enrollment'),
+            pk=job_id, enrollment__student=request.user)
 
-            if is_correct:
-                message = 'Правильно! Все пропуски заполнены верно. ✓'
-            else:
-                message = 'Неправильно. Попробуйте еще раз.'
-
-        elif step_type == 'free_answer':
-            # Свободный ответ (эссе) - не проверяется автоматически
-            min_length = content.get('min_length', 0)
-            user_text = data.get('text', '').strip()
-
-            if len(user_text) >= min_length:
-                is_correct = True  # Просто принимаем ответ
-                message = 'Ваш ответ отправлен на проверку преподавателю.'
-                progress.status = 'in_progress'  # Ждет проверки
-            else:
-                is_correct = False
-                message = f'Ответ слишком короткий. Минимум {min_length} символов.'
-
-        elif step_type == 'code':
-            # Код - пока просто принимаем (полная проверка требует интеграции с sandbox)
-            user_code = data.get('code', '')
-            if user_code.strip():
-                is_correct = True
-                message = 'Код отправлен на проверку.'
-                progress.status = 'in_progress'  # Ждет проверки (или sandbox)
-            else:
-                is_correct = False
-                message = 'Напишите код для проверки.'
-
-        # Сохранить результат
-        progress.is_correct = is_correct
-        if is_correct:
-            progress.completed = True
-            progress.completed_at = timezone.now()
-            progress.status = 'completed'
-            progress.score = step.points
-            progress.max_score = step.points
+        response = judge.describe(submission)
+        response['completed'] = StepProgress.objects.filter(
+            enrollment=submission.enrollment, step_id=submission.step_id, completed=True
+        ).exists()
+        return JsonResponse(response)
+
+
+class LessonBootstrapView(LoginRequiredMixin, View):
+    """
+    AJAX: Всё для урока одним ответом - шаги (без правильных ответов),
+    прогресс и навигация. Переключение шагов выполняется на клиенте,
+    к серверу обращаются только для отправки ответов.
+    """
+
+    def get(self, request, lesson_id):
+        from .models import Enrollment, LessonProgress, StepProgress
+
+        lesson = get_object_or_404(
+            Lesson.objects.select_related('section__course'), id=lesson_id)
+        course = lesson.section.course
+
+        enrollment = Enrollment.objects.filter(
+            student=request.user, course=course).first()
+        is_instructor = course.instructor_id == request.user.id
+        if not (lesson.is_preview or enrollment or is_instructor):
+            return JsonResponse({'error': 'Запишитесь на курс для просмотра этого урока.'}, status=403)
+
+        steps = list(lesson.steps.defer('content'))
+        step_progress = {}
+        completed_lesson_ids = set()
+        if enrollment:
+            step_progress = {
+                progress.step_id: progress
+                for progress in StepProgress.objects.filter(
+                    enrollment=enrollment, step__lesson=lesson)
+            }
+            completed_lesson_ids = set(LessonProgress.objects.filter(
+                enrollment=enrollment, completed=True
+            ).values_list('lesson_id', flat=True))
+
+        steps_data = []
+        for step in steps:
+            progress = step_progress.get(step.id)
+            steps_data.append({
+                'id': step.id,
+                'order': step.order,
+                'step_type': step.step_type,
+                'step_type_display': step.get_step_type_display(),
+                'title': step.title,
+                'points': step.points,
+                'is_required': step.is_required,
+                'is_interactive': step.is_interactive,
+                'content': step.public_content,
+                'completed': bool(progress and progress.completed),
+                'attempts': progress.attempts if progress else 0,
+                'check_url': reverse('api_step_check', kwargs={'step_id': step.id}),
+                'complete_url': reverse('api_step_complete', kwargs={'step_id': step.id}),
+            })
+
+        completed_steps = sum(1 for step in steps_data if step['completed'])
+        current_step = next(
+            (step for step in steps_data if not step['completed']),
+            steps_data[0] if steps_data else None
+        )
 
-        progress.save()
+        # Навигация - из закешированной структуры курса
+        outline = get_course_outline(course)
+
+        def lesson_link(outline_lesson):
+            if outline_lesson is None:
+                return None
+            return {
+                'id': outline_lesson.id,
+                'title': outline_lesson.title,
+                'url': reverse('lesson_view', kwargs={'lesson_id': outline_lesson.id}),
+                'completed': outline_lesson.id in completed_lesson_ids,
+            }
 
         return JsonResponse({
-            'success': True,
-            'is_correct': is_correct,
-            'message': message,
-            'explanation': explanation if not is_correct else '',
-            'attempts': progress.attempts,
-            'completed': progress.completed,
+            'lesson': {
+                'id': lesson.id,
+                'title': lesson.title,
+                'section_id': lesson.section_id,
+                'is_completed': lesson.id in completed_lesson_ids,
+                'complete_url': reverse('lesson_complete', kwargs={'lesson_id': lesson.id}),
+            },
+            'course': {
+                'id': course.id,
+                'slug': course.slug,
+                'title': course.title,
+                'url': reverse('course_detail', kwargs={'slug': course.slug}),
+                'progress_percentage': float(enrollment.progress_percentage) if enrollment else 0,
+            },
+            'steps': steps_data,
+            'current_step_id': current_step['id'] if current_step else None,
+            'progress': {
+                'steps_completed': completed_steps,
+                'steps_total': len(steps_data),
+                'percent': round(completed_steps / len(steps_data) * 100) if steps_data else 0,
+            },
+            'navigation': {
+                'previous_lesson': lesson_link(outline.previous_lesson(lesson.id)),
+                'next_lesson': lesson_link(outline.next_lesson(lesson.id)),
+                'sections': [
+                    {
+                        'id': section.id,
+                        'title': section.title,
+                        'lessons': [lesson_link(item) for item in section.lessons],
+                    }
+                    for section in outline.sections
+                ],
+            },
         })
 
 
@@ -847,7 +1008,8 @@ class StepCompleteView(LoginRequiredMixin, View):
     def post(self, request, step_id):
         from .models import Enrollment, StepProgress
 
-        step = get_object_or_404(Step, id=step_id)
+        step = get_object_or_404(
+            Step.objects.select_related('lesson__section__course'), id=step_id)
         course = step.lesson.section.course
 
         # Проверка записи на курс
@@ -861,35 +1023,35 @@ class StepCompleteView(LoginRequiredMixin, View):
         if step.is_interactive:
             return JsonResponse({'error': 'Этот шаг требует ответа'}, status=400)
 
-        # Получить или создать прогресс
-        progress, created = StepProgress.objects.get_or_create(
-            enrollment=enrollment,
-            step=step,
-            defaults={'status': 'not_started'}
-        )
-
-        # Отметить как пройденный
-        progress.completed = True
-        progress.completed_at = timezone.now()
-        progress.status = 'completed'
-        progress.score = step.points
-        progress.max_score = step.points
-        progress.save()
-
-        # Проверить завершение урока
-        all_steps = step.lesson.steps.all()
-        completed_steps = StepProgress.objects.filter(
-            enrollment=enrollment,
-            step__in=all_steps,
-            completed=True
-        ).count()
-
-        lesson_completed = completed_steps == all_steps.count()
+        outline_lesson = get_course_outline(course).get_lesson(step.lesson_id)
+        steps_total = len(outline_lesson.step_ids) if outline_lesson else step.lesson.steps.count()
+
+        # Буфер отметок: запись в БД пакетом, ответ - сразу (courses/completions.py)
+        if buffering_enabled():
+            buffer_completion(enrollment.pk, step.pk)
+            return JsonResponse({
+                'success': True,
+                'completed': True,
+                'queued': True,
+                'steps_total': steps_total,
+            }, status=202)
+
+        # Отметить как пройденный: O(1) - счётчик шагов урока хранится
+        # в LessonProgress.completed_steps, число шагов берётся из outline
+        with transaction.atomic():
+            progress, created = StepProgress.objects.get_or_create(
+                enrollment=enrollment,
+                step=step,
+                defaults={'status': 'not_started'}
+            )
+            _, lesson_progress = complete_step(enrollment, step, progress)
+
+        completed_steps = lesson_progress.completed_steps
 
         return JsonResponse({
             'success': True,
             'completed': True,
-            'lesson_completed': lesson_completed,
+            'lesson_completed': completed_steps >= steps_total,
             'steps_completed': completed_steps,
-            'steps_total': all_steps.count(),
+            'steps_total': steps_total,
         })
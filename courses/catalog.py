@@ -0,0 +1,87 @@
+"""
+Кеш каталога курсов (CourseListView).
+
+1. Страница результатов (счётчик, сортировка, карточки, пагинация) для
+   анонимных пользователей кешируется целиком под ключом
+   ``catalog_page:<версия каталога>:<хеш параметров>``. В ключ входят
+   только параметры фильтра/сортировки/страницы, поэтому посторонние
+   GET-параметры (utm_* и т.п.) не размножают записи. При попадании
+   в кеш каталог обслуживается без запросов к БД.
+2. Карточка курса кешируется фрагментом ({% cache %} в шаблоне) под
+   штампом курса: updated_at, поля статистики, название категории и имя
+   преподавателя. Любое изменение того, что видно в карточке, меняет
+   штамп - старый фрагмент просто перестаёт использоваться.
+
+Версия каталога хранится в кеше и сразу увеличивается при
+сохранении/удалении курса или категории (меняется состав страниц).
+Счётчики (записи, рейтинг - courses/stats.py) меняются постоянно, поэтому
+только помечают каталог устаревшим (stats_changed): версия увеличивается
+при следующем запросе каталога, но не чаще раза в CATALOG_STATS_REFRESH
+секунд - под нагрузкой страницы продолжают отдаваться из кеша.
+С локальным кешем (LocMemCache) версия своя в каждом процессе - тогда
+устаревание ограничено CATALOG_CACHE_TIMEOUT.
+"""
+import hashlib
+import time
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Category
+
+CATALOG_VERSION_KEY = 'catalog_version'
+CATALOG_STATS_DIRTY_KEY = 'catalog_stats_dirty'
+CATALOG_STATS_LOCK_KEY = 'catalog_stats_refreshed'
+
+# Параметры запроса, от которых зависит страница результатов
+PAGE_PARAMS = ('q', 'category', 'level', 'price', 'sort', 'page')
+
+
+def catalog_version():
+    values = cache.get_many([CATALOG_VERSION_KEY, CATALOG_STATS_DIRTY_KEY])
+    if values.get(CATALOG_STATS_DIRTY_KEY) and cache.add(
+            CATALOG_STATS_LOCK_KEY, True, settings.CATALOG_STATS_REFRESH):
+        # Сначала снять отметку: изменение после неё дождётся следующего окна
+        cache.delete(CATALOG_STATS_DIRTY_KEY)
+        invalidate_catalog()
+        values = cache.get_many([CATALOG_VERSION_KEY])
+    version = values.get(CATALOG_VERSION_KEY)
+    if version is None:
+        # Не начинать с 1: после вытеснения ключа версия не должна
+        # совпасть с версией ещё живых страниц
+        cache.add(CATALOG_VERSION_KEY, time.time_ns(), timeout=None)
+        version = cache.get(CATALOG_VERSION_KEY)
+    return version
+
+
+def invalidate_catalog():
+    """Сделать недействительными все кешированные страницы каталога"""
+    try:
+        cache.incr(CATALOG_VERSION_KEY)
+    except ValueError:
+        cache.add(CATALOG_VERSION_KEY, time.time_ns(), timeout=None)
+
+
+def stats_changed():
+    """Изменились счётчики курса - обновить страницы каталога с ограничением частоты"""
+    cache.set(CATALOG_STATS_DIRTY_KEY, True, timeout=None)
+
+
+def page_cache_key(params):
+    """Ключ страницы результатов по GET-параметрам"""
+    normalized = urlencode(sorted(
+        (name, params[name].strip()) for name in PAGE_PARAMS if params.get(name, '').strip()
+    ))
+    digest = hashlib.md5(normalized.encode()).hexdigest()
+    return f'catalog_page:{catalog_version()}:{digest}'
+
+
+def get_categories():
+    """Категории для фильтра (кешируются вместе с версией каталога)"""
+    key = f'catalog_categories:{catalog_version()}'
+    categories = cache.get(key)
+    if categories is None:
+        categories = list(Category.objects.all())
+        cache.set(key, categories, settings.CATALOG_CACHE_TIMEOUT)
+    return categories
@@ -0,0 +1,345 @@
+"""
+Буфер отметок "шаг пройден" для text/video шагов (StepCompleteView).
+
+Студенты пролистывают контентные шаги быстро, и каждая отметка -
+отдельная транзакция с несколькими запросами. При
+STEP_COMPLETION_BUFFER_SIZE > 0 отметка:
+
+1. дописывается строкой JSON в журнал процесса
+   (STEP_COMPLETION_JOURNAL_DIR/completions-<pid>-<nonce>.jsonl, nonce -
+   время создания буфера: pid после перезапуска контейнера повторяется)
+   и сохраняется на диск (fsync до ответа; одновременные запросы делят
+   один fsync) - переживает падение процесса и сервера;
+2. попадает в буфер в памяти (повторная отметка того же шага - одна запись);
+3. HTTP-ответ возвращается сразу (202).
+
+Буфер сбрасывается в БД пакетом, когда набирается
+STEP_COMPLETION_BUFFER_SIZE отметок или проходит
+STEP_COMPLETION_FLUSH_INTERVAL_MS: недостающие StepProgress создаются
+одним bulk_create, отметка и счётчики - complete_steps() на урок.
+После успешной записи журнал усекается до ещё не записанных отметок.
+
+Запись идемпотентна (условный UPDATE completed=False -> True), поэтому
+повторное применение журнала безопасно: журналы завершившихся
+процессов применяются при первом обращении к буферу и командой
+python manage.py flush_step_completions.
+
+Процесс держит flock на файле <журнал>.lock всё время работы; ОС снимает
+блокировку при любом завершении, в т.ч. аварийном. Журнал применяется,
+только если его блокировку удалось захватить, - журнал работающего
+процесса никогда не удаляется из-под него.
+
+STEP_COMPLETION_BUFFER_SIZE = 0 - синхронная запись в процессе запроса
+(тесты, локальная разработка).
+"""
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows: владелец журнала определяется по pid
+    fcntl = None
+
+from django.conf import settings
+from django.db import connections, transaction
+
+from .models import Enrollment, Step, StepProgress
+from .progress import complete_steps
+
+logger = logging.getLogger(__name__)
+
+JOURNAL_PATTERN = 'completions-*.jsonl'
+
+
+def buffering_enabled():
+    return getattr(settings, 'STEP_COMPLETION_BUFFER_SIZE', 0) > 0
+
+
+def apply_completions(events):
+    """
+    Записать отметки [{'enrollment': id, 'step': id}, ...] одной транзакцией.
+    Идемпотентно: уже пройденные шаги не меняют счётчики.
+    Возвращает число впервые пройденных шагов.
+    """
+    pairs = {(event['enrollment'], event['step']) for event in events}
+    if not pairs:
+        return 0
+    enrollment_ids = {enrollment_id for enrollment_id, _ in pairs}
+    steps = Step.objects.only('id', 'lesson_id', 'points').in_bulk(
+        {step_id for _, step_id in pairs})
+    # Шаг могли удалить, пока отметка лежала в буфере
+    pairs = {(enrollment_id, step_id) for enrollment_id, step_id in pairs if step_id in steps}
+
+    with transaction.atomic():
+        existing = StepProgress.objects.filter(
+            enrollment_id__in=enrollment_ids, step_id__in=steps
+        ).values_list('enrollment_id', 'step_id', 'pk', 'completed')
+        progress = {(e, s): (pk, completed) for e, s, pk, completed in existing if (e, s) in pairs}
+
+        missing = pairs - progress.keys()
+        if missing:
+            StepProgress.objects.bulk_create(
+                [StepProgress(enrollment_id=e, step_id=s, status='not_started') for e, s in missing],
+                ignore_conflicts=True,
+            )
+            progress.update({
+                (e, s): (pk, completed)
+                for e, s, pk, completed in StepProgress.objects.filter(
+                    enrollment_id__in={e for e, _ in missing}, step_id__in={s for _, s in missing}
+                ).values_list('enrollment_id', 'step_id', 'pk', 'completed')
+                if (e, s) in missing
+            })
+
+        # complete_steps работает в пределах урока одной записи на курс
+        groups = defaultdict(dict)
+        for (enrollment_id, step_id), (pk, completed) in progress.items():
+            if not completed:
+                step = steps[step_id]
+                groups[enrollment_id, step.lesson_id][pk] = step
+
+        enrollments = Enrollment.objects.in_bulk({e for e, _ in groups})
+        for (enrollment_id, lesson_id), completions in groups.items():
+            complete_steps(enrollments[enrollment_id], lesson_id, completions)
+    return sum(len(completions) for completions in groups.values())
+
+
+def read_journal(path):
+    """Отметки из файла журнала (оборванная последняя строка пропускается)"""
+    events = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                event = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(event, dict) and 'enrollment' in event and 'step' in event:
+                events.append(event)
+    return events
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _lock_owner(path):
+    """
+    Захватить блокировку журнала path. Возвращает дескриптор файла
+    блокировки или None, если журнал принадлежит работающему процессу.
+    """
+    lock_path = path.with_suffix('.lock')
+    if fcntl is None:
+        try:
+            pid = int(path.stem.split('-')[1])
+        except (IndexError, ValueError):
+            return None
+        return None if _pid_alive(pid) else open(lock_path, 'a')
+    lock = open(lock_path, 'a')
+    try:
+        fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        lock.close()
+        return None
+    return lock
+
+
+def replay_journals(directory=None):
+    """
+    Применить журналы завершившихся процессов и удалить их
+    (журналы работающих процессов, в т.ч. текущего, пропускаются).
+    Возвращает (число файлов, число впервые пройденных шагов).
+    """
+    directory = Path(directory or settings.STEP_COMPLETION_JOURNAL_DIR)
+    files = completed = 0
+    for path in sorted(directory.glob(JOURNAL_PATTERN)):
+        lock = _lock_owner(path)
+        if lock is None:
+            continue
+        try:
+            try:
+                events = read_journal(path)
+            except FileNotFoundError:
+                continue  # уже применён другим процессом
+            completed += apply_completions(events)
+            path.unlink(missing_ok=True)
+            files += 1
+        finally:
+            path.with_suffix('.lock').unlink(missing_ok=True)
+            lock.close()
+    return files, completed
+
+
+def _fsync_directory(directory):
+    """Сохранить на диск запись каталога (создание/замена журнала)"""
+    if os.name != 'posix':
+        return
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class CompletionBuffer:
+    """Буфер процесса: журнал на диске + отметки в памяти"""
+
+    def __init__(self, directory, size, interval_ms):
+        self.directory = Path(directory)
+        self.size = size
+        self.interval = interval_ms / 1000
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        # Групповой fsync: порядок захвата sync_lock -> lock
+        self.sync_lock = threading.Lock()
+        self.written = self.synced = 0  # номер последней записанной / сохранённой на диск строки
+        self.pending = {}
+        self.timer = None
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.pid = os.getpid()
+        self.path = self.directory / f'completions-{self.pid}-{time.time_ns():x}.jsonl'
+        # Блокировка - до создания журнала: журнал без владельца
+        # replay_journals считает брошенным
+        self.lock_file = open(self.path.with_suffix('.lock'), 'a')
+        if fcntl is not None:
+            fcntl.flock(self.lock_file, fcntl.LOCK_EX)
+        self.journal = open(self.path, 'a', encoding='utf-8')
+        _fsync_directory(self.directory)
+
+    def add(self, enrollment_id, step_id):
+        event = {'enrollment': enrollment_id, 'step': step_id}
+        with self.lock:
+            # Сначала журнал: после ответа клиенту отметка не теряется
+            self.journal.write(json.dumps(event) + '\n')
+            self.journal.flush()
+            self.written += 1
+            sequence = self.written
+            self.pending[enrollment_id, step_id] = event
+            full = len(self.pending) >= self.size
+            if not full:
+                self._schedule()
+        self._sync(sequence)
+        if full:
+            self.flush()
+
+    def _sync(self, sequence):
+        """
+        Дождаться fsync журнала до строки sequence. Один fsync покрывает
+        все строки, записанные к его началу (групповая запись).
+        """
+        with self.sync_lock:
+            if self.synced >= sequence:
+                return
+            with self.lock:
+                target = self.written
+            # Журнал не подменяется: _truncate_journal ждёт sync_lock
+            os.fsync(self.journal.fileno())
+            self.synced = target
+
+    def _schedule(self):
+        """Запустить таймер сброса (вызывать под self.lock)"""
+        if self.timer is None:
+            self.timer = threading.Timer(self.interval, self._flush_in_thread)
+            self.timer.daemon = True
+            self.timer.start()
+
+    def _flush_in_thread(self):
+        try:
+            self.flush()
+        finally:
+            # Соединение потока таймера больше не понадобится
+            connections.close_all()
+
+    def flush(self):
+        """Записать накопленные отметки. Возвращает число записанных"""
+        with self.flush_lock:
+            with self.lock:
+                if self.timer is not None:
+                    self.timer.cancel()
+                    self.timer = None
+                batch, self.pending = self.pending, {}
+            if not batch:
+                return 0
+            try:
+                apply_completions(list(batch.values()))
+            except Exception:
+                logger.exception('Не удалось записать %s отметок шагов', len(batch))
+                with self.lock:
+                    for key, event in batch.items():
+                        self.pending.setdefault(key, event)
+                    self._schedule()
+                return 0
+            self._truncate_journal()
+            return len(batch)
+
+    def _truncate_journal(self):
+        """Оставить в журнале только отметки, пришедшие во время записи"""
+        with self.sync_lock, self.lock:
+            tmp_path = self.path.with_suffix('.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                for event in self.pending.values():
+                    f.write(json.dumps(event) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+            self.journal.close()
+            os.replace(tmp_path, self.path)
+            _fsync_directory(self.directory)
+            self.journal = open(self.path, 'a', encoding='utf-8')
+            self.synced = self.written
+
+    def close(self):
+        self.flush()
+        with self.lock:
+            self.journal.close()
+            if not self.pending:
+                self.path.unlink(missing_ok=True)
+                self.path.with_suffix('.lock').unlink(missing_ok=True)
+            self.lock_file.close()
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_buffer():
+    """Буфер процесса (создаётся при первом обращении, после fork - заново)"""
+    global _buffer
+    with _buffer_lock:
+        if _buffer is None or _buffer.pid != os.getpid():
+            directory = settings.STEP_COMPLETION_JOURNAL_DIR
+            try:
+                replay_journals(directory)
+            except Exception:
+                logger.exception('Не удалось применить журналы отметок шагов')
+            _buffer = CompletionBuffer(
+                directory,
+                settings.STEP_COMPLETION_BUFFER_SIZE,
+                settings.STEP_COMPLETION_FLUSH_INTERVAL_MS,
+            )
+            atexit.register(_buffer.close)
+        return _buffer
+
+
+def buffer_completion(enrollment_id, step_id):
+    """Поставить отметку в буфер процесса"""
+    get_buffer().add(enrollment_id, step_id)
+
+
+def reset_buffer():
+    """Сбросить и закрыть буфер процесса (тесты, смена настроек)"""
+    global _buffer
+    with _buffer_lock:
+        if _buffer is not None:
+            _buffer.close()
+            atexit.unregister(_buffer.close)
+            _buffer = None
@@ -0,0 +1,550 @@
+"""
+Проверка ответов на интерактивные шаги.
+
+Для каждого Step.step_type зарегистрирован класс-проверяющий (grader).
+Проверка разделена на два этапа:
+
+- compile(content) - разбор step.content в готовые структуры
+  (скомпилированные regex, нормализованные ответы, frozenset пар);
+  результат кешируется по (step.id, step.updated_at), поэтому
+  после редактирования шага артефакты собираются заново;
+- check(compiled, data) - дешёвая проверка ответа студента.
+
+Перед check формат ответа проверяется по answer_fields проверяющего
+(ответ клиента - произвольный JSON): неверный тип поля - InvalidAnswer,
+а не TypeError/AttributeError в check.
+
+Новый тип шага добавляется классом с декоратором @register,
+без изменений в StepCheckAnswerView.
+"""
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+from django.conf import settings
+
+from .rendering import LRUCache, render_markdown
+
+COMPILED_CACHE_SIZE = 1024
+
+_registry = {}
+_compiled = LRUCache(COMPILED_CACHE_SIZE)
+
+
+# Скалярные значения JSON (включая null)
+SCALAR = (str, int, float, bool, type(None))
+
+
+class InvalidAnswer(ValueError):
+    """Ответ не является JSON-объектом или поле ответа другого типа"""
+
+
+def _matches(value, spec):
+    if isinstance(spec, (type, tuple)):
+        return isinstance(value, spec)
+    return spec(value)
+
+
+def list_of(spec):
+    """Формат поля ответа: список значений формата spec (тип или list_of)"""
+    return lambda value: isinstance(value, list) and all(_matches(item, spec) for item in value)
+
+
+@dataclass(frozen=True)
+class GradeResult:
+    is_correct: bool
+    message: str = ''
+    explanation: str = ''
+
+
+def register(grader_class):
+    """Декоратор: зарегистрировать проверяющего для grader_class.step_type"""
+    _registry[grader_class.step_type] = grader_class()
+    return grader_class
+
+
+def get_grader(step_type):
+    return _registry.get(step_type)
+
+
+def compiled_artifacts(step, grader):
+    key = (step.id, step.updated_at)
+    compiled = _compiled.get(key)
+    if compiled is None:
+        compiled = grader.compile(step.content or {})
+        _compiled.set(key, compiled)
+    return compiled
+
+
+def validate_answer(step, data):
+    """Проверить формат ответа data на шаг step (InvalidAnswer)"""
+    if not isinstance(data, dict):
+        raise InvalidAnswer('Ответ должен быть JSON-объектом')
+    grader = get_grader(step.step_type)
+    if grader is not None:
+        grader.validate(data)
+
+
+def grade(step, data):
+    """Проверить ответ data на шаг step (InvalidAnswer - неверный формат ответа)"""
+    validate_answer(step, data)
+    grader = get_grader(step.step_type)
+    if grader is None:
+        return GradeResult(is_correct=False)
+    return grader.check(compiled_artifacts(step, grader), data)
+
+
+def build_public_content(step):
+    """
+    content шага без правильных ответов - для отдачи в браузер.
+    Для текстовых шагов Markdown заменяется готовым HTML.
+    Результат хранится в Step.public_content (см. Step.save).
+    """
+    content = dict(step.content or {})
+    grader = get_grader(step.step_type)
+    for field in (grader.private_fields if grader else ()):
+        content.pop(field, None)
+    if step.step_type == 'text':
+        markdown = content.pop('markdown', '')
+        if not content.get('html'):
+            content['html'] = render_markdown(markdown)
+    return content
+
+
+class Grader:
+    """Базовый класс проверяющего"""
+    step_type = None
+    # Поля content, которые нельзя отдавать клиенту (ответы, тесты)
+    private_fields = ()
+    # Формат ответа: поле -> тип или list_of(...); отсутствующие поля допустимы
+    answer_fields = {}
+
+    correct_message = 'Правильно! ✓'
+    wrong_message = 'Неправильно. Попробуйте еще раз.'
+
+    def compile(self, content):
+        return content
+
+    def validate(self, data):
+        for field, spec in self.answer_fields.items():
+            if field in data and not _matches(data[field], spec):
+                raise InvalidAnswer(f'Некорректный формат ответа: {field}')
+
+    def check(self, compiled, data):
+        raise NotImplementedError
+
+    def result(self, is_correct, explanation=''):
+        return GradeResult(
+            is_correct=is_correct,
+            message=self.correct_message if is_correct else self.wrong_message,
+            explanation=explanation,
+        )
+
+
+@dataclass(frozen=True)
+class Expected:
+    """Скомпилированный правильный ответ + пояснение"""
+    answer: object
+    explanation: str = ''
+
+
+# ============================================================
+# ТЕСТЫ
+# ============================================================
+
+@register
+class QuizSingleGrader(Grader):
+    step_type = 'quiz_single'
+    private_fields = ('correct_index', 'explanation')
+    answer_fields = {'selected_index': SCALAR}
+
+    def compile(self, content):
+        return Expected(content.get('correct_index', 0), content.get('explanation', ''))
+
+    def check(self, compiled, data):
+        return self.result(data.get('selected_index') == compiled.answer,
+                           compiled.explanation)
+
+
+@register
+class QuizMultipleGrader(Grader):
+    step_type = 'quiz_multiple'
+    private_fields = ('correct_indexes', 'explanation')
+    answer_fields = {'selected_indexes': list_of(SCALAR)}
+    correct_message = 'Правильно! Все ответы верны. ✓'
+    wrong_message = 'Неправильно. Не все ответы выбраны правильно.'
+
+    def compile(self, content):
+        return Expected(frozenset(content.get('correct_indexes', [])),
+                        content.get('explanation', ''))
+
+    def check(self, compiled, data):
+        return self.result(set(data.get('selected_indexes', [])) == compiled.answer,
+                           compiled.explanation)
+
+
+@register
+class QuizSortingGrader(Grader):
+    step_type = 'quiz_sorting'
+    private_fields = ('correct_order',)
+    answer_fields = {'user_order': list_of(SCALAR)}
+    correct_message = 'Правильно! Порядок верный. ✓'
+    wrong_message = 'Неправильный порядок. Попробуйте еще раз.'
+
+    def compile(self, content):
+        return Expected(list(content.get('correct_order', [])))
+
+    def check(self, compiled, data):
+        return self.result(data.get('user_order', []) == compiled.answer)
+
+
+@register
+class QuizMatchingGrader(Grader):
+    step_type = 'quiz_matching'
+    private_fields = ('pairs',)
+    answer_fields = {'pairs': list_of(list_of(SCALAR))}
+    correct_message = 'Правильно! Все пары сопоставлены верно. ✓'
+
+    def compile(self, content):
+        return Expected(frozenset(tuple(pair) for pair in content.get('pairs', [])))
+
+    def check(self, compiled, data):
+        user_pairs = frozenset(tuple(pair) for pair in data.get('pairs', []))
+        return self.result(user_pairs == compiled.answer)
+
+
+@register
+class FillBlanksGrader(Grader):
+    step_type = 'fill_blanks'
+    private_fields = ('answers',)
+    answer_fields = {'answers': list_of(str)}
+    correct_message = 'Правильно! Все пропуски заполнены верно. ✓'
+
+    def compile(self, content):
+        return Expected(tuple(answer.strip().lower() for answer in content.get('answers', [])))
+
+    def check(self, compiled, data):
+        user_answers = data.get('answers', [])
+        is_correct = len(user_answers) == len(compiled.answer) and all(
+            user.strip().lower() == correct
+            for user, correct in zip(user_answers, compiled.answer)
+        )
+        return self.result(is_correct)
+
+
+# ============================================================
+# ОТВЕТЫ
+# ============================================================
+
+@register
+class NumericGrader(Grader):
+    step_type = 'numeric'
+    private_fields = ('answer', 'explanation')
+    answer_fields = {'value': SCALAR}
+
+    def compile(self, content):
+        return Expected((content.get('answer', 0), content.get('tolerance', 0)),
+                        content.get('explanation', ''))
+
+    def check(self, compiled, data):
+        answer, tolerance = compiled.answer
+        try:
+            is_correct = abs(float(data.get('value', 0)) - answer) <= tolerance
+        except (TypeError, ValueError):
+            is_correct = False
+        if is_correct:
+            return GradeResult(True, f'Правильно! Ответ: {answer} ✓')
+        return self.result(False, compiled.explanation)
+
+
+@dataclass(frozen=True)
+class TextPatterns:
+    regexes: tuple
+    literals: frozenset  # Шаблоны, не являющиеся корректным regex
+    case_sensitive: bool
+    explanation: str
+
+
+@register
+class TextAnswerGrader(Grader):
+    step_type = 'text_answer'
+    private_fields = ('patterns', 'case_sensitive', 'explanation')
+    answer_fields = {'text': str}
+
+    def compile(self, content):
+        case_sensitive = content.get('case_sensitive', False)
+        flags = 0 if case_sensitive else re.IGNORECASE
+        regexes, literals = [], set()
+        for pattern in content.get('patterns', []):
+            try:
+                regexes.append(re.compile(pattern, flags))
+            except re.error:
+                # Если pattern не regex, сравниваем как текст
+                literals.add(pattern if case_sensitive else pattern.lower())
+        return TextPatterns(tuple(regexes), frozenset(literals), case_sensitive,
+                            content.get('explanation', ''))
+
+    def check(self, compiled, data):
+        user_text = data.get('text', '').strip()
+        is_correct = any(regex.match(user_text) for regex in compiled.regexes) or (
+            (user_text if compiled.case_sensitive else user_text.lower()) in compiled.literals
+        )
+        return self.result(is_correct, compiled.explanation)
+
+
+@register
+class FreeAnswerGrader(Grader):
+    """Эссе не проверяется автоматически - принимается по длине"""
+    step_type = 'free_answer'
+    correct_message = 'Ваш ответ отправлен на проверку преподавателю.'
+    answer_fields = {'text': str}
+
+    def compile(self, content):
+        return Expected(content.get('min_length', 0))
+
+    def check(self, compiled, data):
+        if len(data.get('text', '').strip()) >= compiled.answer:
+            return self.result(True)
+        return GradeResult(False, f'Ответ слишком короткий. Минимум {compiled.answer} символов.')
+
+
+@register
+class CodeGrader(Grader):
+    """Код пока просто принимается (полная проверка требует sandbox)"""
+    step_type = 'code'
+    private_fields = ('tests',)
+    answer_fields = {'code': str}
+    correct_message = 'Код отправлен на проверку.'
+    wrong_message = 'Напишите код для проверки.'
+
+    def check(self, compiled, data):
+        return self.result(bool(data.get('code', '').strip()))
+
+
+# ============================================================
+# SQL
+# ============================================================
+#
+# Схема шага (database_schema) выполняется один раз в шаблонную
+# in-memory базу SQLite; для каждого ответа шаблон копируется через
+# backup API (без повторного DDL), запрос студента выполняется
+# с ограничением времени и числа строк. Результаты сравниваются
+# по хешу отсортированных строк - порядок не важен. Хеш эталона
+# считается при сохранении шага (precompute_sql_expected).
+
+class SQLTimeout(Exception):
+    pass
+
+
+class SQLResultTooLarge(Exception):
+    """Эталонный запрос вернул больше SQL_GRADER_MAX_ROWS строк"""
+
+
+def _deny_attach(action, *args):
+    # ATTACH позволил бы открыть/создать файл на диске сервера
+    if action in (sqlite3.SQLITE_ATTACH, sqlite3.SQLITE_DETACH, sqlite3.SQLITE_PRAGMA):
+        return sqlite3.SQLITE_DENY
+    return sqlite3.SQLITE_OK
+
+
+def _canonical_value(item):
+    if isinstance(item, float):
+        return int(item) if item.is_integer() else round(item, 6)
+    if isinstance(item, bytes):
+        return item.hex()
+    return item
+
+
+def result_hash(rows):
+    """
+    Хеш результата запроса без учёта порядка строк:
+    sha256 от отсортированных канонических строк.
+    """
+    lines = sorted(
+        json.dumps([_canonical_value(item) for item in
+                    (row.values() if isinstance(row, dict) else row)],
+                   ensure_ascii=False, default=str)
+        for row in rows
+    )
+    return hashlib.sha256('\n'.join(lines).encode('utf-8')).hexdigest()
+
+
+def sql_source_hash(content):
+    """Хеш схемы и эталонного запроса - для проверки актуальности expected_hash"""
+    source = json.dumps([content.get('database_schema', ''), content.get('expected_query', '')])
+    return hashlib.sha256(source.encode('utf-8')).hexdigest()
+
+
+def precompute_sql_expected(content):
+    """
+    Выполнить эталонный запрос и сохранить в content хеш результата
+    (expected_hash) и число строк (expected_rows). Вызывается при
+    сохранении шага; ошибки схемы/запроса (sqlite3.Error, SQLTimeout,
+    SQLResultTooLarge) пробрасываются, чтобы показать их преподавателю.
+    """
+    timeout = getattr(settings, 'SQL_GRADER_TIMEOUT', 2)
+    max_rows = getattr(settings, 'SQL_GRADER_MAX_ROWS', 1000)
+    fixture = SQLFixture(content.get('database_schema') or '')
+    rows = execute_expected(fixture, content.get('expected_query') or '', timeout, max_rows)
+    content['expected_hash'] = result_hash(rows)
+    content['expected_rows'] = len(rows)
+    content['expected_source'] = sql_source_hash(content)
+    return content
+
+
+def execute_expected(fixture, query, timeout, max_rows):
+    """
+    Эталонный запрос: результат больше max_rows строк отклоняется -
+    ответ студента с таким результатом не пройдёт лимит строк.
+    """
+    rows = fixture.execute(query, timeout, max_rows)
+    if len(rows) > max_rows:
+        raise SQLResultTooLarge(f'запрос вернул больше {max_rows} строк')
+    return rows
+
+
+@contextmanager
+def _deadline(connection, timeout):
+    """Прервать запросы соединения через timeout секунд (SQLTimeout)"""
+    deadline = time.monotonic() + timeout
+    timed_out = []
+
+    def check_deadline():
+        if time.monotonic() > deadline:
+            timed_out.append(True)
+            return 1  # прерывает выполнение запроса
+        return 0
+
+    connection.set_progress_handler(check_deadline, 10000)
+    try:
+        yield
+    except sqlite3.OperationalError:
+        if timed_out:
+            raise SQLTimeout
+        raise
+    finally:
+        connection.set_progress_handler(None, 0)
+
+
+# Лимиты SQLite на соединение: значение (строка/blob) создаётся целиком
+# в памяти процесса за один шаг - zeroblob(10**9) не остановят ни
+# max_page_count, ни таймаут
+SQL_LIMITS = {
+    sqlite3.SQLITE_LIMIT_LENGTH: 64 * 1024,  # байт в строке/blob/записи
+    sqlite3.SQLITE_LIMIT_SQL_LENGTH: 1024 * 1024,  # байт в тексте запроса
+    sqlite3.SQLITE_LIMIT_COLUMN: 100,
+    sqlite3.SQLITE_LIMIT_COMPOUND_SELECT: 50,
+}
+
+
+def _restrict(connection):
+    """
+    Лимиты значений и запросов (SQL_LIMITS), размера базы и запрет
+    ATTACH/PRAGMA (после этого PRAGMA недоступны)
+    """
+    for limit, value in SQL_LIMITS.items():
+        connection.setlimit(limit, value)
+    max_mb = getattr(settings, 'SQL_GRADER_MAX_DB_MB', 16)
+    page_size = connection.execute('PRAGMA page_size').fetchone()[0]
+    connection.execute(f'PRAGMA max_page_count = {max_mb * 1024 * 1024 // page_size}')
+    connection.set_authorizer(_deny_attach)
+
+
+class SQLFixture:
+    """Шаблонная база шага: схема выполняется один раз, копии - через backup()"""
+
+    def __init__(self, schema, timeout=None):
+        if timeout is None:
+            timeout = getattr(settings, 'SQL_GRADER_TIMEOUT', 2)
+        # Схема - код преподавателя, но выполняется в процессе Django:
+        # те же ограничения, что и для запросов студентов
+        self._template = sqlite3.connect(':memory:', check_same_thread=False)
+        _restrict(self._template)
+        try:
+            with _deadline(self._template, timeout):
+                self._template.executescript(schema)
+        except BaseException:
+            self._template.close()
+            raise
+        self._lock = threading.Lock()
+
+    def clone(self):
+        connection = sqlite3.connect(':memory:')
+        with self._lock:
+            self._template.backup(connection)
+        _restrict(connection)
+        return connection
+
+    def execute(self, query, timeout, max_rows):
+        """Выполнить запрос на копии шаблона. Возвращает список строк"""
+        connection = self.clone()
+        try:
+            with _deadline(connection, timeout):
+                rows = connection.execute(query).fetchmany(max_rows + 1)
+        finally:
+            connection.close()
+        return rows
+
+
+@dataclass(frozen=True)
+class SQLTask:
+    fixture: object  # SQLFixture или None, если схема не выполнилась
+    expected_hash: str = ''
+
+
+@register
+class SQLGrader(Grader):
+    step_type = 'sql'
+    private_fields = ('expected_query', 'expected_result', 'expected_hash',
+                      'expected_rows', 'expected_source')
+    correct_message = 'Правильно! Результат запроса совпадает. ✓'
+    answer_fields = {'query': str}
+    wrong_message = 'Результат запроса не совпадает с ожидаемым. Попробуйте еще раз.'
+
+    @property
+    def timeout(self):
+        return getattr(settings, 'SQL_GRADER_TIMEOUT', 2)
+
+    @property
+    def max_rows(self):
+        return getattr(settings, 'SQL_GRADER_MAX_ROWS', 1000)
+
+    def compile(self, content):
+        try:
+            fixture = SQLFixture(content.get('database_schema') or '')
+            if content.get('expected_hash') and \
+                    content.get('expected_source') == sql_source_hash(content):
+                # Посчитан при сохранении шага (StepUpdateAjaxView)
+                expected_hash = content['expected_hash']
+            elif content.get('expected_result') is not None:
+                expected_hash = result_hash(content['expected_result'])
+            else:
+                expected_hash = result_hash(execute_expected(
+                    fixture, content.get('expected_query') or '', self.timeout, self.max_rows))
+        except (sqlite3.Error, SQLTimeout, SQLResultTooLarge):
+            return SQLTask(fixture=None)
+        return SQLTask(fixture=fixture, expected_hash=expected_hash)
+
+    def check(self, compiled, data):
+        if compiled.fixture is None:
+            return GradeResult(False, 'Задача настроена некорректно. Сообщите преподавателю.')
+
+        query = str(data.get('query', '')).strip()
+        if not query:
+            return GradeResult(False, 'Напишите SQL-запрос.')
+
+        try:
+            rows = compiled.fixture.execute(query, self.timeout, self.max_rows)
+        except SQLTimeout:
+            return GradeResult(False, 'Превышено время выполнения запроса.')
+        except (sqlite3.Error, sqlite3.Warning) as e:
+            return GradeResult(False, f'Ошибка SQL: {e}')
+
+        if len(rows) > self.max_rows:
+            return GradeResult(False, f'Запрос вернул больше {self.max_rows} строк.')
+        return self.result(result_hash(rows) == compiled.expected_hash)
@@ -0,0 +1,233 @@
+"""
+Асинхронная проверка кода (шаги типа code с content['tests']).
+
+    content: {"language": "python", "time_limit": 5,
+              "tests": [{"input": "2\n", "expected_output": "4"}, ...]}
+
+1. StepCheckAnswerView создаёт CodeSubmission и ставит задание в очередь,
+   HTTP-ответ возвращается сразу с job_id (202);
+2. пул из JUDGE_WORKERS заранее запущенных процессов выполняет
+   courses.sandbox.run_tests (каждый тест - изолированный интерпретатор
+   с rlimit);
+3. по завершении результат сохраняется в CodeSubmission, при успехе
+   шаг отмечается пройденным (courses/progress.py);
+4. клиент опрашивает CodeSubmissionStatusView по job_id.
+
+JUDGE_WORKERS = 0 - синхронная проверка в процессе запроса
+(тесты, локальная разработка).
+
+Без диапазона uid песочницы (JUDGE_SANDBOX_UID) код не запускается
+(SandboxNotConfigured), если явно не включён JUDGE_ALLOW_UNSANDBOXED.
+
+Очередь живёт в памяти процесса: задания, оставшиеся в статусе queued
+после перезапуска, перепроверяет команда
+python manage.py requeue_code_submissions.
+"""
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.urls import reverse
+from django.utils import timezone
+
+from . import sandbox
+from .models import CodeSubmission, StepProgress
+from .progress import complete_step
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_LANGUAGES = ('python',)
+DEFAULT_TIME_LIMIT = 5
+
+UNAVAILABLE_MESSAGE = 'Проверка кода временно недоступна. Сообщите администратору.'
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+class SandboxNotConfigured(Exception):
+    """Не задан uid песочницы и не разрешён запуск без него"""
+
+
+def is_judged(step):
+    """Проверяется ли шаг запуском тестов (иначе - CodeGrader)"""
+    content = step.content or {}
+    return (
+        step.step_type == 'code'
+        and bool(content.get('tests'))
+        and content.get('language', 'python') in SUPPORTED_LANGUAGES
+    )
+
+
+def _limits(step):
+    content = step.content or {}
+    try:
+        time_limit = float(content.get('time_limit') or DEFAULT_TIME_LIMIT)
+    except (TypeError, ValueError):
+        time_limit = DEFAULT_TIME_LIMIT
+    time_limit = min(max(time_limit, 1), getattr(settings, 'JUDGE_MAX_TIME_LIMIT', 10))
+    memory = getattr(settings, 'JUDGE_MEMORY_LIMIT_MB', sandbox.DEFAULT_MEMORY_LIMIT_MB)
+    return time_limit, memory
+
+
+def is_available():
+    """Можно ли запускать код: задан uid песочницы или явно разрешён запуск без него"""
+    return bool(getattr(settings, 'JUDGE_SANDBOX_UID', 0)) or \
+        getattr(settings, 'JUDGE_ALLOW_UNSANDBOXED', False)
+
+
+def _sandbox_uids():
+    """Диапазон uid песочницы (None - без смены uid, если это разрешено)"""
+    first = getattr(settings, 'JUDGE_SANDBOX_UID', 0)
+    if not first:
+        if not is_available():
+            raise SandboxNotConfigured('JUDGE_SANDBOX_UID не задан')
+        return None
+    return range(first, first + settings.JUDGE_SANDBOX_UID_COUNT)
+
+
+def get_executor():
+    """Пул процессов проверки (создаётся и прогревается при первом обращении)"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            workers = settings.JUDGE_WORKERS
+            # forkserver: рабочие процессы не наследуют соединения с БД и потоки Django
+            context = multiprocessing.get_context(
+                'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+            )
+            _executor = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+            for _ in range(workers):
+                _executor.submit(sandbox.normalize_output, '')
+        return _executor
+
+
+def submit(enrollment, step, code):
+    """
+    Поставить код в очередь на проверку. Возвращает CodeSubmission.
+    SandboxNotConfigured - песочница не настроена (см. is_available).
+    """
+    if not is_available():
+        raise SandboxNotConfigured('JUDGE_SANDBOX_UID не задан')
+    submission = CodeSubmission.objects.create(
+        enrollment=enrollment, step=step, code=code, total=len(step.content['tests'])
+    )
+    if not getattr(settings, 'JUDGE_WORKERS', 0):
+        run(submission)
+        submission.refresh_from_db()
+        return submission
+
+    # Задание видно рабочему процессу только после фиксации транзакции
+    transaction.on_commit(lambda: enqueue(submission))
+    return submission
+
+
+def _arguments(submission):
+    time_limit, memory = _limits(submission.step)
+    tests = list(submission.step.content.get('tests') or [])
+    return submission.code, tests, time_limit, memory, _sandbox_uids()
+
+
+def run(submission):
+    """Проверить задание в текущем процессе"""
+    return finish(submission.pk, sandbox.run_tests(*_arguments(submission)))
+
+
+def enqueue(submission):
+    """Отправить задание в пул процессов"""
+    future = get_executor().submit(sandbox.run_tests, *_arguments(submission))
+    future.add_done_callback(lambda f: _on_done(submission.pk, f))
+
+
+def _on_done(submission_id, future):
+    """Колбэк пула (выполняется в служебном потоке процесса Django)"""
+    try:
+        results = future.result()
+    except Exception:
+        logger.exception('Ошибка проверки кода %s', submission_id)
+        CodeSubmission.objects.filter(pk=submission_id, status='queued').update(
+            status='error', finished_at=timezone.now())
+    else:
+        finish(submission_id, results)
+    finally:
+        close_old_connections()
+
+
+def finish(submission_id, results):
+    """
+    Сохранить результаты тестов и засчитать шаг при успехе.
+    Уже завершённое задание (повторный запуск, истёкшее) не меняется.
+    Неуспех сбрасывает is_correct, только если новее заданий нет -
+    медленная старая попытка не перетирает результат новой.
+    """
+    passed = sum(1 for result in results if result['status'] == sandbox.OK)
+    with transaction.atomic():
+        submission = CodeSubmission.objects.select_for_update().select_related(
+            'step', 'enrollment').get(pk=submission_id)
+        if submission.status != 'queued':
+            return submission
+        submission.status = 'done'
+        submission.results = results
+        submission.passed = passed
+        submission.finished_at = timezone.now()
+        submission.save(update_fields=['status', 'results', 'passed', 'finished_at'])
+
+        progress = StepProgress.objects.select_for_update().filter(
+            enrollment=submission.enrollment, step=submission.step).first()
+        if progress is None:
+            return submission
+        if submission.is_correct:
+            progress.is_correct = True
+            progress.save(update_fields=['is_correct'])
+            complete_step(submission.enrollment, submission.step, progress)
+        elif not CodeSubmission.objects.filter(
+                enrollment=submission.enrollment, step=submission.step,
+                created_at__gt=submission.created_at).exists():
+            progress.is_correct = False
+            progress.save(update_fields=['is_correct'])
+    return submission
+
+
+def stale_submissions(older_than):
+    """Задания, ждущие в очереди дольше older_than секунд (пул перезапущен)"""
+    return CodeSubmission.objects.filter(
+        status='queued', created_at__lt=timezone.now() - timedelta(seconds=older_than)
+    ).select_related('step')
+
+
+def expire(submissions):
+    """Отметить задания ошибкой - клиент предложит отправить код ещё раз"""
+    return CodeSubmission.objects.filter(
+        pk__in=[submission.pk for submission in submissions], status='queued'
+    ).update(status='error', finished_at=timezone.now())
+
+
+def describe(submission):
+    """JSON-представление задания для клиента"""
+    data = {
+        'success': True,
+        'job_id': str(submission.pk),
+        'poll_url': reverse('api_code_submission', kwargs={'job_id': submission.pk}),
+        'status': submission.status,
+        'pending': submission.status == 'queued',
+        'passed': submission.passed,
+        'total': submission.total,
+        'tests': submission.results,
+    }
+    if submission.status == 'done':
+        data['is_correct'] = submission.is_correct
+        data['message'] = (
+            f'Все тесты пройдены ({submission.passed}/{submission.total}) ✓'
+            if submission.is_correct else
+            f'Пройдено тестов: {submission.passed} из {submission.total}. Попробуйте еще раз.'
+        )
+    elif submission.status == 'error':
+        data['is_correct'] = False
+        data['message'] = 'Ошибка проверки. Попробуйте отправить код еще раз.'
+    else:
+        data['message'] = 'Код проверяется...'
+    return data
@@ -0,0 +1,236 @@
+"""
+Бенчмарк студенческих страниц и API: задержка (p50/p95), число
+SQL-запросов и пиковая память на запрос.
+
+Команда создаёт отдельную тестовую БД, заполняет её командой
+generate_load_data (детерминированно, --seed) и прогоняет запросы
+через тестовый клиент Django. Рабочая БД не затрагивается.
+
+Отчёт - JSON с отсортированными ключами: отчёты двух коммитов удобно
+сравнивать diff-ом или флагом --compare.
+
+Использование:
+    python manage.py benchmark
+    python manage.py benchmark --iterations 100 --output bench.json
+    python manage.py benchmark --courses 100 --students 2000 --compare bench.json
+    DB_ENGINE=postgresql python manage.py benchmark --output bench-pg.json
+"""
+import json
+import platform
+import statistics
+import subprocess
+import time
+import tracemalloc
+from io import StringIO
+
+import django
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import (CaptureQueriesContext, setup_test_environment,
+                               teardown_test_environment)
+from django.urls import reverse
+
+# Сценарий -> (метод, функция построения запроса по фикстуре)
+SCENARIOS = {
+    'course_list': lambda f: ('get', reverse('course_list'), None),
+    'course_detail': lambda f: ('get', reverse('course_detail', kwargs={'slug': f['course'].slug}), None),
+    'lesson_view': lambda f: ('get', reverse('lesson_view', kwargs={'lesson_id': f['lesson'].id}), None),
+    'my_courses': lambda f: ('get', reverse('my_courses'), None),
+    'step_check_answer': lambda f: (
+        'post', reverse('api_step_check', kwargs={'step_id': f['quiz_step'].id}),
+        {'selected_index': 0},
+    ),
+    'step_complete': lambda f: (
+        'post', reverse('api_step_complete', kwargs={'step_id': next(f['content_steps']).id}), None,
+    ),
+}
+
+
+def percentile(values, percent):
+    """Процентиль с линейной интерполяцией"""
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method='inclusive')[percent - 1]
+
+
+def database_profile():
+    """Настройки БД, влияющие на результат (DB_ENGINE в settings)"""
+    profile = {
+        'vendor': connection.vendor,
+        'conn_max_age': connection.settings_dict['CONN_MAX_AGE'],
+    }
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            for pragma in ('journal_mode', 'synchronous', 'busy_timeout'):
+                profile[pragma] = cursor.execute(f'PRAGMA {pragma}').fetchone()[0]
+    return profile
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+            cwd=settings.BASE_DIR, timeout=5,
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = 'Измеряет задержку, число запросов и память студенческих страниц'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=30,
+                            help='Замеров на сценарий (по умолчанию 30)')
+        parser.add_argument('--warmup', type=int, default=3,
+                            help='Прогревочных запросов на сценарий (по умолчанию 3)')
+        parser.add_argument('--scenario', action='append', choices=sorted(SCENARIOS),
+                            help='Только указанные сценарии (можно несколько раз)')
+        parser.add_argument('--courses', type=int, default=20, help='Курсов в наборе данных')
+        parser.add_argument('--students', type=int, default=200, help='Студентов в наборе данных')
+        parser.add_argument('--steps', type=int, default=5, help='Шагов в уроке')
+        parser.add_argument('--seed', type=int, default=42, help='Seed набора данных')
+        parser.add_argument('--output', help='Сохранить JSON-отчёт в файл')
+        parser.add_argument('--compare', help='Сравнить с ранее сохранённым отчётом')
+
+    def handle(self, *args, **options):
+        if options['iterations'] < 1:
+            raise CommandError('--iterations должен быть больше 0')
+        baseline = self.load_report(options['compare']) if options['compare'] else None
+
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            self.stdout.write(self.style.HTTP_INFO('📦 Генерация набора данных...'))
+            started = time.monotonic()
+            call_command(
+                'generate_load_data', courses=options['courses'], students=options['students'],
+                steps=options['steps'], seed=options['seed'], stdout=StringIO(),
+            )
+            self.stdout.write(f'   Готово за {time.monotonic() - started:.1f} с')
+            database = database_profile()
+            results = self.run_scenarios(options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        report = {
+            'meta': {
+                'git_revision': git_revision(),
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': database,
+                'iterations': options['iterations'],
+                'dataset': {key: options[key] for key in ('courses', 'students', 'steps', 'seed')},
+            },
+            'results': results,
+        }
+        self.print_report(results, baseline)
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(report, f, ensure_ascii=False, indent=2, sort_keys=True)
+            self.stdout.write(self.style.SUCCESS(f'✅ Отчёт сохранён: {options["output"]}'))
+
+    def load_report(self, path):
+        try:
+            with open(path, encoding='utf-8') as f:
+                return json.load(f)['results']
+        except (OSError, ValueError, KeyError) as e:
+            raise CommandError(f'Не удалось прочитать отчёт {path}: {e}')
+
+    def build_fixture(self):
+        """Самый популярный курс, его активный студент и шаги урока"""
+        from courses.models import Course, Enrollment, Step
+
+        course = Course.objects.filter(status='published').order_by('-students_count', 'id').first()
+        if course is None:
+            raise CommandError('В наборе данных нет опубликованных курсов')
+        enrollment = Enrollment.objects.filter(course=course).select_related('student').order_by(
+            '-completed_steps_count', 'id').first()
+        steps = Step.objects.filter(lesson__section__course=course).select_related('lesson').order_by(
+            'lesson__section__order', 'lesson__order', 'order')
+        quiz_step = steps.filter(step_type='quiz_single').first()
+        content_steps = list(steps.filter(step_type__in=['text', 'video']))
+        if quiz_step is None or not content_steps:
+            raise CommandError('В курсе нет шагов quiz_single или text/video - увеличьте --steps')
+
+        def cycle(items):
+            # step_complete проходит по новым шагам, затем повторяет уже пройденные
+            while True:
+                yield from items
+
+        return {
+            'course': course,
+            'student': enrollment.student,
+            'lesson': quiz_step.lesson,
+            'quiz_step': quiz_step,
+            'content_steps': cycle(content_steps),
+        }
+
+    def run_scenarios(self, options):
+        fixture = self.build_fixture()
+        client = Client()
+        client.force_login(fixture['student'])
+        results = {}
+        for name in options['scenario'] or SCENARIOS:
+            self.stdout.write(f'⏱  {name}...')
+            results[name] = self.measure(client, fixture, SCENARIOS[name], options)
+        return results
+
+    def request(self, client, fixture, scenario):
+        method, url, data = scenario(fixture)
+        if method == 'post':
+            response = client.post(url, data=json.dumps(data or {}), content_type='application/json')
+        else:
+            response = client.get(url)
+        if response.status_code >= 400:
+            raise CommandError(f'{method.upper()} {url}: HTTP {response.status_code}')
+        return url
+
+    def measure(self, client, fixture, scenario, options):
+        for _ in range(options['warmup']):
+            self.request(client, fixture, scenario)
+
+        timings, queries = [], []
+        for _ in range(options['iterations']):
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                url = self.request(client, fixture, scenario)
+                timings.append((time.perf_counter() - started) * 1000)
+            queries.append(len(captured))
+
+        # Память - отдельным запросом: tracemalloc замедляет выполнение
+        tracemalloc.start()
+        try:
+            self.request(client, fixture, scenario)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        return {
+            'url': url,
+            'p50_ms': round(percentile(timings, 50), 2),
+            'p95_ms': round(percentile(timings, 95), 2),
+            'mean_ms': round(statistics.fmean(timings), 2),
+            'max_ms': round(max(timings), 2),
+            'queries': max(queries),
+            'queries_min': min(queries),
+            'memory_peak_kb': round(peak / 1024, 1),
+        }
+
+    def print_report(self, results, baseline=None):
+        self.stdout.write('')
+        self.stdout.write(f'{"Сценарий":<20} {"p50, мс":>9} {"p95, мс":>9} {"SQL":>5} {"Память, КБ":>11}')
+        for name, result in results.items():
+            line = (f'{name:<20} {result["p50_ms"]:>9.2f} {result["p95_ms"]:>9.2f} '
+                    f'{result["queries"]:>5} {result["memory_peak_kb"]:>11.1f}')
+            previous = (baseline or {}).get(name)
+            if previous:
+                line += (f'   Δ p50 {result["p50_ms"] - previous["p50_ms"]:+.2f} мс, '
+                         f'SQL {result["queries"] - previous["queries"]:+d}')
+            self.stdout.write(line)
+        self.stdout.write('')
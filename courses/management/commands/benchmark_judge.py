@@ -0,0 +1,66 @@
+"""
+Пропускная способность проверки кода: решений в секунду
+для пула из N процессов (courses/sandbox.py, без БД).
+
+Использование:
+    python manage.py benchmark_judge
+    python manage.py benchmark_judge --submissions 200 --workers 8
+"""
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from courses import sandbox
+
+SOLUTION = 'n = int(input())\nprint(sum(i * i for i in range(n)))\n'
+TESTS = [
+    {'input': str(n), 'expected_output': str(sum(i * i for i in range(n)))}
+    for n in (10, 1000, 100000)
+]
+
+
+class Command(BaseCommand):
+    help = 'Измеряет пропускную способность пула проверки кода'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--submissions', type=int, default=50,
+                            help='Количество решений (по умолчанию 50)')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='Процессов в пуле (по умолчанию - число ядер)')
+
+    def handle(self, *args, **options):
+        submissions = options['submissions']
+        self.stdout.write(self.style.HTTP_INFO(
+            f'⚙️  Решений: {submissions}, тестов в решении: {len(TESTS)}'
+        ))
+        for workers in sorted({1, options['workers']}):
+            elapsed = self._measure(submissions, workers)
+            self.stdout.write(
+                f'  Процессов: {workers:<3} {submissions / elapsed:8.1f} решений/с '
+                f'({elapsed:.2f} с)'
+            )
+
+    def _measure(self, submissions, workers):
+        context = multiprocessing.get_context(
+            'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+        )
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+            # Прогрев: запуск процессов пула не входит в замер
+            list(pool.map(sandbox.normalize_output, [''] * workers))
+            started = time.perf_counter()
+            futures = [
+                pool.submit(sandbox.run_tests, SOLUTION, TESTS, 5)
+                for _ in range(submissions)
+            ]
+            results = [future.result() for future in futures]
+            elapsed = time.perf_counter() - started
+
+        failed = sum(
+            1 for tests in results for test in tests if test['status'] != sandbox.OK
+        )
+        if failed:
+            self.stdout.write(self.style.WARNING(f'⚠️  Непройденных тестов: {failed}'))
+        return elapsed
@@ -0,0 +1,99 @@
+"""
+Микро-бенчмарк рендеринга Markdown: создание движка на каждый вызов
+против переиспользуемого движка потока (courses/rendering.py).
+
+Корпус - реальные тексты уроков из команды populate_content
+(БД не используется, кеш HTML не задействуется).
+
+Использование:
+    python manage.py benchmark_markdown
+    python manage.py benchmark_markdown --rounds 20
+"""
+import time
+from io import StringIO
+
+from django.core.management.base import BaseCommand
+
+from courses import rendering
+from courses.management.commands import populate_content
+
+
+class _ContentCollector(populate_content.Command):
+    """populate_content, который собирает тексты вместо записи в БД"""
+
+    def __init__(self):
+        super().__init__(stdout=StringIO())
+        self.texts = []
+
+    def update_lesson(self, lesson_id, content):
+        self.texts.append(content)
+
+
+def lesson_corpus():
+    collector = _ContentCollector()
+    collector.update_python_lessons()
+    return collector.texts
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает создание движка Markdown на вызов и пул движков'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rounds',
+            type=int,
+            default=10,
+            help='Сколько раз отрендерить весь корпус (по умолчанию 10)',
+        )
+
+    def handle(self, *args, **options):
+        texts = lesson_corpus()
+        rounds = options['rounds']
+        documents = len(texts) * rounds
+
+        self.stdout.write(self.style.HTTP_INFO(
+            f'📚 Корпус: {len(texts)} уроков, '
+            f'{sum(len(t) for t in texts)} символов, раундов: {rounds}'
+        ))
+
+        results = [
+            ('Markdown() на каждый вызов', self._measure(
+                texts, rounds, lambda text: rendering.build_engine().convert(text))),
+            ('Движок потока + reset()', self._measure(
+                texts, rounds, rendering.convert_markdown)),
+        ]
+
+        try:
+            import bleach  # noqa: F401
+        except ImportError:
+            self.stdout.write(self.style.WARNING('⚠️  bleach не установлен - очистка HTML пропущена'))
+        else:
+            html = [rendering.convert_markdown(text) for text in texts]
+            results += [
+                ('bleach.clean() на каждый вызов', self._measure(
+                    html, rounds, lambda doc: bleach.clean(
+                        doc, tags=rendering.ALLOWED_TAGS,
+                        attributes=rendering.ALLOWED_ATTRIBUTES))),
+                ('Cleaner потока', self._measure(
+                    html, rounds, lambda doc: rendering.get_cleaner().clean(doc))),
+            ]
+
+        self.stdout.write('')
+        for name, elapsed in results:
+            self.stdout.write(
+                f'  {name:<32} {elapsed * 1000 / documents:8.3f} мс/документ'
+            )
+
+        per_call, pooled = results[0][1], results[1][1]
+        self.stdout.write('')
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Ускорение Markdown: x{per_call / pooled:.2f}'
+        ))
+
+    def _measure(self, texts, rounds, render):
+        render(texts[0])  # прогрев (импорты, лексеры Pygments)
+        started = time.perf_counter()
+        for _ in range(rounds):
+            for text in texts:
+                render(text)
+        return time.perf_counter() - started
@@ -0,0 +1,38 @@
+"""
+Применить журналы буфера отметок шагов (courses/completions.py).
+
+Журнал работающего процесса он записывает сам; команда нужна для
+журналов процессов, завершившихся аварийно (например, после
+перезапуска сервера). Журналы работающих процессов пропускаются
+(их удерживает flock владельца). Повторное применение безопасно.
+
+Использование:
+    python manage.py flush_step_completions
+"""
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from courses.completions import replay_journals
+
+
+class Command(BaseCommand):
+    help = 'Записывает в БД отметки шагов из журналов буфера'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dir', help='Каталог журналов (по умолчанию STEP_COMPLETION_JOURNAL_DIR)')
+
+    def handle(self, *args, **options):
+        directory = options['dir'] or settings.STEP_COMPLETION_JOURNAL_DIR
+        if options['dir'] and not Path(directory).is_dir():
+            raise CommandError(f'Каталог {directory} не найден')
+
+        started = time.monotonic()
+        files, completed = replay_journals(directory)
+        elapsed = time.monotonic() - started
+
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Журналов применено: {files}, впервые пройдено шагов: {completed} ({elapsed:.2f} с)'
+        ))
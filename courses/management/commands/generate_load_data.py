@@ -0,0 +1,322 @@
+"""
+Генерация синтетических данных для нагрузочного тестирования.
+
+Создаёт N курсов × разделы × уроки × шаги, M студентов и
+правдоподобные распределения:
+- записи на курсы: популярность курсов по закону Ципфа
+  (несколько курсов-хитов и длинный хвост);
+- прогресс: доля пройденных шагов ~ Beta(0.7, 1.3) - многие
+  бросают в начале, немногие доходят до конца;
+- отзывы: оставляют в основном продвинувшиеся студенты,
+  оценки смещены к 4-5.
+
+Все записи создаются через bulk_create пачками, случайность
+детерминирована (--seed): одинаковые параметры - одинаковые данные.
+Производные данные (счётчики прогресса, статистика курсов,
+поисковый индекс) пересчитываются в конце set-based запросами.
+--clear удаляет данные с отключёнными обработчиками post_delete
+(одним DELETE на таблицу) и так же пересчитывает статистику в конце.
+
+Использование:
+    python manage.py generate_load_data                          # Профиль по умолчанию
+    python manage.py generate_load_data --courses 200 --students 5000
+    python manage.py generate_load_data --clear                  # Удалить ранее созданные данные
+"""
+import random
+import time
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from courses.grading import build_public_content
+from courses.models import (Category, Course, Enrollment, Lesson, LessonProgress,
+                            Review, Section, Step, StepProgress)
+from courses.progress import recompute_counters
+from courses.search import rebuild_index
+from courses.signals import delete_receivers_disconnected
+from courses.stats import recompute_course_stats
+from profiles.models import UserProfile
+
+PASSWORD = 'loadtest123'
+LEVELS = ['beginner', 'intermediate', 'advanced']
+CATEGORIES = ['Программирование', 'Бизнес', 'Маркетинг', 'Дизайн', 'Личное развитие']
+TOPICS = ['Python', 'Django', 'SQL', 'JavaScript', 'Git', 'Docker', 'Linux', 'Алгоритмы']
+RATING_WEIGHTS = [3, 4, 10, 33, 50]  # 1..5 звёзд
+
+# Небольшой набор текстов: Markdown рендерится один раз на вариант
+TEXT_VARIANTS = [
+    f'# Тема {n}\n\nТеория урока **{n}**.\n\n- пункт 1\n- пункт 2\n\n`print({n})`'
+    for n in range(10)
+]
+
+
+def step_content(step_type, rng, n):
+    """content шага с правильными ответами (как в конструкторе курса)"""
+    if step_type == 'text':
+        return {'markdown': rng.choice(TEXT_VARIANTS)}
+    if step_type == 'video':
+        return {'url': f'https://www.youtube.com/embed/load{n}', 'duration': rng.randint(60, 1200),
+                'source': 'youtube'}
+    if step_type == 'quiz_single':
+        return {'question': f'Вопрос {n}', 'choices': ['A', 'B', 'C', 'D'],
+                'correct_index': rng.randrange(4), 'explanation': 'Пояснение'}
+    if step_type == 'quiz_multiple':
+        return {'question': f'Вопрос {n}', 'choices': ['A', 'B', 'C', 'D'],
+                'correct_indexes': sorted(rng.sample(range(4), 2)), 'explanation': 'Пояснение'}
+    if step_type == 'numeric':
+        return {'question': f'Сколько будет {n} * 2?', 'answer': n * 2, 'tolerance': 0}
+    if step_type == 'text_answer':
+        return {'question': 'Как называется язык?', 'patterns': ['^python$'], 'case_sensitive': False}
+    return {'language': 'python', 'template': 'def solve():\n    pass'}
+
+
+# Тип шага -> вес в уроке
+STEP_TYPES = {
+    'text': 35, 'video': 15, 'quiz_single': 20, 'quiz_multiple': 10,
+    'numeric': 8, 'text_answer': 7, 'code': 5,
+}
+
+
+class Command(BaseCommand):
+    help = 'Генерирует синтетические данные для нагрузочного тестирования'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--courses', type=int, default=20, help='Количество курсов (20)')
+        parser.add_argument('--sections', type=int, default=5, help='Разделов в курсе (5)')
+        parser.add_argument('--lessons', type=int, default=6, help='Уроков в разделе (6)')
+        parser.add_argument('--steps', type=int, default=5, help='Шагов в уроке (5)')
+        parser.add_argument('--students', type=int, default=200, help='Количество студентов (200)')
+        parser.add_argument('--enrollments', type=float, default=4,
+                            help='Среднее число курсов на студента (4)')
+        parser.add_argument('--seed', type=int, default=42, help='Seed генератора случайных чисел')
+        parser.add_argument('--prefix', default='load',
+                            help='Префикс логинов и slug (по умолчанию "load")')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Размер пачки bulk_create')
+        parser.add_argument('--clear', action='store_true',
+                            help='Удалить данные с этим префиксом и выйти')
+
+    def handle(self, *args, **options):
+        self.prefix = options['prefix']
+        self.batch_size = options['batch_size']
+        if options['clear']:
+            self.clear()
+            return
+        if Course.objects.filter(slug__startswith=f'{self.prefix}-').exists():
+            raise CommandError(
+                f'Данные с префиксом "{self.prefix}" уже есть. '
+                f'Удалите их: python manage.py generate_load_data --clear --prefix {self.prefix}'
+            )
+
+        self.rng = random.Random(options['seed'])
+        self.started = time.monotonic()
+        with transaction.atomic():
+            categories = self.create_categories()
+            instructors, students = self.create_users(options['courses'], options['students'])
+            courses = self.create_courses(options['courses'], categories, instructors)
+            steps_by_course = self.create_structure(
+                courses, options['sections'], options['lessons'], options['steps'])
+            enrollments = self.create_enrollments(courses, students, options['enrollments'])
+            progress = self.create_progress(enrollments, steps_by_course)
+            self.create_reviews(enrollments, progress)
+
+            self.log('🔄 Пересчёт счётчиков...')
+            recompute_counters(Enrollment.objects.filter(course__in=courses))
+            recompute_course_stats(Course.objects.filter(pk__in=[c.pk for c in courses]))
+            rebuild_index()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Данные созданы за {time.monotonic() - self.started:.1f} с '
+            f'(пароль пользователей: {PASSWORD})'
+        ))
+
+    def log(self, message):
+        self.stdout.write(f'{message} [{time.monotonic() - self.started:.1f} с]')
+
+    def bulk(self, model, objects):
+        """bulk_create пачками; на SQLite/PostgreSQL pk проставляются объектам"""
+        model.objects.bulk_create(objects, batch_size=self.batch_size)
+        return objects
+
+    def clear(self):
+        with transaction.atomic(), delete_receivers_disconnected():
+            courses = Course.objects.filter(slug__startswith=f'{self.prefix}-')
+            users = User.objects.filter(username__startswith=f'{self.prefix}_')
+            # Курсы без префикса, на которые записаны удаляемые пользователи
+            affected = set(Enrollment.objects.filter(student__in=users).exclude(
+                course__in=courses).values_list('course_id', flat=True))
+            affected.update(Review.objects.filter(student__in=users).exclude(
+                course__in=courses).values_list('course_id', flat=True))
+
+            course_count = courses.count()
+            courses.delete()
+            users = users.delete()[1].get('auth.User', 0)
+            Category.objects.filter(slug__startswith=f'{self.prefix}-').delete()
+
+            recompute_course_stats(Course.objects.filter(pk__in=affected))
+            rebuild_index()
+        self.stdout.write(self.style.SUCCESS(
+            f'🗑️  Удалено курсов: {course_count}, пользователей: {users}'
+        ))
+
+    def create_categories(self):
+        return self.bulk(Category, [
+            Category(name=f'{name} ({self.prefix})', slug=f'{self.prefix}-category-{i}')
+            for i, name in enumerate(CATEGORIES)
+        ])
+
+    def create_users(self, course_count, student_count):
+        # Хеш пароля вычисляется один раз - PBKDF2 на каждого пользователя занял бы минуты
+        password = make_password(PASSWORD)
+        instructor_count = max(1, course_count // 5)
+        users = self.bulk(User, [
+            User(username=f'{self.prefix}_instructor_{i}', password=password,
+                 first_name='Преподаватель', last_name=str(i))
+            for i in range(instructor_count)
+        ] + [
+            User(username=f'{self.prefix}_student_{i}', password=password,
+                 first_name='Студент', last_name=str(i))
+            for i in range(student_count)
+        ])
+        # Профили создаются сигналом post_save, который bulk_create не вызывает
+        self.bulk(UserProfile, [
+            UserProfile(user=user, is_instructor=index < instructor_count)
+            for index, user in enumerate(users)
+        ])
+        self.log(f'👥 Пользователей: {len(users)}')
+        return users[:instructor_count], users[instructor_count:]
+
+    def create_courses(self, count, categories, instructors):
+        now = timezone.now()
+        courses = []
+        for i in range(count):
+            topic = self.rng.choice(TOPICS)
+            is_free = self.rng.random() < 0.3
+            courses.append(Course(
+                title=f'{topic}: курс {i}',
+                slug=f'{self.prefix}-course-{i}',
+                subtitle=f'Практический курс по {topic}',
+                description=f'Синтетический курс {i} по теме {topic} для нагрузочного тестирования.',
+                instructor=instructors[i % len(instructors)],
+                category=self.rng.choice(categories),
+                level=self.rng.choice(LEVELS),
+                language='Русский',
+                is_free=is_free,
+                price=0 if is_free else self.rng.choice([990, 1990, 2990, 4990]),
+                duration_hours=self.rng.randint(2, 60),
+                # 90% опубликованы, остальные - черновики
+                status='published' if self.rng.random() < 0.9 else 'draft',
+                published_at=now - timedelta(days=self.rng.randint(0, 700)),
+            ))
+        self.log(f'📚 Курсов: {count}')
+        return self.bulk(Course, courses)
+
+    def create_structure(self, courses, sections_per_course, lessons_per_section, steps_per_lesson):
+        sections = self.bulk(Section, [
+            Section(course=course, title=f'Раздел {s + 1}', order=s)
+            for course in courses for s in range(sections_per_course)
+        ])
+        lessons = self.bulk(Lesson, [
+            Lesson(section=section, title=f'Урок {l + 1}', order=l,
+                   duration_minutes=self.rng.randint(5, 40), is_preview=l == 0)
+            for section in sections for l in range(lessons_per_section)
+        ])
+
+        types, weights = zip(*STEP_TYPES.items())
+        steps = []
+        for lesson in lessons:
+            for order in range(steps_per_lesson):
+                step_type = self.rng.choices(types, weights)[0]
+                step = Step(
+                    lesson=lesson, step_type=step_type, order=order,
+                    content=step_content(step_type, self.rng, len(steps)),
+                    points=0 if step_type in ('text', 'video') else self.rng.choice([1, 2, 5]),
+                )
+                # bulk_create не вызывает Step.save()
+                step.public_content = build_public_content(step)
+                steps.append(step)
+        self.bulk(Step, steps)
+        self.log(f'🧩 Разделов: {len(sections)}, уроков: {len(lessons)}, шагов: {len(steps)}')
+
+        course_by_section = {section.pk: section.course_id for section in sections}
+        course_by_lesson = {lesson.pk: course_by_section[lesson.section_id] for lesson in lessons}
+        steps_by_course = {}
+        for step in steps:
+            steps_by_course.setdefault(course_by_lesson[step.lesson_id], []).append(step)
+        return steps_by_course
+
+    def create_enrollments(self, courses, students, per_student):
+        published = [course for course in courses if course.status == 'published']
+        if not published:
+            return []
+        # Закон Ципфа: вес курса с рангом r пропорционален 1/r
+        weights = [1 / rank for rank in range(1, len(published) + 1)]
+        enrollments = []
+        for student in students:
+            count = min(len(published), max(1, round(self.rng.expovariate(1 / per_student))))
+            chosen = set()
+            while len(chosen) < count:
+                chosen.add(self.rng.choices(range(len(published)), weights)[0])
+            enrollments.extend(
+                Enrollment(student=student, course=published[index]) for index in sorted(chosen)
+            )
+        self.bulk(Enrollment, enrollments)
+        self.log(f'🎓 Записей на курсы: {len(enrollments)}')
+        return enrollments
+
+    def create_progress(self, enrollments, steps_by_course):
+        now = timezone.now()
+        step_progress = []
+        lesson_progress = []
+        completed_enrollments = []
+        done_by_enrollment = {}
+        for enrollment in enrollments:
+            steps = steps_by_course.get(enrollment.course_id, [])
+            done = round(len(steps) * self.rng.betavariate(0.7, 1.3))
+            done_by_enrollment[enrollment.pk] = done / len(steps) if steps else 0
+            # Студент проходит курс по порядку: пройден префикс шагов
+            lessons = {}
+            for index, step in enumerate(steps):
+                completed = index < done
+                lessons.setdefault(step.lesson_id, []).append(completed)
+                if completed:
+                    step_progress.append(StepProgress(
+                        enrollment=enrollment, step=step, status='completed', completed=True,
+                        is_correct=True if step.points else None, attempts=1,
+                        score=step.points, max_score=step.points, completed_at=now,
+                    ))
+            for lesson_id, flags in lessons.items():
+                if flags[0]:
+                    lesson_progress.append(LessonProgress(
+                        enrollment=enrollment, lesson_id=lesson_id, completed=all(flags),
+                        completed_at=now if all(flags) else None,
+                    ))
+            if steps and done == len(steps):
+                enrollment.completed = True
+                enrollment.completed_at = now
+                completed_enrollments.append(enrollment)
+
+        self.bulk(StepProgress, step_progress)
+        self.bulk(LessonProgress, lesson_progress)
+        Enrollment.objects.bulk_update(completed_enrollments, ['completed', 'completed_at'],
+                                       batch_size=self.batch_size)
+        self.log(f'📈 Прогресс: {len(step_progress)} шагов, {len(lesson_progress)} уроков')
+        return done_by_enrollment
+
+    def create_reviews(self, enrollments, progress):
+        reviews = []
+        for enrollment in enrollments:
+            # Отзыв чаще оставляют те, кто продвинулся в курсе
+            chance = 0.05 + 0.4 * progress[enrollment.pk]
+            if self.rng.random() < chance:
+                rating = self.rng.choices(range(1, 6), RATING_WEIGHTS)[0]
+                reviews.append(Review(
+                    course_id=enrollment.course_id, student_id=enrollment.student_id,
+                    rating=rating, title=f'Оценка {rating}',
+                    comment='Синтетический отзыв для нагрузочного тестирования.',
+                ))
+        self.bulk(Review, reviews)
+        self.log(f'⭐ Отзывов: {len(reviews)}')
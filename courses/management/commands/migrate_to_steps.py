@@ -2,27 +2,157 @@
 Management command для миграции существующих уроков в Step-формат.
 
 Выполняет:
-1. Видео уроки -> Step (type=video)
-2. Статьи -> Step (type=text)
-3. Тесты (Quiz) -> Step[] (type=quiz_single/quiz_multiple)
-4. Задания (Assignment) -> Step (type=free_answer)
+1. Тесты (Quiz) -> Step[] (type=quiz_single/quiz_multiple)
+2. Задания (Assignment) -> Step (type=free_answer)
+
+Видео и статьи (Lesson.lesson_type/content/video_url) удалены миграцией
+0011 - их контент уже перенесён в шаги.
+
+Уроки обрабатываются диапазонами id (--chunk-size): каждый диапазон -
+одна транзакция с bulk_create шагов и записью StepMigrationCheckpoint.
+Прерванная миграция продолжается с необработанных диапазонов;
+повторная обработка безопасна - уроки, у которых уже есть шаги,
+пропускаются. С --workers N диапазоны обрабатываются пулом процессов
+(для PostgreSQL; SQLite допускает только одного пишущего).
 
 Использование:
-    python manage.py migrate_to_steps           # Показать что будет мигрировано
-    python manage.py migrate_to_steps --execute # Выполнить миграцию
-    python manage.py migrate_to_steps --reset   # Удалить все Step и мигрировать заново
+    python manage.py migrate_to_steps                       # Показать что будет мигрировано
+    python manage.py migrate_to_steps --execute             # Выполнить миграцию
+    python manage.py migrate_to_steps --execute --workers 4 # Параллельно, 4 процесса
+    python manage.py migrate_to_steps --execute --restart   # Игнорировать чекпоинты
+    python manage.py migrate_to_steps --reset               # Удалить все Step и мигрировать заново
 """
+import multiprocessing
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections, transaction
+from django.db.models import Exists, OuterRef
+
+from courses.grading import build_public_content
+from courses.models import Lesson, Question, Step, StepMigrationCheckpoint
+from courses.outline import invalidate_outline
+
+
+def lessons_without_steps():
+    return Lesson.objects.annotate(
+        has_steps=Exists(Step.objects.filter(lesson=OuterRef('pk')))
+    ).filter(has_steps=False)
+
+
+def make_chunks(lesson_ids, chunk_size):
+    """Диапазоны (первый id, последний id) по chunk_size уроков"""
+    return [
+        (lesson_ids[i], lesson_ids[min(i + chunk_size, len(lesson_ids)) - 1])
+        for i in range(0, len(lesson_ids), chunk_size)
+    ]
+
+
+def quiz_step(lesson, order, question):
+    """Вопрос теста -> Step (type=quiz_single/quiz_multiple)"""
+    choices = list(question.choices.all())
+    correct_indexes = [i for i, c in enumerate(choices) if c.is_correct]
+    content = {
+        'question': question.text,
+        'choices': [c.text for c in choices],
+        'explanation': question.explanation or '',
+    }
+    # Определяем тип: single или multiple
+    if question.type == 'multiple' or len(correct_indexes) > 1:
+        step_type = 'quiz_multiple'
+        content['correct_indexes'] = correct_indexes
+    else:
+        step_type = 'quiz_single'
+        content['correct_index'] = correct_indexes[0] if correct_indexes else 0
+    return Step(
+        lesson=lesson,
+        step_type=step_type,
+        order=order,
+        title=f'Вопрос {order + 1}',
+        content=content,
+        points=question.points,
+        is_required=True,
+    )
 
-from django.core.management.base import BaseCommand
-from django.db import transaction
-from courses.models import (
-    Lesson, Quiz, Question, QuestionChoice, Assignment, Step
-)
+
+def assignment_step(lesson, assignment):
+    """Задание -> Step (type=free_answer)"""
+    content = {
+        'question': assignment.description or 'Выполните задание.',
+        'min_length': 50,
+        'rubric': f'Максимум баллов: {assignment.max_points}',
+        'max_points': assignment.max_points,
+    }
+    return Step(
+        lesson=lesson,
+        step_type='free_answer',
+        order=0,
+        title=lesson.title,
+        content=content,
+        points=assignment.max_points,
+        is_required=True,
+    )
+
+
+def migrate_chunk(start_id, end_id):
+    """
+    Мигрировать уроки с id в [start_id, end_id] одной транзакцией.
+    Выполняется и в основном процессе, и в рабочих процессах пула.
+    Возвращает Counter: lessons, steps, quiz, assignment.
+    """
+    stats = Counter()
+    with transaction.atomic():
+        lessons = list(
+            lessons_without_steps().filter(id__range=(start_id, end_id))
+            .select_related('quiz', 'assignment').order_by('id')
+        )
+        questions = defaultdict(list)
+        for question in Question.objects.filter(
+            quiz__lesson__in=lessons
+        ).select_related('quiz').prefetch_related('choices').order_by('quiz_id', 'order', 'created_at'):
+            questions[question.quiz.lesson_id].append(question)
+
+        steps = []
+        for lesson in lessons:
+            if lesson.id in questions:
+                steps.extend(
+                    quiz_step(lesson, order, question)
+                    for order, question in enumerate(questions[lesson.id])
+                )
+                stats['quiz'] += 1
+            elif hasattr(lesson, 'assignment'):
+                steps.append(assignment_step(lesson, lesson.assignment))
+                stats['assignment'] += 1
+            else:
+                continue
+            stats['lessons'] += 1
+
+        # bulk_create не вызывает Step.save() и сигналы
+        for step in steps:
+            step.public_content = build_public_content(step)
+        Step.objects.bulk_create(steps, batch_size=1000)
+        stats['steps'] = len(steps)
+
+        if steps:
+            invalidate_outline(sections__lessons__in={step.lesson_id for step in steps})
+        StepMigrationCheckpoint.objects.update_or_create(
+            start_id=start_id, end_id=end_id,
+            defaults={'lessons_migrated': stats['lessons'], 'steps_created': stats['steps']},
+        )
+    return stats
+
+
+def _close_inherited_connections():
+    """Инициализатор рабочего процесса: не использовать соединения родителя"""
+    for conn in connections.all():
+        conn.close()
 
 
 class Command(BaseCommand):
     help = 'Мигрирует существующие уроки в Step-формат'
-    
+
     def add_arguments(self, parser):
         parser.add_argument(
             '--execute',
@@ -34,236 +164,129 @@ class Command(BaseCommand):
             action='store_true',
             help='Удалить все существующие Step перед миграцией',
         )
-    
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=500,
+            help='Уроков в одной транзакции (по умолчанию 500)',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=0,
+            help='Число процессов (0 - в текущем процессе)',
+        )
+        parser.add_argument(
+            '--restart',
+            action='store_true',
+            help='Игнорировать чекпоинты предыдущего запуска',
+        )
+
     def handle(self, *args, **options):
         execute = options['execute']
-        reset = options['reset']
-        
-        if reset and execute:
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size должен быть больше 0')
+
+        if options['reset'] and execute:
             self.stdout.write(self.style.WARNING('🗑️  Удаление всех существующих Step...'))
             deleted_count = Step.objects.all().delete()[0]
+            StepMigrationCheckpoint.objects.all().delete()
             self.stdout.write(self.style.SUCCESS(f'   Удалено: {deleted_count} шагов'))
-        
-        # Собираем статистику
+
+        self.show_plan()
+
+        if not execute:
+            self.stdout.write(self.style.WARNING('⚠️  Это был предварительный просмотр.'))
+            self.stdout.write(self.style.WARNING('   Для выполнения миграции запустите:'))
+            self.stdout.write(self.style.WARNING('   python manage.py migrate_to_steps --execute'))
+            return
+
+        workers = options['workers']
+        if workers > 0 and connection.vendor == 'sqlite':
+            self.stdout.write(self.style.WARNING(
+                '⚠️  SQLite не поддерживает параллельную запись - миграция в одном процессе'))
+            workers = 0
+
+        if options['restart']:
+            StepMigrationCheckpoint.objects.all().delete()
+
+        # Диапазоны по всем урокам, а не только по ожидающим миграции:
+        # границы не сдвигаются между запусками, и чекпоинты совпадают
+        lesson_ids = list(Lesson.objects.order_by('id').values_list('id', flat=True))
+        chunks = make_chunks(lesson_ids, options['chunk_size'])
+        done = set(StepMigrationCheckpoint.objects.values_list('start_id', 'end_id'))
+        pending = [chunk for chunk in chunks if chunk not in done]
+
+        self.stdout.write(self.style.HTTP_INFO('🚀 Выполнение миграции...'))
+        self.stdout.write(
+            f'   Диапазонов: {len(pending)} из {len(chunks)} '
+            f'(по {options["chunk_size"]} уроков, уже обработано: {len(chunks) - len(pending)})'
+        )
+        self.stdout.write('')
+
+        totals = Counter()
+        started = time.monotonic()
+        for index, (chunk, stats) in enumerate(self.run_chunks(pending, workers), 1):
+            totals.update(stats)
+            elapsed = time.monotonic() - started
+            self.stdout.write(
+                f'  [{index}/{len(pending)}] уроки {chunk[0]}-{chunk[1]}: '
+                f'{stats["steps"]} шагов | {totals["lessons"] / elapsed:.0f} уроков/с, '
+                f'{totals["steps"] / elapsed:.0f} шагов/с'
+            )
+
+        elapsed = time.monotonic() - started
+        self.stdout.write('')
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Миграция завершена! Создано {totals["steps"]} шагов '
+            f'для {totals["lessons"]} уроков ({elapsed:.1f} с).'
+        ))
+
+    def run_chunks(self, chunks, workers):
+        """Обработать диапазоны; выдаёт (диапазон, статистика) по мере готовности"""
+        if workers <= 0:
+            for chunk in chunks:
+                yield chunk, migrate_chunk(*chunk)
+            return
+
+        # Рабочие процессы не должны разделять соединения с БД родителя
+        connections.close_all()
+        context = multiprocessing.get_context(
+            'fork' if 'fork' in multiprocessing.get_all_start_methods() else 'spawn'
+        )
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                                 initializer=_close_inherited_connections) as pool:
+            futures = {pool.submit(migrate_chunk, *chunk): chunk for chunk in chunks}
+            for future in as_completed(futures):
+                yield futures[future], future.result()
+
+    def show_plan(self):
+        """План миграции (агрегирующие запросы, без обхода уроков)"""
+        pending = lessons_without_steps()
+        quiz_lessons = pending.filter(quiz__questions__isnull=False).distinct()
+        assignment_lessons = pending.filter(assignment__isnull=False).exclude(
+            id__in=quiz_lessons.values('id'))
         stats = {
-            'video': 0,
-            'article': 0,
-            'quiz': 0,
-            'quiz_questions': 0,
-            'assignment': 0,
-            'skipped': 0,
+            'quiz': quiz_lessons.count(),
+            'quiz_questions': Question.objects.filter(quiz__lesson__in=pending).count(),
+            'assignment': assignment_lessons.count(),
+            'skipped': Lesson.objects.count() - pending.count(),
+            'checkpoints': StepMigrationCheckpoint.objects.count(),
         }
-        
-        lessons_to_migrate = []
-        
-        # Анализ уроков
-        for lesson in Lesson.objects.select_related('section__course').prefetch_related('steps'):
-            # Пропускаем уроки, у которых уже есть шаги
-            if lesson.steps.exists():
-                stats['skipped'] += 1
-                continue
-            
-            if lesson.lesson_type == 'video':
-                stats['video'] += 1
-                lessons_to_migrate.append(('video', lesson))
-            
-            elif lesson.lesson_type == 'article':
-                stats['article'] += 1
-                lessons_to_migrate.append(('article', lesson))
-            
-            elif lesson.lesson_type == 'quiz':
-                stats['quiz'] += 1
-                # Считаем вопросы в связанном Quiz
-                if hasattr(lesson, 'quiz') and lesson.quiz:
-                    question_count = lesson.quiz.questions.count()
-                    stats['quiz_questions'] += question_count
-                lessons_to_migrate.append(('quiz', lesson))
-            
-            elif lesson.lesson_type == 'assignment':
-                stats['assignment'] += 1
-                lessons_to_migrate.append(('assignment', lesson))
-        
+
         # Показываем план миграции
         self.stdout.write('')
         self.stdout.write(self.style.HTTP_INFO('=' * 60))
         self.stdout.write(self.style.HTTP_INFO('📋 ПЛАН МИГРАЦИИ В STEP-ФОРМАТ'))
         self.stdout.write(self.style.HTTP_INFO('=' * 60))
         self.stdout.write('')
-        
-        self.stdout.write(f'🎬 Видео уроков:     {stats["video"]} → {stats["video"]} Step (type=video)')
-        self.stdout.write(f'📝 Статей:           {stats["article"]} → {stats["article"]} Step (type=text)')
+
         self.stdout.write(f'✅ Тестов:           {stats["quiz"]} → {stats["quiz_questions"]} Step (type=quiz_*)')
         self.stdout.write(f'📋 Заданий:          {stats["assignment"]} → {stats["assignment"]} Step (type=free_answer)')
         self.stdout.write(f'⏭️  Уже мигрировано: {stats["skipped"]}')
+        self.stdout.write(f'📌 Чекпоинтов:       {stats["checkpoints"]}')
         self.stdout.write('')
-        
-        total_steps = stats['video'] + stats['article'] + stats['quiz_questions'] + stats['assignment']
+
+        total_steps = stats['quiz_questions'] + stats['assignment']
         self.stdout.write(self.style.SUCCESS(f'📊 Итого будет создано: {total_steps} шагов'))
         self.stdout.write('')
-        
-        if not execute:
-            self.stdout.write(self.style.WARNING('⚠️  Это был предварительный просмотр.'))
-            self.stdout.write(self.style.WARNING('   Для выполнения миграции запустите:'))
-            self.stdout.write(self.style.WARNING('   python manage.py migrate_to_steps --execute'))
-            return
-        
-        # Выполняем миграцию
-        self.stdout.write(self.style.HTTP_INFO('🚀 Выполнение миграции...'))
-        self.stdout.write('')
-        
-        created_steps = 0
-        
-        with transaction.atomic():
-            for lesson_type, lesson in lessons_to_migrate:
-                if lesson_type == 'video':
-                    created = self._migrate_video_lesson(lesson)
-                    created_steps += created
-                
-                elif lesson_type == 'article':
-                    created = self._migrate_article_lesson(lesson)
-                    created_steps += created
-                
-                elif lesson_type == 'quiz':
-                    created = self._migrate_quiz_lesson(lesson)
-                    created_steps += created
-                
-                elif lesson_type == 'assignment':
-                    created = self._migrate_assignment_lesson(lesson)
-                    created_steps += created
-        
-        self.stdout.write('')
-        self.stdout.write(self.style.SUCCESS(f'✅ Миграция завершена! Создано {created_steps} шагов.'))
-    
-    def _migrate_video_lesson(self, lesson):
-        """Мигрирует видео урок -> Step (type=video)"""
-        content = {
-            'url': lesson.video_url or '',
-            'duration': lesson.duration_minutes * 60 if lesson.duration_minutes else 0,
-            'source': self._detect_video_source(lesson.video_url),
-        }
-        
-        step = Step.objects.create(
-            lesson=lesson,
-            step_type='video',
-            order=0,
-            title=lesson.title,
-            content=content,
-            points=0,
-            is_required=True,
-        )
-        
-        self.stdout.write(f'  🎬 Видео: {lesson.title[:50]}')
-        return 1
-    
-    def _detect_video_source(self, url):
-        """Определяет источник видео по URL"""
-        if not url:
-            return 'unknown'
-        url = url.lower()
-        if 'youtube.com' in url or 'youtu.be' in url:
-            return 'youtube'
-        elif 'vimeo.com' in url:
-            return 'vimeo'
-        elif 'rutube.ru' in url:
-            return 'rutube'
-        return 'direct'
-    
-    def _migrate_article_lesson(self, lesson):
-        """Мигрирует статью -> Step (type=text)"""
-        content = {
-            'html': lesson.content or '',
-            'markdown': '',  # Можно добавить конвертацию HTML->Markdown
-        }
-        
-        step = Step.objects.create(
-            lesson=lesson,
-            step_type='text',
-            order=0,
-            title=lesson.title,
-            content=content,
-            points=0,
-            is_required=True,
-        )
-        
-        self.stdout.write(f'  📝 Статья: {lesson.title[:50]}')
-        return 1
-    
-    def _migrate_quiz_lesson(self, lesson):
-        """Мигрирует Quiz урок -> несколько Step (type=quiz_single/quiz_multiple)"""
-        if not hasattr(lesson, 'quiz') or not lesson.quiz:
-            self.stdout.write(self.style.WARNING(f'  ⚠️ Quiz не найден: {lesson.title}'))
-            return 0
-        
-        quiz = lesson.quiz
-        questions = quiz.questions.prefetch_related('choices').order_by('order')
-        created = 0
-        
-        for order, question in enumerate(questions):
-            choices = list(question.choices.order_by('order'))
-            
-            # Определяем тип: single или multiple
-            correct_count = sum(1 for c in choices if c.is_correct)
-            
-            if question.type == 'multiple' or correct_count > 1:
-                step_type = 'quiz_multiple'
-                correct_indexes = [i for i, c in enumerate(choices) if c.is_correct]
-                content = {
-                    'question': question.text,
-                    'choices': [c.text for c in choices],
-                    'correct_indexes': correct_indexes,
-                    'explanation': question.explanation or '',
-                }
-            else:
-                step_type = 'quiz_single'
-                correct_index = next((i for i, c in enumerate(choices) if c.is_correct), 0)
-                content = {
-                    'question': question.text,
-                    'choices': [c.text for c in choices],
-                    'correct_index': correct_index,
-                    'explanation': question.explanation or '',
-                }
-            
-            step = Step.objects.create(
-                lesson=lesson,
-                step_type=step_type,
-                order=order,
-                title=f'Вопрос {order + 1}',
-                content=content,
-                points=question.points,
-                is_required=True,
-            )
-            created += 1
-        
-        self.stdout.write(f'  ✅ Quiz: {lesson.title[:40]} -> {created} вопросов')
-        return created
-    
-    def _migrate_assignment_lesson(self, lesson):
-        """Мигрирует Assignment урок -> Step (type=free_answer)"""
-        if not hasattr(lesson, 'assignment') or not lesson.assignment:
-            # Если Assignment не найден, создаём пустой free_answer step
-            content = {
-                'question': lesson.content or 'Выполните задание и опишите результат.',
-                'min_length': 100,
-                'rubric': '',
-            }
-        else:
-            assignment = lesson.assignment
-            content = {
-                'question': assignment.description or lesson.content or 'Выполните задание.',
-                'min_length': 50,
-                'rubric': f'Максимум баллов: {assignment.max_points}',
-                'max_points': assignment.max_points,
-            }
-        
-        step = Step.objects.create(
-            lesson=lesson,
-            step_type='free_answer',
-            order=0,
-            title=lesson.title,
-            content=content,
-            points=content.get('max_points', 10),
-            is_required=True,
-        )
-        
-        self.stdout.write(f'  📋 Assignment: {lesson.title[:50]}')
-        return 1
@@ -0,0 +1,41 @@
+"""
+Полная перестройка поискового индекса каталога курсов.
+
+Использование:
+    python manage.py rebuild_search_index
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from courses.search import get_search_backend, rebuild_index
+
+
+class Command(BaseCommand):
+    help = 'Перестраивает полнотекстовый индекс каталога курсов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Размер пачки при чтении курсов (по умолчанию 1000)',
+        )
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        if backend is None:
+            self.stdout.write(self.style.WARNING(
+                '⚠️  Полнотекстовый поиск не поддерживается для этой СУБД'
+            ))
+            return
+
+        started = time.monotonic()
+        with transaction.atomic():
+            count = rebuild_index(batch_size=options['batch_size'])
+        elapsed = time.monotonic() - started
+
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Проиндексировано курсов: {count} ({elapsed:.2f} с, {backend.vendor})'
+        ))
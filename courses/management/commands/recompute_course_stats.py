@@ -0,0 +1,30 @@
+"""
+Сверка статистики курсов (students_count, average_rating, total_reviews)
+с записями на курс и одобренными отзывами.
+
+Статистика поддерживается сигналами (courses/stats.py); команда
+исправляет расхождения после ручных правок в БД или импорта данных.
+
+Использование:
+    python manage.py recompute_course_stats
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from courses.stats import recompute_course_stats
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает статистику курсов (студенты, рейтинг, отзывы)'
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        with transaction.atomic():
+            count = recompute_course_stats()
+        elapsed = time.monotonic() - started
+
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Пересчитана статистика курсов: {count} ({elapsed:.2f} с)'
+        ))
@@ -0,0 +1,46 @@
+"""
+Пересчёт счётчиков прогресса записей на курсы из исходных данных
+(StepProgress / LessonProgress).
+
+Счётчики поддерживаются инкрементально (courses/progress.py); команда
+нужна для восстановления после ручных правок в БД или сбоев.
+
+Использование:
+    python manage.py recompute_progress                 # Все записи
+    python manage.py recompute_progress --course python # Только один курс (slug)
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from courses.models import Course, Enrollment
+from courses.progress import recompute_counters
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счётчики прогресса записей на курсы'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--course',
+            help='Slug курса (по умолчанию - все курсы)',
+        )
+
+    def handle(self, *args, **options):
+        enrollments = Enrollment.objects.all()
+        if options['course']:
+            try:
+                course = Course.objects.get(slug=options['course'])
+            except Course.DoesNotExist:
+                raise CommandError(f'Курс "{options["course"]}" не найден')
+            enrollments = enrollments.filter(course=course)
+
+        started = time.monotonic()
+        with transaction.atomic():
+            count = recompute_counters(enrollments)
+        elapsed = time.monotonic() - started
+
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Пересчитано записей на курсы: {count} ({elapsed:.2f} с)'
+        ))
@@ -0,0 +1,53 @@
+"""
+Перепроверка заданий проверки кода, зависших в статусе queued.
+
+Очередь courses/judge.py живёт в памяти процесса Django: если процесс
+перезапустился до получения результата, задание навсегда остаётся
+в очереди. Команда проверяет такие задания в своём процессе
+(или, с --expire, отмечает их ошибкой - клиент предложит отправить
+код ещё раз). Запускать после деплоя/перезапуска или по cron.
+
+Использование:
+    python manage.py requeue_code_submissions
+    python manage.py requeue_code_submissions --older-than 600 --expire
+"""
+from django.core.management.base import BaseCommand
+
+from courses import judge
+
+
+class Command(BaseCommand):
+    help = 'Перепроверяет задания проверки кода, зависшие в очереди'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--older-than', type=int, default=300,
+            help='Сколько секунд задание должно ждать в очереди (по умолчанию 300)'
+        )
+        parser.add_argument(
+            '--expire', action='store_true',
+            help='Не перепроверять, а отметить задания ошибкой'
+        )
+
+    def handle(self, *args, **options):
+        submissions = list(judge.stale_submissions(options['older_than']))
+        if not submissions:
+            self.stdout.write('✅ Зависших заданий нет')
+            return
+
+        if options['expire']:
+            count = judge.expire(submissions)
+            self.stdout.write(self.style.WARNING(f'⚠️ Отмечено ошибкой заданий: {count}'))
+            return
+
+        failed = 0
+        for submission in submissions:
+            try:
+                judge.run(submission)
+            except Exception as exc:
+                failed += 1
+                judge.expire([submission])
+                self.stderr.write(f'❌ {submission.pk}: {exc}')
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Перепроверено заданий: {len(submissions) - failed}, с ошибкой: {failed}'
+        ))
@@ -0,0 +1,49 @@
+"""
+Перепроверка завершённых попыток старых тестов (QuizAttempt) по текущим
+правильным ответам - например, после исправления варианта ответа.
+Незавершённые попытки не трогаются.
+
+Использование:
+    python manage.py rescore_quizzes            # Все тесты
+    python manage.py rescore_quizzes --quiz 5   # Только один тест (id)
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from courses.models import Quiz
+from courses.quiz_scoring import score_attempts
+
+
+class Command(BaseCommand):
+    help = 'Перепроверяет завершённые попытки прохождения тестов (QuizAttempt)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--quiz',
+            type=int,
+            help='ID теста (по умолчанию - все тесты с попытками)',
+        )
+
+    def handle(self, *args, **options):
+        quizzes = Quiz.objects.filter(attempts__completed_at__isnull=False).distinct()
+        if options['quiz']:
+            quizzes = Quiz.objects.filter(pk=options['quiz'])
+            if not quizzes.exists():
+                raise CommandError(f'Тест {options["quiz"]} не найден')
+
+        started = time.monotonic()
+        attempts = answers = 0
+        slowest = 0.0
+        for quiz in quizzes:
+            results = score_attempts(quiz)
+            attempts += len(results)
+            answers += sum(result.answers for result in results)
+            slowest = max([slowest] + [result.elapsed for result in results])
+        elapsed = time.monotonic() - started
+
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Перепроверено попыток: {attempts}, ответов: {answers} ({elapsed:.2f} с)'
+        ))
+        if attempts:
+            self.stdout.write(f'⏱  Самая долгая попытка: {slowest * 1000:.2f} мс')
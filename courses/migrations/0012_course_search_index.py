@@ -0,0 +1,74 @@
+from django.conf import settings
+from django.db import migrations
+
+# DDL и заполнение индекса - здесь, а не через courses.search:
+# историческая миграция не должна меняться вместе с кодом приложения.
+
+SQLITE_CREATE = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS courses_course_fts USING fts5("
+    "title, subtitle, description, learning_outcomes, "
+    "tokenize = 'porter unicode61 remove_diacritics 2')"
+)
+# Текст без русского стемминга: tokenizer приводит регистр и ё -> е,
+# а термы запроса ищутся по префиксу основы - основа всегда префикс слова
+SQLITE_BACKFILL = (
+    "INSERT INTO courses_course_fts (rowid, title, subtitle, description, learning_outcomes) "
+    "SELECT id, COALESCE(title, ''), COALESCE(subtitle, ''), COALESCE(description, ''), "
+    "COALESCE(learning_outcomes, '') FROM courses_course"
+)
+SQLITE_DROP = "DROP TABLE IF EXISTS courses_course_fts"
+
+POSTGRES_CREATE = (
+    "CREATE TABLE IF NOT EXISTS courses_course_search ("
+    "course_id bigint PRIMARY KEY REFERENCES courses_course (id) "
+    "ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, "
+    "document tsvector NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS courses_course_search_document_gin "
+    "ON courses_course_search USING GIN (document)",
+)
+POSTGRES_BACKFILL = (
+    "INSERT INTO courses_course_search (course_id, document) "
+    "SELECT id, "
+    "setweight(to_tsvector(%(config)s::regconfig, COALESCE(title, '')), 'A') || "
+    "setweight(to_tsvector(%(config)s::regconfig, COALESCE(subtitle, '')), 'B') || "
+    "setweight(to_tsvector(%(config)s::regconfig, COALESCE(description, '')), 'D') || "
+    "setweight(to_tsvector(%(config)s::regconfig, COALESCE(learning_outcomes, '')), 'C') "
+    "FROM courses_course "
+    "ON CONFLICT (course_id) DO UPDATE SET document = EXCLUDED.document"
+)
+POSTGRES_DROP = "DROP TABLE IF EXISTS courses_course_search"
+
+
+def create_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    enabled = getattr(settings, 'COURSE_SEARCH_ENABLED', True)
+    if connection.vendor == 'sqlite':
+        schema_editor.execute(SQLITE_CREATE)
+        if enabled:
+            schema_editor.execute(SQLITE_BACKFILL)
+    elif connection.vendor == 'postgresql':
+        for statement in POSTGRES_CREATE:
+            schema_editor.execute(statement)
+        if enabled:
+            schema_editor.execute(POSTGRES_BACKFILL, {
+                'config': getattr(settings, 'COURSE_SEARCH_CONFIG', 'russian'),
+            })
+
+
+def drop_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'sqlite':
+        schema_editor.execute(SQLITE_DROP)
+    elif connection.vendor == 'postgresql':
+        schema_editor.execute(POSTGRES_DROP)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0011_remove_lesson_type_content_video_url'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,79 @@
+# Generated by Django 4.2.8 on 2026-10-17 06:19
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def populate_counters(apps, schema_editor):
+    """Заполнить счётчики по уже существующему прогрессу"""
+    Enrollment = apps.get_model('courses', 'Enrollment')
+    LessonProgress = apps.get_model('courses', 'LessonProgress')
+    StepProgress = apps.get_model('courses', 'StepProgress')
+
+    completed_steps = StepProgress.objects.filter(completed=True).order_by()
+    steps_by_enrollment = {
+        row['enrollment_id']: row
+        for row in completed_steps.values('enrollment_id').annotate(
+            total=Count('id'), points=Sum('score'))
+    }
+    lessons_by_enrollment = dict(
+        LessonProgress.objects.filter(completed=True).order_by()
+        .values('enrollment_id').annotate(total=Count('id'))
+        .values_list('enrollment_id', 'total')
+    )
+    steps_by_lesson = {
+        (row['enrollment_id'], row['step__lesson_id']): row['total']
+        for row in completed_steps.values('enrollment_id', 'step__lesson_id')
+        .annotate(total=Count('id'))
+    }
+
+    enrollments = []
+    for enrollment in Enrollment.objects.all().only('id'):
+        steps = steps_by_enrollment.get(enrollment.id, {})
+        enrollment.completed_steps_count = steps.get('total', 0)
+        enrollment.earned_points = int(steps.get('points') or 0)
+        enrollment.completed_lessons_count = lessons_by_enrollment.get(enrollment.id, 0)
+        enrollments.append(enrollment)
+    Enrollment.objects.bulk_update(
+        enrollments,
+        ['completed_steps_count', 'earned_points', 'completed_lessons_count'],
+        batch_size=500,
+    )
+
+    lesson_progress = []
+    for progress in LessonProgress.objects.all().only('id', 'enrollment_id', 'lesson_id'):
+        progress.completed_steps = steps_by_lesson.get(
+            (progress.enrollment_id, progress.lesson_id), 0)
+        lesson_progress.append(progress)
+    LessonProgress.objects.bulk_update(lesson_progress, ['completed_steps'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0013_course_outline_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='enrollment',
+            name='completed_lessons_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='enrollment',
+            name='completed_steps_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='enrollment',
+            name='earned_points',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='lessonprogress',
+            name='completed_steps',
+            field=models.PositiveIntegerField(default=0, help_text='Пройдено шагов урока'),
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.8 on 2026-10-17 06:30
+
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0014_progress_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CodeSubmission',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('code', models.TextField()),
+                ('status', models.CharField(choices=[('queued', 'В очереди'), ('done', 'Проверено'), ('error', 'Ошибка проверки')], default='queued', max_length=20)),
+                ('passed', models.PositiveIntegerField(default=0)),
+                ('total', models.PositiveIntegerField(default=0)),
+                ('results', models.JSONField(blank=True, default=list, help_text='Результаты по тестам')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('enrollment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='code_submissions', to='courses.enrollment')),
+                ('step', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='code_submissions', to='courses.step')),
+            ],
+            options={
+                'verbose_name': 'Проверка кода',
+                'verbose_name_plural': 'Проверки кода',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.8 on 2026-10-17 06:38
+
+from django.db import migrations, models
+
+
+def populate_public_content(apps, schema_editor):
+    """Вычислить публичную проекцию для существующих шагов"""
+    from courses.grading import build_public_content
+
+    Step = apps.get_model('courses', 'Step')
+    steps = list(Step.objects.only('id', 'step_type', 'content'))
+    for step in steps:
+        step.public_content = build_public_content(step)
+    Step.objects.bulk_update(steps, ['public_content'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0015_code_submission'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='step',
+            name='public_content',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.RunPython(populate_public_content, migrations.RunPython.noop),
+    ]
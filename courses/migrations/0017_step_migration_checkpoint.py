@@ -0,0 +1,30 @@
+# Generated by Django 4.2.8 on 2026-10-17 06:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0016_step_public_content'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StepMigrationCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start_id', models.PositiveIntegerField()),
+                ('end_id', models.PositiveIntegerField()),
+                ('lessons_migrated', models.PositiveIntegerField(default=0)),
+                ('steps_created', models.PositiveIntegerField(default=0)),
+                ('finished_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Чекпоинт миграции в шаги',
+                'verbose_name_plural': 'Чекпоинты миграции в шаги',
+                'ordering': ['start_id'],
+                'unique_together': {('start_id', 'end_id')},
+            },
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.8 on 2026-10-17 07:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0017_step_migration_checkpoint'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='course',
+            index=models.Index(fields=['status', '-students_count'], name='courses_cou_status_e5a5cb_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='course',
+            index=models.Index(fields=['status', '-average_rating'], name='courses_cou_status_620af1_idx'),
+        ),
+    ]
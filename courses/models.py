@@ -1,3 +1,5 @@
+import uuid
+
 from django.db import models
 from django.contrib.auth.models import User
 from django.utils.text import slugify
@@ -86,13 +88,22 @@ class Course(models.Model):
     average_rating = models.DecimalField(max_digits=3, decimal_places=2, default=0.0)
     total_reviews = models.IntegerField(default=0)
     
+    # Ревизия структуры курса (разделы/уроки/шаги), см. courses/outline.py
+    outline_version = models.PositiveIntegerField(default=0, editable=False)
+    
     class Meta:
         ordering = ['-created_at']
         indexes = [
             models.Index(fields=['status', '-created_at']),
             models.Index(fields=['category', 'status']),
+            # Сортировки каталога "Популярные" и "По рейтингу"
+            models.Index(fields=['status', '-students_count']),
+            models.Index(fields=['status', '-average_rating']),
         ]
     
+    # Поддерживаемые счётчики, которые save() не записывает (см. save)
+    MAINTAINED_FIELDS = ('outline_version', 'students_count', 'average_rating', 'total_reviews')
+    
     def save(self, *args, **kwargs):
         if not self.slug:
             base_slug = slugify(self.title)
@@ -110,6 +121,18 @@ class Course(models.Model):
                 self.slug = f"{base_slug}-{counter}"
                 counter += 1
         
+        # Эти поля меняются только UPDATE-запросами (invalidate_outline,
+        # courses/stats.py): полное сохранение загруженного курса не должно
+        # затирать их устаревшими значениями из памяти
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            deferred = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.attname for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.attname not in deferred
+                and field.name not in self.MAINTAINED_FIELDS
+            ]
+        
         super().save(*args, **kwargs)
     
     def __str__(self):
@@ -237,8 +260,12 @@ class Step(models.Model):
     # text_answer: {"question": "...", "patterns": ["regex1", "regex2"], "case_sensitive": false}
     # free_answer: {"question": "...", "min_length": 100, "rubric": "..."}
     # code: {"language": "python", "template": "def solve():\n    pass", "tests": [...], "time_limit": 5}
-    # sql: {"database_schema": "...", "query": "SELECT...", "expected_result": [...]}
+    # sql: {"database_schema": "CREATE TABLE...", "expected_query": "SELECT...", "expected_result": [[...], ...]}
     content = models.JSONField(default=dict, blank=True)
+    # Публичная проекция content для страницы студента: без правильных
+    # ответов и тестов, Markdown текстовых шагов уже отрендерен.
+    # Вычисляется при сохранении (courses.grading.build_public_content)
+    public_content = models.JSONField(default=dict, blank=True, editable=False)
     
     # Баллы за правильный ответ (для тестовых шагов)
     points = models.PositiveIntegerField(default=1, help_text="Баллы за правильный ответ")
@@ -254,6 +281,16 @@ class Step(models.Model):
         verbose_name = "Шаг"
         verbose_name_plural = "Шаги"
     
+    def save(self, *args, **kwargs):
+        from .grading import build_public_content
+
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or {'content', 'step_type'} & set(update_fields):
+            self.public_content = build_public_content(self)
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'public_content'}
+        super().save(*args, **kwargs)
+    
     def __str__(self):
         type_display = dict(self.STEP_TYPE_CHOICES).get(self.step_type, self.step_type)
         return f"{self.lesson.title} - Шаг {self.order + 1}: {type_display}"
@@ -340,6 +377,64 @@ class StepProgress(models.Model):
         return 100 if self.completed else 0
 
 
+class CodeSubmission(models.Model):
+    """
+    Задание на проверку кода (шаг типа code с тестами).
+    Выполняется пулом courses/judge.py, результат опрашивается клиентом.
+    """
+    STATUS_CHOICES = [
+        ('queued', 'В очереди'),
+        ('done', 'Проверено'),
+        ('error', 'Ошибка проверки'),
+    ]
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    enrollment = models.ForeignKey('Enrollment', on_delete=models.CASCADE, related_name='code_submissions')
+    step = models.ForeignKey(Step, on_delete=models.CASCADE, related_name='code_submissions')
+    code = models.TextField()
+    
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    passed = models.PositiveIntegerField(default=0)
+    total = models.PositiveIntegerField(default=0)
+    results = models.JSONField(default=list, blank=True, help_text="Результаты по тестам")
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = "Проверка кода"
+        verbose_name_plural = "Проверки кода"
+    
+    def __str__(self):
+        return f"{self.step} - {self.get_status_display()}"
+    
+    @property
+    def is_correct(self):
+        return self.status == 'done' and self.total > 0 and self.passed == self.total
+
+
+class StepMigrationCheckpoint(models.Model):
+    """
+    Обработанный диапазон уроков команды migrate_to_steps.
+    Позволяет продолжить прерванную миграцию с места остановки.
+    """
+    start_id = models.PositiveIntegerField()
+    end_id = models.PositiveIntegerField()
+    lessons_migrated = models.PositiveIntegerField(default=0)
+    steps_created = models.PositiveIntegerField(default=0)
+    finished_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        unique_together = ['start_id', 'end_id']
+        ordering = ['start_id']
+        verbose_name = "Чекпоинт миграции в шаги"
+        verbose_name_plural = "Чекпоинты миграции в шаги"
+    
+    def __str__(self):
+        return f"Уроки {self.start_id}-{self.end_id}: {self.steps_created} шагов"
+
+
 # Alias для обратной совместимости и новой терминологии
 Module = Section
 
@@ -352,6 +447,11 @@ class Enrollment(models.Model):
     completed_at = models.DateTimeField(blank=True, null=True)
     progress_percentage = models.DecimalField(max_digits=5, decimal_places=2, default=0.0)
     
+    # Денормализованные счётчики прогресса (обновляются через F(), см. courses/progress.py)
+    completed_steps_count = models.PositiveIntegerField(default=0)
+    completed_lessons_count = models.PositiveIntegerField(default=0)
+    earned_points = models.PositiveIntegerField(default=0)
+    
     class Meta:
         unique_together = ['student', 'course']
         ordering = ['-enrolled_at']
@@ -366,6 +466,7 @@ class LessonProgress(models.Model):
     completed = models.BooleanField(default=False)
     completed_at = models.DateTimeField(blank=True, null=True)
     last_position = models.PositiveIntegerField(default=0, help_text="Video position in seconds")
+    completed_steps = models.PositiveIntegerField(default=0, help_text="Пройдено шагов урока")
     
     class Meta:
         unique_together = ['enrollment', 'lesson']
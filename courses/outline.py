@@ -0,0 +1,161 @@
+"""
+Структура курса (outline): разделы → уроки → шаги.
+
+Строится одним проходом (3 запроса) для ревизии курса и кешируется
+под ключом ``course_outline:<id>:<outline_version>``. Поле
+Course.outline_version увеличивается при любом изменении структуры
+(сигналы Section/Lesson/Step + StepReorderAjaxView), поэтому старые
+записи кеша просто перестают использоваться - в том числе в других
+процессах.
+
+Навигация (предыдущий/следующий урок) и боковая панель урока
+берутся из outline без дополнительных запросов к БД.
+"""
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
+
+from .models import Course, Lesson, Section, Step
+
+# Увеличить при изменении формата outline (инвалидирует весь кеш)
+OUTLINE_FORMAT = 1
+
+
+@dataclass(frozen=True)
+class OutlineLesson:
+    id: int
+    title: str
+    section_id: int
+    order: int
+    duration_minutes: int
+    is_preview: bool
+    step_ids: tuple
+    position: int  # Порядковый номер урока в курсе (с 0)
+
+
+@dataclass(frozen=True)
+class OutlineSection:
+    id: int
+    title: str
+    order: int
+    lessons: tuple  # OutlineLesson
+
+
+class CourseOutline:
+    """
+    Неизменяемая структура курса с O(1) поиском урока и соседей
+    """
+
+    def __init__(self, course_id, version, sections):
+        self.course_id = course_id
+        self.version = version
+        self.sections = tuple(sections)
+        self.lessons = tuple(
+            lesson for section in self.sections for lesson in section.lessons
+        )
+        self._by_id = {lesson.id: lesson for lesson in self.lessons}
+
+    def __contains__(self, lesson_id):
+        return lesson_id in self._by_id
+
+    def __len__(self):
+        return len(self.lessons)
+
+    def get_lesson(self, lesson_id):
+        return self._by_id.get(lesson_id)
+
+    def previous_lesson(self, lesson_id):
+        lesson = self._by_id.get(lesson_id)
+        if lesson is None or lesson.position == 0:
+            return None
+        return self.lessons[lesson.position - 1]
+
+    def next_lesson(self, lesson_id):
+        lesson = self._by_id.get(lesson_id)
+        if lesson is None or lesson.position + 1 >= len(self.lessons):
+            return None
+        return self.lessons[lesson.position + 1]
+
+    @property
+    def total_duration(self):
+        return sum(lesson.duration_minutes for lesson in self.lessons)
+
+
+def _cache_key(course_id, version):
+    return f'course_outline:{OUTLINE_FORMAT}:{course_id}:{version}'
+
+
+def build_outline(course_id, version=0):
+    """Построить outline курса из БД (3 запроса)"""
+    section_rows = Section.objects.filter(course_id=course_id).order_by(
+        'order', 'created_at'
+    ).values_list('id', 'title', 'order')
+
+    lesson_rows = Lesson.objects.filter(section__course_id=course_id).order_by(
+        'order', 'created_at'
+    ).values_list('id', 'section_id', 'title', 'order', 'duration_minutes', 'is_preview')
+
+    step_ids = {}
+    step_rows = Step.objects.filter(lesson__section__course_id=course_id).order_by(
+        'order', 'created_at'
+    ).values_list('lesson_id', 'id')
+    for lesson_id, step_id in step_rows:
+        step_ids.setdefault(lesson_id, []).append(step_id)
+
+    lessons_by_section = {}
+    for lesson_id, section_id, title, order, duration, is_preview in lesson_rows:
+        lessons_by_section.setdefault(section_id, []).append(
+            (lesson_id, title, order, duration, is_preview)
+        )
+
+    sections = []
+    position = 0
+    for section_id, section_title, section_order in section_rows:
+        lessons = []
+        for lesson_id, title, order, duration, is_preview in lessons_by_section.get(section_id, []):
+            lessons.append(OutlineLesson(
+                id=lesson_id,
+                title=title,
+                section_id=section_id,
+                order=order,
+                duration_minutes=duration,
+                is_preview=is_preview,
+                step_ids=tuple(step_ids.get(lesson_id, ())),
+                position=position,
+            ))
+            position += 1
+        sections.append(OutlineSection(
+            id=section_id,
+            title=section_title,
+            order=section_order,
+            lessons=tuple(lessons),
+        ))
+
+    return CourseOutline(course_id, version, sections)
+
+
+def get_course_outline(course):
+    """
+    Outline курса из кеша (или построить и закешировать).
+    Версия берётся из уже загруженного объекта course - без запросов к БД.
+    """
+    key = _cache_key(course.pk, course.outline_version)
+    outline = cache.get(key)
+    if outline is None:
+        outline = build_outline(course.pk, course.outline_version)
+        timeout = getattr(settings, 'COURSE_OUTLINE_CACHE_TIMEOUT', 60 * 60 * 24)
+        cache.set(key, outline, timeout)
+    return outline
+
+
+def invalidate_outline(**course_filter):
+    """
+    Увеличить outline_version у курсов, подходящих под фильтр.
+
+    Пример: invalidate_outline(pk=course.pk), invalidate_outline(sections=section_id)
+    """
+    Course.objects.filter(**course_filter).update(
+        outline_version=F('outline_version') + 1
+    )
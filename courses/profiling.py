@@ -0,0 +1,222 @@
+"""
+Профилирование SQL по запросам (SQL_PROFILING_ENABLED).
+
+SQLProfilingMiddleware для доли запросов SQL_PROFILING_SAMPLE_RATE
+перехватывает SQL через connection.execute_wrapper (работает и при
+DEBUG=False) и записывает:
+
+- число запросов и суммарное время SQL;
+- повторы: один и тот же SQL-шаблон несколько раз за запрос (N+1);
+- самые медленные запросы.
+
+Статистика агрегируется в памяти процесса по имени URL
+(resolver_match.url_name). Раз в SQL_PROFILING_DUMP_INTERVAL секунд
+процесс сохраняет её в SQL_PROFILING_DUMP_DIR/sql-profile-<pid>.json;
+страница sql_profile (только staff) объединяет файлы всех процессов.
+
+В SQL сохраняются только шаблоны с %s - значения параметров
+(персональные данные) не записываются.
+"""
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+# Сколько шаблонов-повторов хранить на URL
+MAX_DUPLICATES = 20
+
+_IN_LIST_RE = re.compile(r'\((?:\s*%s\s*,)+\s*%s\s*\)')
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+def fingerprint(sql):
+    """SQL-шаблон без переменной части: списки IN (%s, %s, ...) сворачиваются"""
+    return _WHITESPACE_RE.sub(' ', _IN_LIST_RE.sub('(...)', sql)).strip()
+
+
+class QueryRecorder:
+    """execute_wrapper: время и шаблон каждого запроса"""
+
+    def __init__(self):
+        self.queries = []  # (шаблон, мс)
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((fingerprint(sql), (time.perf_counter() - started) * 1000))
+
+
+def empty_stats():
+    return {
+        'requests': 0,
+        'queries': 0,
+        'max_queries': 0,
+        'sql_ms': 0.0,
+        'duration_ms': 0.0,
+        'duplicates': {},
+        'slowest': [],
+    }
+
+
+def add_request(stats, queries, duration_ms, slow_limit):
+    """Добавить один запрос (список (шаблон, мс)) в статистику URL"""
+    stats['requests'] += 1
+    stats['queries'] += len(queries)
+    stats['max_queries'] = max(stats['max_queries'], len(queries))
+    stats['sql_ms'] += sum(ms for _, ms in queries)
+    stats['duration_ms'] += duration_ms
+
+    repeats = Counter(sql for sql, _ in queries)
+    duplicates = Counter(stats['duplicates'])
+    duplicates.update({sql: count - 1 for sql, count in repeats.items() if count > 1})
+    stats['duplicates'] = dict(duplicates.most_common(MAX_DUPLICATES))
+
+    slowest = stats['slowest'] + [[round(ms, 3), sql] for sql, ms in queries]
+    stats['slowest'] = sorted(slowest, key=lambda item: item[0], reverse=True)[:slow_limit]
+
+
+def merge_stats(target, source, slow_limit):
+    """Сложить статистику URL из другого процесса"""
+    for key in ('requests', 'queries', 'sql_ms', 'duration_ms'):
+        target[key] += source[key]
+    target['max_queries'] = max(target['max_queries'], source['max_queries'])
+    duplicates = Counter(target['duplicates'])
+    duplicates.update(source['duplicates'])
+    target['duplicates'] = dict(duplicates.most_common(MAX_DUPLICATES))
+    target['slowest'] = sorted(
+        target['slowest'] + source['slowest'], key=lambda item: item[0], reverse=True
+    )[:slow_limit]
+
+
+class ProfileStore:
+    """Статистика процесса по имени URL"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.by_url = {}
+            self.started_at = time.time()
+            self.dumped_at = time.monotonic()
+
+    def record(self, url_name, queries, duration_ms):
+        slow_limit = settings.SQL_PROFILING_SLOW_QUERIES
+        with self.lock:
+            stats = self.by_url.setdefault(url_name, empty_stats())
+            add_request(stats, queries, duration_ms, slow_limit)
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'pid': os.getpid(),
+                'started_at': self.started_at,
+                'updated_at': time.time(),
+                'by_url': json.loads(json.dumps(self.by_url)),
+            }
+
+    def dump_path(self):
+        return Path(settings.SQL_PROFILING_DUMP_DIR) / f'sql-profile-{os.getpid()}.json'
+
+    def dump(self):
+        """Сохранить статистику процесса (атомарно: временный файл + rename)"""
+        path = self.dump_path()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.snapshot(), f, ensure_ascii=False, sort_keys=True)
+        os.replace(tmp_path, path)
+        self.dumped_at = time.monotonic()
+        return path
+
+    def dump_if_due(self):
+        if not settings.SQL_PROFILING_DUMP_DIR:
+            return
+        if time.monotonic() - self.dumped_at >= settings.SQL_PROFILING_DUMP_INTERVAL:
+            try:
+                self.dump()
+            except OSError:
+                # Профилирование не должно ломать запрос
+                logger.exception('Не удалось сохранить SQL-профиль')
+                self.dumped_at = time.monotonic()
+
+
+store = ProfileStore()
+
+
+def load_report():
+    """
+    Статистика всех процессов: файлы SQL_PROFILING_DUMP_DIR
+    и текущий процесс (его данные в памяти свежее файла).
+    Возвращает список строк по URL, горячие (по времени SQL) - первыми.
+    """
+    slow_limit = settings.SQL_PROFILING_SLOW_QUERIES
+    snapshots = [store.snapshot()]
+    if settings.SQL_PROFILING_DUMP_DIR:
+        own_path = store.dump_path()
+        for path in Path(settings.SQL_PROFILING_DUMP_DIR).glob('sql-profile-*.json'):
+            if path == own_path:
+                continue
+            try:
+                with open(path, encoding='utf-8') as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+
+    by_url = {}
+    for snapshot in snapshots:
+        for url_name, stats in snapshot['by_url'].items():
+            merge_stats(by_url.setdefault(url_name, empty_stats()), stats, slow_limit)
+
+    rows = []
+    for url_name, stats in by_url.items():
+        requests = stats['requests'] or 1
+        rows.append({
+            'url_name': url_name,
+            **stats,
+            'avg_queries': stats['queries'] / requests,
+            'avg_sql_ms': stats['sql_ms'] / requests,
+            'avg_duration_ms': stats['duration_ms'] / requests,
+            'duplicates': sorted(stats['duplicates'].items(), key=lambda item: item[1], reverse=True),
+        })
+    rows.sort(key=lambda row: row['sql_ms'], reverse=True)
+    return {'processes': len(snapshots), 'urls': rows}
+
+
+class SQLProfilingMiddleware:
+    """Выборочная запись SQL-статистики запроса (см. модуль)"""
+
+    def __init__(self, get_response):
+        if not settings.SQL_PROFILING_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if random.random() >= settings.SQL_PROFILING_SAMPLE_RATE:
+            return self.get_response(request)
+
+        recorder = QueryRecorder()
+        started = time.perf_counter()
+        with connection.execute_wrapper(recorder):
+            response = self.get_response(request)
+        duration_ms = (time.perf_counter() - started) * 1000
+
+        match = request.resolver_match
+        if match is not None and match.url_name:
+            store.record(match.url_name, recorder.queries, duration_ms)
+            store.dump_if_due()
+        return response
@@ -0,0 +1,268 @@
+"""
+Сервисы прогресса студента.
+
+Чтение прогресса работает набором (set-based): стоимость не зависит
+от количества курсов, на которые записан студент.
+
+Запись прогресса - O(1): при завершении шага/урока счётчики
+Enrollment (completed_steps_count, completed_lessons_count, earned_points)
+и LessonProgress.completed_steps увеличиваются F()-выражениями в той же
+транзакции, что и запись прогресса, вместо пересчёта всех уроков курса.
+Восстановление счётчиков: python manage.py recompute_progress
+"""
+from decimal import Decimal
+
+from django.db.models import (Avg, Case, Count, DecimalField, Exists, ExpressionWrapper,
+                              F, IntegerField, OuterRef, Q, Subquery, Sum, Value, When)
+from django.db.models.functions import Cast, Coalesce, NullIf
+from django.utils import timezone
+
+from .models import Enrollment, Lesson, LessonProgress, StepProgress
+
+# Порядок уроков внутри курса (совпадает с courses/outline.py)
+LESSON_ORDERING = ('section__order', 'section__created_at', 'order', 'created_at')
+
+
+def annotate_next_lesson(queryset):
+    """
+    Добавить к queryset записей поле next_lesson_id:
+    первый непройденный урок курса, а если пройдены все - первый урок.
+    Вычисляется коррелированными подзапросами в том же SELECT.
+    """
+    course_lessons = Lesson.objects.filter(
+        section__course=OuterRef('course_id')
+    ).order_by(*LESSON_ORDERING).values('id')
+
+    completed = LessonProgress.objects.filter(
+        enrollment=OuterRef(OuterRef('pk')),
+        lesson=OuterRef('pk'),
+        completed=True,
+    )
+    first_unfinished = Lesson.objects.filter(
+        section__course=OuterRef('course_id')
+    ).exclude(
+        Exists(completed)
+    ).order_by(*LESSON_ORDERING).values('id')
+
+    return queryset.annotate(
+        next_lesson_id=Coalesce(
+            Subquery(first_unfinished[:1]),
+            Subquery(course_lessons[:1]),
+            output_field=IntegerField(),
+        )
+    )
+
+
+def resume_learning(enrollments):
+    """
+    Список {'enrollment', 'next_lesson'} для записей, полученных
+    через annotate_next_lesson. Уроки загружаются одним запросом.
+    """
+    enrollments = list(enrollments)
+    lesson_ids = {e.next_lesson_id for e in enrollments if e.next_lesson_id}
+    lessons = Lesson.objects.in_bulk(lesson_ids) if lesson_ids else {}
+    return [
+        {
+            'enrollment': enrollment,
+            'next_lesson': lessons.get(enrollment.next_lesson_id),
+        }
+        for enrollment in enrollments
+    ]
+
+
+def student_stats(student):
+    """Сводная статистика студента одним aggregate()"""
+    stats = Enrollment.objects.filter(student=student).aggregate(
+        total_courses=Count('id'),
+        completed_courses=Count('id', filter=Q(completed=True)),
+        avg_progress=Avg('progress_percentage'),
+    )
+    stats['in_progress_courses'] = stats['total_courses'] - stats['completed_courses']
+    stats['avg_progress'] = stats['avg_progress'] or 0
+    return stats
+
+
+# ============================================================
+# ИНКРЕМЕНТАЛЬНЫЕ СЧЁТЧИКИ
+# ============================================================
+
+def complete_step(enrollment, step, progress):
+    """
+    Отметить StepProgress пройденным и увеличить счётчики.
+    Вызывать внутри transaction.atomic().
+
+    Переход completed=False -> True выполняется условным UPDATE, поэтому
+    при повторной или параллельной отметке счётчики не удваиваются.
+    Возвращает (newly_completed, lesson_progress) - lesson_progress
+    с актуальным значением completed_steps.
+    """
+    now = timezone.now()
+    newly_completed = bool(
+        StepProgress.objects.filter(pk=progress.pk, completed=False).update(
+            completed=True,
+            status='completed',
+            completed_at=now,
+            score=step.points,
+            max_score=step.points,
+        )
+    )
+
+    lesson_progress, _ = LessonProgress.objects.get_or_create(
+        enrollment=enrollment,
+        lesson_id=step.lesson_id
+    )
+
+    if newly_completed:
+        progress.completed = True
+        progress.status = 'completed'
+        progress.completed_at = now
+        progress.score = step.points
+        progress.max_score = step.points
+
+        LessonProgress.objects.filter(pk=lesson_progress.pk).update(
+            completed_steps=F('completed_steps') + 1
+        )
+        Enrollment.objects.filter(pk=enrollment.pk).update(
+            completed_steps_count=F('completed_steps_count') + 1,
+            earned_points=F('earned_points') + step.points,
+        )
+        lesson_progress.refresh_from_db(fields=['completed_steps'])
+
+    return newly_completed, lesson_progress
+
+
+def complete_steps(enrollment, lesson_id, completions):
+    """
+    Пакетный вариант complete_step для шагов одного урока.
+    completions - {pk StepProgress: step}. Вызывать внутри transaction.atomic().
+
+    Все записи отмечаются одним условным UPDATE. Если часть уже отмечена
+    параллельным запросом, счётчики записи пересчитываются из исходных
+    данных вместо инкремента. Возвращает lesson_progress.
+    """
+    lesson_progress, _ = LessonProgress.objects.get_or_create(
+        enrollment=enrollment,
+        lesson_id=lesson_id
+    )
+    if not completions:
+        return lesson_progress
+
+    points = Case(
+        *[When(pk=pk, then=Value(step.points)) for pk, step in completions.items()],
+        output_field=DecimalField(max_digits=5, decimal_places=2),
+    )
+    updated = StepProgress.objects.filter(pk__in=completions, completed=False).update(
+        completed=True,
+        status='completed',
+        completed_at=timezone.now(),
+        score=points,
+        max_score=points,
+    )
+
+    if updated == len(completions):
+        LessonProgress.objects.filter(pk=lesson_progress.pk).update(
+            completed_steps=F('completed_steps') + updated
+        )
+        Enrollment.objects.filter(pk=enrollment.pk).update(
+            completed_steps_count=F('completed_steps_count') + updated,
+            earned_points=F('earned_points') + sum(step.points for step in completions.values()),
+        )
+    else:
+        recompute_counters(Enrollment.objects.filter(pk=enrollment.pk))
+
+    lesson_progress.refresh_from_db(fields=['completed_steps'])
+    return lesson_progress
+
+
+def complete_lesson(enrollment, lesson_progress, total_lessons):
+    """
+    Отметить урок пройденным, увеличить completed_lessons_count и
+    пересчитать enrollment.progress_percentage (в памяти, сохраняет вызывающий).
+    Вызывать внутри transaction.atomic(). Возвращает True, если урок завершён впервые.
+    """
+    now = timezone.now()
+    updated = LessonProgress.objects.filter(
+        pk=lesson_progress.pk, completed=False
+    ).update(completed=True, completed_at=now)
+    if not updated:
+        return False
+
+    lesson_progress.completed = True
+    lesson_progress.completed_at = now
+
+    Enrollment.objects.filter(pk=enrollment.pk).update(
+        completed_lessons_count=F('completed_lessons_count') + 1
+    )
+    enrollment.refresh_from_db(fields=['completed_lessons_count'])
+    enrollment.progress_percentage = progress_percentage(
+        enrollment.completed_lessons_count, total_lessons
+    )
+    return True
+
+
+def progress_percentage(completed_lessons, total_lessons):
+    if total_lessons <= 0:
+        return Decimal('0')
+    percentage = Decimal(completed_lessons * 100) / Decimal(total_lessons)
+    return min(percentage, Decimal('100')).quantize(Decimal('0.01'))
+
+
+def _count_subquery(queryset, group_by):
+    return Subquery(
+        queryset.order_by().values(group_by).annotate(total=Count('id')).values('total')
+    )
+
+
+def recompute_counters(enrollments=None):
+    """
+    Пересчитать все счётчики прогресса из исходных записей
+    (несколько UPDATE с подзапросами, без загрузки записей в Python).
+    Возвращает количество обработанных записей на курс.
+    """
+    if enrollments is None:
+        enrollments = Enrollment.objects.all()
+
+    completed_steps = StepProgress.objects.filter(
+        enrollment=OuterRef('pk'), completed=True
+    )
+    completed_lessons = LessonProgress.objects.filter(
+        enrollment=OuterRef('pk'), completed=True
+    )
+    earned_points = completed_steps.order_by().values('enrollment').annotate(
+        total=Cast(Sum('score'), IntegerField())
+    ).values('total')
+
+    updated = enrollments.update(
+        completed_steps_count=Coalesce(_count_subquery(completed_steps, 'enrollment'), 0),
+        completed_lessons_count=Coalesce(_count_subquery(completed_lessons, 'enrollment'), 0),
+        earned_points=Coalesce(Subquery(earned_points), 0),
+    )
+
+    # Процент считается отдельным UPDATE - по уже обновлённому completed_lessons_count
+    total_lessons = Lesson.objects.filter(section__course=OuterRef('course'))
+    enrollments.update(
+        progress_percentage=Coalesce(
+            ExpressionWrapper(
+                F('completed_lessons_count') * 100.0 /
+                NullIf(_count_subquery(total_lessons, 'section__course'), 0),
+                output_field=DecimalField(max_digits=5, decimal_places=2),
+            ),
+            0,
+            output_field=DecimalField(max_digits=5, decimal_places=2),
+        )
+    )
+
+    LessonProgress.objects.filter(enrollment__in=enrollments).update(
+        completed_steps=Coalesce(
+            _count_subquery(
+                StepProgress.objects.filter(
+                    enrollment=OuterRef('enrollment'),
+                    step__lesson=OuterRef('lesson'),
+                    completed=True,
+                ),
+                'enrollment'
+            ),
+            0
+        )
+    )
+    return updated
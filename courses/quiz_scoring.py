@@ -0,0 +1,163 @@
+"""
+Проверка попыток старых тестов (Quiz / QuizAttempt / UserAnswer).
+
+Ключ ответов теста загружается один раз (вопросы + правильные варианты
+одним prefetch) в словари множеств, после чего все UserAnswer попытки
+проверяются за один проход в памяти и записываются одним bulk_update.
+Ни одного save() на отдельный ответ.
+
+    single / true_false / multiple - выбранный вариант входит во множество
+                                     правильных (UserAnswer хранит один
+                                     вариант на вопрос);
+    text                           - text_answer совпадает с текстом одного
+                                     из правильных вариантов (без учёта
+                                     регистра и крайних пробелов).
+
+Пересчёт завершённых попыток: python manage.py rescore_quizzes
+(незавершённые попытки не проверяются и остаются открытыми).
+"""
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.db import transaction
+from django.db.models import Prefetch
+from django.utils import timezone
+
+from .models import Question, QuestionChoice, QuizAttempt, UserAnswer
+
+CHOICE_TYPES = ('single', 'multiple', 'true_false')
+HUNDREDTHS = Decimal('0.01')
+
+
+def normalize_text(text):
+    return ' '.join((text or '').split()).casefold()
+
+
+@dataclass(frozen=True)
+class AnswerKey:
+    """Правильные ответы теста"""
+    quiz_id: int
+    pass_percentage: int
+    points: dict  # question_id -> баллы
+    types: dict  # question_id -> тип вопроса
+    correct_choices: dict  # question_id -> frozenset(choice_id)
+    accepted_texts: dict  # question_id -> frozenset(нормализованный текст)
+
+    @property
+    def total_points(self):
+        return sum(self.points.values())
+
+    def check(self, answer):
+        """Правильный ли ответ (None - вопрос удалён из теста)"""
+        question_type = self.types.get(answer.question_id)
+        if question_type is None:
+            return None
+        if question_type in CHOICE_TYPES:
+            return answer.choice_id in self.correct_choices[answer.question_id]
+        return normalize_text(answer.text_answer) in self.accepted_texts[answer.question_id]
+
+
+def load_answer_key(quiz):
+    """Ключ ответов: вопросы с правильными вариантами (2 запроса)"""
+    questions = Question.objects.filter(quiz=quiz).order_by().only(
+        'id', 'type', 'points'
+    ).prefetch_related(Prefetch(
+        'choices',
+        queryset=QuestionChoice.objects.filter(is_correct=True).order_by().only(
+            'id', 'question_id', 'text'),
+        to_attr='correct',
+    ))
+    points, types, correct_choices, accepted_texts = {}, {}, {}, {}
+    for question in questions:
+        points[question.id] = question.points
+        types[question.id] = question.type
+        correct_choices[question.id] = frozenset(choice.id for choice in question.correct)
+        accepted_texts[question.id] = frozenset(
+            normalize_text(choice.text) for choice in question.correct)
+    return AnswerKey(quiz.id, quiz.pass_percentage, points, types,
+                     correct_choices, accepted_texts)
+
+
+@dataclass(frozen=True)
+class AttemptScore:
+    """Итог проверки одной попытки"""
+    attempt_id: int
+    score: Decimal
+    total_points: int
+    percentage: Decimal
+    is_passed: bool
+    answers: int
+    elapsed: float  # секунд на проверку ответов попытки
+
+
+def score_answers(key, answers):
+    """Проставить is_correct / points_earned ответам. Возвращает сумму баллов"""
+    earned = 0
+    for answer in answers:
+        answer.is_correct = key.check(answer)
+        points = key.points.get(answer.question_id, 0) if answer.is_correct else 0
+        answer.points_earned = Decimal(points)
+        earned += points
+    return Decimal(earned)
+
+
+def apply_score(key, attempt, score):
+    total = key.total_points
+    percentage = (score * 100 / total).quantize(HUNDREDTHS, ROUND_HALF_UP) if total else Decimal(0)
+    attempt.score = score
+    attempt.total_points = total
+    attempt.percentage = percentage
+    attempt.is_passed = percentage >= key.pass_percentage
+
+
+def score_attempts(quiz, attempts=None, finish=False):
+    """
+    Проверить попытки одного теста (по умолчанию - все завершённые).
+    finish=True - завершить попытки (отправка теста), иначе
+    completed_at не меняется.
+    Запросы: ключ ответов (2), попытки (1), ответы (1),
+    bulk_update ответов и попыток. Возвращает список AttemptScore.
+    """
+    key = load_answer_key(quiz)
+    if attempts is None:
+        attempts = QuizAttempt.objects.filter(quiz=quiz, completed_at__isnull=False)
+    attempts = list(attempts)
+    fields = ['score', 'total_points', 'percentage', 'is_passed']
+    if finish:
+        fields.append('completed_at')
+        now = timezone.now()
+        for attempt in attempts:
+            if attempt.completed_at is None:
+                attempt.completed_at = now
+
+    answers_by_attempt = defaultdict(list)
+    for answer in UserAnswer.objects.filter(attempt__in=attempts).order_by().only(
+            'id', 'attempt_id', 'question_id', 'choice_id', 'text_answer'):
+        answers_by_attempt[answer.attempt_id].append(answer)
+
+    results = []
+    for attempt in attempts:
+        started = time.perf_counter()
+        answers = answers_by_attempt[attempt.id]
+        apply_score(key, attempt, score_answers(key, answers))
+        results.append(AttemptScore(
+            attempt.id, attempt.score, attempt.total_points, attempt.percentage,
+            attempt.is_passed, len(answers), time.perf_counter() - started,
+        ))
+
+    with transaction.atomic():
+        UserAnswer.objects.bulk_update(
+            [answer for answers in answers_by_attempt.values() for answer in answers],
+            ['is_correct', 'points_earned'], batch_size=500,
+        )
+        QuizAttempt.objects.bulk_update(
+            attempts, fields, batch_size=500,
+        )
+    return results
+
+
+def score_attempt(attempt):
+    """Проверить и завершить одну попытку (отправка теста)"""
+    return score_attempts(attempt.quiz, [attempt], finish=True)[0]
@@ -0,0 +1,196 @@
+"""
+Рендеринг Markdown контента шагов с кешированием HTML.
+
+Markdown + CodeHilite (Pygments, guess_lang) - самая дорогая часть
+страницы урока, а текст шага меняется редко. Готовый HTML кешируется
+по хешу исходного текста:
+
+1. in-process LRU (MARKDOWN_CACHE_SIZE записей) - без сети и сериализации;
+2. общий кеш Django (MARKDOWN_CACHE_ALIAS, опционально) - один рендер
+   на все процессы; при сохранении шага кеш прогревается сигналом,
+   поэтому студент получает уже готовый HTML.
+
+Ключ зависит только от текста, поэтому инвалидация не нужна:
+изменённый текст - новый ключ. При изменении настроек рендеринга
+увеличьте RENDER_VERSION.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+
+import markdown
+from django.conf import settings
+from django.core.cache import caches
+from markdown.extensions.codehilite import CodeHiliteExtension
+
+# Увеличить при изменении расширений Markdown / политики очистки
+RENDER_VERSION = 1
+
+
+class LRUCache:
+    """Потокобезопасный LRU-кеш фиксированного размера"""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            try:
+                self._data.move_to_end(key)
+            except KeyError:
+                return None
+            return self._data[key]
+
+    def set(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+local_cache = LRUCache(getattr(settings, 'MARKDOWN_CACHE_SIZE', 512))
+
+
+def content_key(kind, text):
+    digest = hashlib.sha256(text.encode('utf-8')).hexdigest()
+    return f'rendered:{RENDER_VERSION}:{kind}:{digest}'
+
+
+def _shared_cache():
+    alias = getattr(settings, 'MARKDOWN_CACHE_ALIAS', '')
+    return caches[alias] if alias else None
+
+
+def cached_render(kind, text, render):
+    """HTML для text из кеша, иначе render(text) с сохранением в кеш"""
+    key = content_key(kind, text)
+    html = local_cache.get(key)
+    if html is not None:
+        return html
+
+    shared = _shared_cache()
+    if shared is not None:
+        html = shared.get(key)
+    if html is None:
+        html = render(text)
+        if shared is not None:
+            shared.set(key, html, getattr(settings, 'MARKDOWN_CACHE_TIMEOUT', None))
+
+    local_cache.set(key, html)
+    return html
+
+
+# ============================================================
+# MARKDOWN
+# ============================================================
+#
+# Markdown() при создании инстанцирует все расширения и компилирует их
+# регулярные выражения, поэтому движки создаются один раз на поток
+# и переиспользуются через reset(). Markdown и bleach.Cleaner не
+# потокобезопасны - отсюда threading.local, а не общий экземпляр.
+
+ALLOWED_TAGS = frozenset([
+    'p', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6',
+    'strong', 'em', 'code', 'pre', 'blockquote',
+    'ul', 'ol', 'li', 'a', 'img', 'br', 'hr',
+    'table', 'thead', 'tbody', 'tr', 'th', 'td',
+    'div', 'span',
+])
+ALLOWED_ATTRIBUTES = {
+    'a': ['href', 'title', 'target'],
+    'img': ['src', 'alt', 'title', 'width', 'height'],
+    'code': ['class'],
+    'pre': ['class'],
+    'div': ['class'],
+    'span': ['class'],
+}
+
+_engines = threading.local()
+
+
+def build_engine():
+    """Новый движок Markdown с расширениями платформы"""
+    extensions = [
+        'markdown.extensions.fenced_code',  # ```code```
+        'markdown.extensions.tables',        # Таблицы
+        'markdown.extensions.toc',           # Содержание
+        'markdown.extensions.nl2br',         # Переносы строк
+        'markdown.extensions.extra',         # Дополнительные возможности (включает HTML)
+        CodeHiliteExtension(
+            css_class='codehilite',
+            linenums=False,
+            guess_lang=True,
+        ),
+    ]
+    return markdown.Markdown(extensions=extensions)
+
+
+def build_cleaner():
+    """Политика очистки HTML (bleach - опциональная зависимость)"""
+    from bleach.sanitizer import Cleaner
+
+    return Cleaner(tags=ALLOWED_TAGS, attributes=ALLOWED_ATTRIBUTES)
+
+
+def get_engine():
+    """Движок Markdown текущего потока"""
+    engine = getattr(_engines, 'markdown', None)
+    if engine is None:
+        engine = _engines.markdown = build_engine()
+    return engine
+
+
+def get_cleaner():
+    """Политика очистки HTML текущего потока"""
+    cleaner = getattr(_engines, 'cleaner', None)
+    if cleaner is None:
+        cleaner = _engines.cleaner = build_cleaner()
+    return cleaner
+
+
+def convert_markdown(text):
+    """Markdown -> HTML с подсветкой синтаксиса (без кеша)"""
+    # reset() сбрасывает состояние предыдущего документа (toc, сноски, ссылки)
+    return get_engine().reset().convert(text)
+
+
+def clean_markdown(text):
+    """Markdown -> HTML с очисткой опасных тегов (без кеша)"""
+    return get_cleaner().clean(render_markdown(text))
+
+
+def render_markdown(text):
+    if not text:
+        return ''
+    return cached_render('markdown', text, convert_markdown)
+
+
+def render_markdown_safe(text):
+    if not text:
+        return ''
+    return cached_render('markdown_safe', text, clean_markdown)
+
+
+def warm_step_cache(step):
+    """
+    Отрендерить Markdown текстового шага заранее (при сохранении).
+    Имеет смысл только с общим кешем - иначе HTML останется
+    в памяти процесса конструктора курса.
+    """
+    if _shared_cache() is None:
+        return
+    content = step.content or {}
+    if step.step_type == 'text' and not content.get('html') and content.get('markdown'):
+        render_markdown(content['markdown'])
@@ -0,0 +1,236 @@
+"""
+Запуск кода студента на тестах шага (без зависимостей от Django).
+
+Модуль импортируется рабочими процессами пула проверки
+(courses/judge.py), поэтому использует только стандартную библиотеку.
+
+Каждый тест выполняется в отдельном изолированном интерпретаторе
+(python -I -S -B): пустое окружение, временный рабочий каталог,
+ограничения ресурсов через setrlimit (процессорное время, память,
+размер файлов, число дескрипторов и процессов) и таймаут по реальному
+времени. Процесс запускается в своей группе, после каждого теста группа
+убивается целиком - порождённые процессы не переживают проверку.
+
+Перед кодом студента GUARD ставит audit hook: запрещены запуск
+процессов, сигналы, сокеты и ctypes, запись - только в рабочий каталог,
+чтение - только из него и из стандартной библиотеки.
+
+Границу безопасности задаёт отдельный непривилегированный пользователь
+(uids - диапазон uid, по одному на одновременный запуск; нужен запуск
+Django от root или CAP_SETUID): под ним не читаются .env, БД и
+/proc/<pid>/environ процессов Django, а RLIMIT_NPROC = 1 запрещает fork.
+Сетевая изоляция и seccomp-фильтры здесь не настраиваются - это
+задача контейнера.
+"""
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+    import resource
+except ImportError:  # Windows: без ограничений ресурсов
+    fcntl = resource = None
+
+DEFAULT_MEMORY_LIMIT_MB = 256
+OUTPUT_LIMIT = 64 * 1024  # байт stdout/stderr на тест
+ERROR_TAIL = 500  # символов stderr в результате
+
+# Статусы теста
+OK = 'ok'
+WRONG_ANSWER = 'wrong_answer'
+TIMEOUT = 'timeout'
+MEMORY_LIMIT = 'memory_limit'
+RUNTIME_ERROR = 'runtime_error'
+
+# Выполняется в песочнице до кода студента: python -I -S -B -c GUARD solution.py
+GUARD = r'''
+import os, sys
+
+def _install():
+    workdir = os.path.realpath(os.getcwd())
+    read_roots = [workdir] + [os.path.realpath(p) for p in sys.path if p]
+    write_flags = os.O_WRONLY | os.O_RDWR | os.O_APPEND | os.O_CREAT | os.O_TRUNC
+    denied = ('os.fork', 'os.forkpty', 'os.exec', 'os.posix_spawn', 'os.spawn', 'os.system',
+              'os.kill', 'os.killpg', 'subprocess.', 'pty.', 'ctypes.', 'socket.', 'gc.get_')
+    denied_modules = ('ctypes', '_ctypes', '_posixsubprocess', '_xxsubinterpreters')
+    path_events = ('os.remove', 'os.rename', 'os.rmdir', 'os.mkdir', 'os.symlink', 'os.link',
+                   'os.chmod', 'os.chown', 'os.truncate', 'os.utime', 'os.chflags', 'os.mkfifo',
+                   'os.mknod', 'shutil.')
+
+    def inside(path, roots):
+        if isinstance(path, int):
+            return True
+        path = os.path.realpath(os.fsdecode(path))
+        return any(path == root or path.startswith(root + os.sep) for root in roots)
+
+    def hook(event, args):
+        if event.startswith(denied):
+            raise PermissionError(f'{event}: запрещено в песочнице')
+        if event == 'import' and args[0].split('.')[0] in denied_modules:
+            raise PermissionError(f'import {args[0]}: запрещено в песочнице')
+        if event == 'open':
+            path, mode, flags = args
+            writing = (isinstance(mode, str) and any(c in mode for c in 'wax+')) \
+                or bool((flags or 0) & write_flags)
+            if path is not None and not inside(path, [workdir] if writing else read_roots):
+                raise PermissionError(f'{path}: нет доступа')
+        elif event in ('os.listdir', 'os.scandir'):
+            if args[0] is not None and not inside(args[0], read_roots):
+                raise PermissionError(f'{args[0]}: нет доступа')
+        elif event.startswith(path_events):
+            for arg in args:
+                if isinstance(arg, (str, bytes, os.PathLike)) and not inside(arg, [workdir]):
+                    raise PermissionError(f'{arg}: нет доступа')
+
+    sys.addaudithook(hook)
+
+with open(sys.argv[1], encoding='utf-8') as f:
+    _source = f.read()
+sys.argv = sys.argv[1:]
+_install()
+del _install
+exec(compile(_source, 'solution.py', 'exec'), {'__name__': '__main__', '__builtins__': __builtins__})
+'''
+
+UID_LOCK_DIR = os.path.join(tempfile.gettempdir(), 'judge-uids')
+
+
+def _limit_resources(time_limit, memory_limit_mb, uid):
+    """preexec_fn: ограничения для дочернего процесса (до смены uid)"""
+    def apply():
+        if resource is None:
+            return
+        cpu = int(time_limit) + 1
+        memory = memory_limit_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_CPU, (cpu, cpu))
+        resource.setrlimit(resource.RLIMIT_AS, (memory, memory))
+        resource.setrlimit(resource.RLIMIT_FSIZE, (1024 * 1024, 1024 * 1024))
+        resource.setrlimit(resource.RLIMIT_NOFILE, (32, 32))
+        resource.setrlimit(resource.RLIMIT_CORE, (0, 0))
+        # Под uid песочницы работает только этот процесс - fork невозможен
+        resource.setrlimit(resource.RLIMIT_NPROC, (1, 1))
+        if uid is not None:
+            os.setgroups([])
+            os.setgid(uid)
+            os.setuid(uid)
+    return apply
+
+
+def _kill_group(pid):
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+def execute(args, stdin, workdir, time_limit, preexec_fn=None):
+    """
+    Запустить процесс в отдельной группе и убить группу по завершении.
+    Возвращает (returncode, stdout, stderr) или None по таймауту.
+    """
+    proc = subprocess.Popen(
+        args,
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        cwd=workdir,
+        env={'PYTHONIOENCODING': 'utf-8', 'PYTHONHASHSEED': '0'},
+        preexec_fn=preexec_fn,
+        start_new_session=True,
+    )
+    try:
+        stdout, stderr = proc.communicate(stdin, timeout=time_limit)
+    except subprocess.TimeoutExpired:
+        return None
+    finally:
+        _kill_group(proc.pid)
+        if proc.returncode is None:
+            proc.kill()
+            proc.wait()
+        for pipe in (proc.stdin, proc.stdout, proc.stderr):
+            pipe.close()
+    return proc.returncode, stdout, stderr
+
+
+@contextmanager
+def sandbox_uid(uids):
+    """Захватить свободный uid из диапазона (flock), None - без смены uid"""
+    if not uids or fcntl is None:
+        yield None
+        return
+    os.makedirs(UID_LOCK_DIR, mode=0o700, exist_ok=True)
+    while True:
+        for uid in uids:
+            fd = os.open(os.path.join(UID_LOCK_DIR, f'{uid}.lock'), os.O_RDWR | os.O_CREAT, 0o600)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                os.close(fd)
+                continue
+            try:
+                yield uid
+            finally:
+                os.close(fd)
+            return
+        time.sleep(0.05)
+
+
+def normalize_output(text):
+    """Сравнение вывода без учёта хвостовых пробелов и пустых строк"""
+    return '\n'.join(line.rstrip() for line in text.strip().splitlines())
+
+
+def run_test(path, workdir, test, time_limit, memory_limit_mb, uid=None):
+    """Выполнить один тест. Возвращает dict со статусом и временем"""
+    started = time.perf_counter()
+    completed = execute(
+        [sys.executable, '-I', '-S', '-B', '-c', GUARD, path],
+        str(test.get('input', '')).encode('utf-8'),
+        workdir,
+        time_limit,
+        _limit_resources(time_limit, memory_limit_mb, uid),
+    )
+    if completed is None:
+        return {'status': TIMEOUT, 'time': time_limit}
+    elapsed = round(time.perf_counter() - started, 3)
+    returncode, stdout, stderr = completed
+
+    stdout = stdout[:OUTPUT_LIMIT].decode('utf-8', 'replace')
+    stderr = stderr[-OUTPUT_LIMIT:].decode('utf-8', 'replace').replace(path, 'solution.py')
+
+    if returncode != 0:
+        if 'MemoryError' in stderr:
+            status = MEMORY_LIMIT
+        elif returncode < 0:
+            status = TIMEOUT  # SIGXCPU/SIGKILL по RLIMIT_CPU
+        else:
+            status = RUNTIME_ERROR
+        return {'status': status, 'time': elapsed, 'error': stderr[-ERROR_TAIL:]}
+
+    expected = normalize_output(str(test.get('expected_output', '')))
+    status = OK if normalize_output(stdout) == expected else WRONG_ANSWER
+    return {'status': status, 'time': elapsed}
+
+
+def run_tests(code, tests, time_limit, memory_limit_mb=DEFAULT_MEMORY_LIMIT_MB, uids=None):
+    """
+    Прогнать code на всех tests ([{"input": ..., "expected_output": ...}]).
+    uids - диапазон uid песочницы (см. модуль).
+    Возвращает список результатов в порядке тестов.
+    """
+    with sandbox_uid(uids) as uid, tempfile.TemporaryDirectory(prefix='judge-') as workdir:
+        path = os.path.join(workdir, 'solution.py')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(code)
+        os.chmod(path, 0o644)
+        if uid is not None:
+            os.chown(workdir, uid, uid)
+        return [
+            run_test(path, workdir, test, time_limit, memory_limit_mb, uid)
+            for test in tests
+        ]
@@ -0,0 +1,377 @@
+"""
+Полнотекстовый поиск по каталогу курсов.
+
+Вместо трёх icontains-сканов по courses_course поддерживается отдельный
+инвертированный индекс по полям title / subtitle / description /
+learning_outcomes:
+
+- SQLite: виртуальная таблица FTS5 ``courses_course_fts``
+  (tokenizer porter + unicode61, русская морфология - стеммер ниже);
+- PostgreSQL: таблица ``courses_course_search`` с tsvector и GIN-индексом
+  (конфигурация ``russian`` стеммит и кириллицу, и латиницу).
+
+Индекс синхронизируется в сигналах Course (courses/signals.py),
+полная перестройка - ``python manage.py rebuild_search_index``.
+"""
+import re
+
+from django.conf import settings
+from django.db import connection as default_connection
+
+# Поля курса, которые попадают в индекс (порядок важен для весов)
+INDEXED_FIELDS = ('title', 'subtitle', 'description', 'learning_outcomes')
+
+SQLITE_TABLE = 'courses_course_fts'
+POSTGRES_TABLE = 'courses_course_search'
+
+_WORD_RE = re.compile(r'\w+', re.UNICODE)
+_CYRILLIC_RE = re.compile(r'[а-яё]', re.IGNORECASE)
+
+
+# ============================================================
+# RUSSIAN STEMMER (Snowball)
+# ============================================================
+
+_RU_VOWELS = 'аеиоуыэюя'
+
+_PERFECTIVE_GERUND_1 = ('в', 'вши', 'вшись')
+_PERFECTIVE_GERUND_2 = ('ив', 'ивши', 'ившись', 'ыв', 'ывши', 'ывшись')
+_ADJECTIVE = (
+    'ее', 'ие', 'ые', 'ое', 'ими', 'ыми', 'ей', 'ий', 'ый', 'ой', 'ем', 'им',
+    'ым', 'ом', 'его', 'ого', 'ему', 'ому', 'их', 'ых', 'ую', 'юю', 'ая',
+    'яя', 'ою', 'ею',
+)
+_PARTICIPLE_1 = ('ем', 'нн', 'вш', 'ющ', 'щ')
+_PARTICIPLE_2 = ('ивш', 'ывш', 'ующ')
+_REFLEXIVE = ('ся', 'сь')
+_VERB_1 = (
+    'ла', 'на', 'ете', 'йте', 'ли', 'й', 'л', 'ем', 'н', 'ло', 'но', 'ет',
+    'ют', 'ны', 'ть', 'ешь', 'нно',
+)
+_VERB_2 = (
+    'ила', 'ыла', 'ена', 'ейте', 'уйте', 'ите', 'или', 'ыли', 'ей', 'уй',
+    'ил', 'ыл', 'им', 'ым', 'ен', 'ило', 'ыло', 'ено', 'ят', 'ует', 'уют',
+    'ит', 'ыт', 'ены', 'ить', 'ыть', 'ишь', 'ую', 'ю',
+)
+_NOUN = (
+    'а', 'ев', 'ов', 'ие', 'ье', 'е', 'иями', 'ями', 'ами', 'еи', 'ии', 'и',
+    'ией', 'ей', 'ой', 'ий', 'й', 'иям', 'ям', 'ием', 'ем', 'ам', 'ом', 'о',
+    'у', 'ах', 'иях', 'ях', 'ы', 'ь', 'ию', 'ью', 'ю', 'ия', 'ья', 'я',
+)
+_SUPERLATIVE = ('ейш', 'ейше')
+_DERIVATIONAL = ('ост', 'ость')
+
+
+def _strip_suffix(rv, group_after_a=(), group_plain=()):
+    """
+    Отрезать самое длинное окончание из двух групп.
+    Окончания первой группы допустимы только после «а» / «я».
+    Возвращает укороченную строку или None.
+    """
+    best = None
+    for ending in group_after_a:
+        if rv.endswith(ending) and len(rv) > len(ending) and rv[-len(ending) - 1] in 'ая':
+            if best is None or len(ending) > len(best):
+                best = ending
+    for ending in group_plain:
+        if rv.endswith(ending) and (best is None or len(ending) > len(best)):
+            best = ending
+    if best is None:
+        return None
+    return rv[:-len(best)]
+
+
+def _regions(word):
+    """Начало RV и R2 (индексы в слове) по правилам Snowball"""
+    rv = len(word)
+    for i, char in enumerate(word):
+        if char in _RU_VOWELS:
+            rv = i + 1
+            break
+
+    def next_region(start):
+        for i in range(start + 1, len(word)):
+            if word[i] not in _RU_VOWELS and word[i - 1] in _RU_VOWELS:
+                return i + 1
+        return len(word)
+
+    r1 = next_region(0)
+    r2 = next_region(r1)
+    return rv, r2
+
+
+def stem_russian(word):
+    """
+    Стемминг русского слова (алгоритм Snowball для русского языка).
+    Слово ожидается в нижнем регистре.
+    """
+    word = word.replace('ё', 'е')
+    rv_start, r2_start = _regions(word)
+    prefix, rv = word[:rv_start], word[rv_start:]
+
+    # Шаг 1: деепричастие, иначе возвратность + прилагательное/глагол/существительное
+    stripped = _strip_suffix(rv, _PERFECTIVE_GERUND_1, _PERFECTIVE_GERUND_2)
+    if stripped is not None:
+        rv = stripped
+    else:
+        rv = _strip_suffix(rv, group_plain=_REFLEXIVE) or rv
+        stripped = _strip_suffix(rv, group_plain=_ADJECTIVE)
+        if stripped is not None:
+            rv = _strip_suffix(stripped, _PARTICIPLE_1, _PARTICIPLE_2) or stripped
+        else:
+            stripped = _strip_suffix(rv, _VERB_1, _VERB_2)
+            if stripped is None:
+                stripped = _strip_suffix(rv, group_plain=_NOUN)
+            if stripped is not None:
+                rv = stripped
+
+    # Шаг 2
+    if rv.endswith('и'):
+        rv = rv[:-1]
+
+    # Шаг 3: словообразовательный суффикс в R2
+    for ending in _DERIVATIONAL:
+        if rv.endswith(ending) and rv_start + len(rv) - len(ending) >= r2_start:
+            rv = rv[:-len(ending)]
+            break
+
+    # Шаг 4
+    if rv.endswith('нн'):
+        rv = rv[:-1]
+    else:
+        stripped = _strip_suffix(rv, group_plain=_SUPERLATIVE)
+        if stripped is not None:
+            rv = stripped[:-1] if stripped.endswith('нн') else stripped
+        elif rv.endswith('ь'):
+            rv = rv[:-1]
+
+    return prefix + rv
+
+
+def normalize_text(text):
+    """
+    Подготовить текст для FTS5: русские слова приводятся к основе,
+    английские оставляются tokenizer'у porter.
+    """
+    if not text:
+        return ''
+    words = []
+    for word in _WORD_RE.findall(text.lower()):
+        if _CYRILLIC_RE.search(word):
+            word = stem_russian(word)
+        words.append(word)
+    return ' '.join(words)
+
+
+def query_terms(query):
+    """Термы поискового запроса (с русским стеммингом, без служебных символов)"""
+    return [term for term in normalize_text(query).split() if term]
+
+
+# ============================================================
+# BACKENDS
+# ============================================================
+
+class BaseSearchBackend:
+    """Общий интерфейс бэкенда поиска"""
+
+    vendor = None
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def index_document(self, course_id, document):
+        """Добавить или обновить документ. document - dict по INDEXED_FIELDS"""
+        raise NotImplementedError
+
+    def remove_document(self, course_id):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def search_join(self, query, table):
+        """
+        Соединение таблицы курсов table с индексом для QuerySet.extra():
+        dict с tables / where / params / select (search_rank - чем меньше,
+        тем релевантнее) / select_params. None - пустой запрос.
+        """
+        raise NotImplementedError
+
+
+class SQLiteFTSBackend(BaseSearchBackend):
+    """
+    SQLite FTS5. rowid виртуальной таблицы совпадает с id курса.
+    """
+    vendor = 'sqlite'
+
+    # Вес полей для bm25 (title, subtitle, description, learning_outcomes)
+    weights = (10.0, 5.0, 1.0, 2.0)
+
+    def index_document(self, course_id, document):
+        values = [normalize_text(document.get(field, '')) for field in INDEXED_FIELDS]
+        with self.connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {SQLITE_TABLE} WHERE rowid = %s', [course_id])
+            cursor.execute(
+                f'INSERT INTO {SQLITE_TABLE} (rowid, {", ".join(INDEXED_FIELDS)}) '
+                f'VALUES (%s, %s, %s, %s, %s)',
+                [course_id, *values]
+            )
+
+    def remove_document(self, course_id):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {SQLITE_TABLE} WHERE rowid = %s', [course_id])
+
+    def clear(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {SQLITE_TABLE}')
+
+    def search_join(self, query, table):
+        terms = query_terms(query)
+        if not terms:
+            return None
+        # Каждый терм - префиксный поиск, термы объединяются через AND
+        match = ' '.join(f'"{term}"*' for term in terms)
+        weights = ', '.join(str(w) for w in self.weights)
+        return {
+            'tables': [SQLITE_TABLE],
+            'where': [f'{SQLITE_TABLE}.rowid = {table}.id', f'{SQLITE_TABLE} MATCH %s'],
+            'params': [match],
+            # bm25 отрицателен, лучшие совпадения - меньше
+            'select': {'search_rank': f'bm25({SQLITE_TABLE}, {weights})'},
+            'select_params': [],
+        }
+
+
+class PostgresSearchBackend(BaseSearchBackend):
+    """
+    PostgreSQL: tsvector с весами A-D и GIN-индексом.
+    """
+    vendor = 'postgresql'
+
+    def __init__(self, connection):
+        super().__init__(connection)
+        self.config = getattr(settings, 'COURSE_SEARCH_CONFIG', 'russian')
+
+    def index_document(self, course_id, document):
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {POSTGRES_TABLE} (course_id, document) VALUES ('
+                f'%s, '
+                f"setweight(to_tsvector(%s::regconfig, %s), 'A') || "
+                f"setweight(to_tsvector(%s::regconfig, %s), 'B') || "
+                f"setweight(to_tsvector(%s::regconfig, %s), 'D') || "
+                f"setweight(to_tsvector(%s::regconfig, %s), 'C')"
+                f') ON CONFLICT (course_id) DO UPDATE SET document = EXCLUDED.document',
+                [
+                    course_id,
+                    self.config, document.get('title', ''),
+                    self.config, document.get('subtitle', ''),
+                    self.config, document.get('description', ''),
+                    self.config, document.get('learning_outcomes', ''),
+                ]
+            )
+
+    def remove_document(self, course_id):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {POSTGRES_TABLE} WHERE course_id = %s', [course_id])
+
+    def clear(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {POSTGRES_TABLE}')
+
+    def search_join(self, query, table):
+        # Стемминг выполняет сам PostgreSQL, здесь только очистка и префиксы
+        terms = _WORD_RE.findall(query.lower())
+        if not terms:
+            return None
+        tsquery = ' & '.join(f'{term}:*' for term in terms)
+        return {
+            'tables': [POSTGRES_TABLE],
+            'where': [
+                f'{POSTGRES_TABLE}.course_id = {table}.id',
+                f'{POSTGRES_TABLE}.document @@ to_tsquery(%s::regconfig, %s)',
+            ],
+            'params': [self.config, tsquery],
+            'select': {
+                'search_rank': f'-ts_rank({POSTGRES_TABLE}.document, to_tsquery(%s::regconfig, %s))',
+            },
+            'select_params': [self.config, tsquery],
+        }
+
+
+BACKENDS = {
+    'sqlite': SQLiteFTSBackend,
+    'postgresql': PostgresSearchBackend,
+}
+
+
+def get_search_backend(connection=None):
+    """
+    Бэкенд поиска для соединения (None - если СУБД не поддерживается,
+    тогда каталог использует icontains-поиск).
+    """
+    connection = connection or default_connection
+    backend_class = BACKENDS.get(connection.vendor)
+    if backend_class is None or not getattr(settings, 'COURSE_SEARCH_ENABLED', True):
+        return None
+    return backend_class(connection)
+
+
+def course_document(course):
+    """Индексируемые поля курса"""
+    return {field: getattr(course, field, '') or '' for field in INDEXED_FIELDS}
+
+
+def index_course(course):
+    backend = get_search_backend()
+    if backend is not None:
+        backend.index_document(course.pk, course_document(course))
+
+
+def remove_course(course_id):
+    backend = get_search_backend()
+    if backend is not None:
+        backend.remove_document(course_id)
+
+
+def rebuild_index(batch_size=1000):
+    """Полная перестройка индекса. Возвращает количество проиндексированных курсов."""
+    from .models import Course
+
+    backend = get_search_backend()
+    if backend is None:
+        return 0
+    backend.clear()
+    count = 0
+    rows = Course.objects.values_list('id', *INDEXED_FIELDS).iterator(chunk_size=batch_size)
+    for row in rows:
+        backend.index_document(row[0], dict(zip(INDEXED_FIELDS, row[1:])))
+        count += 1
+    return count
+
+
+def search_courses(queryset, query):
+    """
+    Отфильтровать queryset курсов по поисковому запросу.
+
+    Индекс соединяется с таблицей курсов в том же SQL-запросе, поэтому
+    фильтры каталога (статус, категория, уровень, цена) применяются
+    вместе с MATCH, а не к обрезанному списку совпадений.
+    Результат упорядочен по релевантности (поле search_rank, меньше - лучше);
+    ограничение COURSE_SEARCH_MAX_RESULTS накладывает вызывающий код
+    после всех фильтров.
+    """
+    backend = get_search_backend()
+    if backend is None:
+        from django.db.models import Q
+        return queryset.filter(
+            Q(title__icontains=query) |
+            Q(description__icontains=query) |
+            Q(subtitle__icontains=query)
+        )
+
+    join = backend.search_join(query, queryset.model._meta.db_table)
+    if join is None:
+        return queryset.none()
+    return queryset.extra(**join).order_by('search_rank')
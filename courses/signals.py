@@ -0,0 +1,149 @@
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .catalog import invalidate_catalog
+from .models import Category, Course, Enrollment, Lesson, Review, Section, Step
+from .outline import invalidate_outline
+from .rendering import warm_step_cache
+from .search import INDEXED_FIELDS, index_course, remove_course
+from .stats import enrollment_added, enrollment_removed, refresh_rating
+
+
+@receiver(post_save, sender=Course)
+def update_course_search_index(sender, instance, update_fields=None, **kwargs):
+    """Обновить поисковый индекс при сохранении курса"""
+    # save(update_fields=['students_count']) и т.п. не меняют индексируемый текст
+    if update_fields is not None and not set(update_fields) & set(INDEXED_FIELDS):
+        return
+    index_course(instance)
+
+
+@receiver(post_delete, sender=Course)
+def delete_course_search_index(sender, instance, **kwargs):
+    """Удалить курс из поискового индекса"""
+    remove_course(instance.pk)
+
+
+# ============================================================
+# CATALOG (кеш страниц каталога)
+# ============================================================
+
+@receiver(post_save, sender=Course)
+@receiver(post_delete, sender=Course)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_catalog_on_change(sender, raw=False, **kwargs):
+    if not raw:
+        invalidate_catalog()
+
+
+# ============================================================
+# COURSE OUTLINE (инвалидация структуры курса)
+# ============================================================
+
+@receiver(post_save, sender=Section)
+@receiver(post_delete, sender=Section)
+def invalidate_outline_on_section_change(sender, instance, **kwargs):
+    invalidate_outline(pk=instance.course_id)
+
+
+@receiver(post_save, sender=Lesson)
+@receiver(post_delete, sender=Lesson)
+def invalidate_outline_on_lesson_change(sender, instance, **kwargs):
+    invalidate_outline(sections=instance.section_id)
+
+
+@receiver(post_save, sender=Step)
+@receiver(post_delete, sender=Step)
+def invalidate_outline_on_step_change(sender, instance, update_fields=None, **kwargs):
+    # Контент шага в outline не входит - только его наличие и порядок
+    if update_fields is not None and not set(update_fields) & {'order', 'lesson', 'lesson_id'}:
+        return
+    invalidate_outline(sections__lessons=instance.lesson_id)
+
+
+# ============================================================
+# COURSE STATS (students_count, average_rating, total_reviews)
+# ============================================================
+
+@receiver(post_save, sender=Enrollment)
+def count_enrollment(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        enrollment_added(instance.course_id)
+
+
+@receiver(post_delete, sender=Enrollment)
+def uncount_enrollment(sender, instance, **kwargs):
+    enrollment_removed(instance.course_id)
+
+
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def refresh_course_rating(sender, instance, update_fields=None, raw=False, **kwargs):
+    if raw:
+        return
+    if update_fields is not None and not set(update_fields) & {'rating', 'is_approved'}:
+        return
+    refresh_rating(instance.course_id)
+
+
+# ============================================================
+# RENDERED MARKDOWN (прогрев кеша HTML)
+# ============================================================
+
+@receiver(post_save, sender=Step)
+def warm_step_markdown(sender, instance, update_fields=None, raw=False, **kwargs):
+    if raw or (update_fields is not None and 'content' not in update_fields):
+        return
+    warm_step_cache(instance)
+
+
+# ============================================================
+# МАССОВОЕ УДАЛЕНИЕ (generate_load_data --clear)
+# ============================================================
+
+DELETE_RECEIVERS = [
+    (delete_course_search_index, Course),
+    (invalidate_catalog_on_change, Course),
+    (invalidate_catalog_on_change, Category),
+    (invalidate_outline_on_section_change, Section),
+    (invalidate_outline_on_lesson_change, Lesson),
+    (invalidate_outline_on_step_change, Step),
+    (uncount_enrollment, Enrollment),
+    (refresh_course_rating, Review),
+]
+
+
+@contextmanager
+def delete_receivers_disconnected():
+    """
+    Отключить post_delete-обработчики индекса, кешей и счётчиков:
+    без обработчиков Django удаляет связанные записи одним DELETE
+    на таблицу, а не по одной. Производные данные (статистика курсов,
+    поисковый индекс) пересчитывает вызывающий код.
+    """
+    for handler, sender in DELETE_RECEIVERS:
+        post_delete.disconnect(handler, sender=sender)
+    try:
+        yield
+    finally:
+        for handler, sender in DELETE_RECEIVERS:
+            post_delete.connect(handler, sender=sender)
+
+
+# ============================================================
+# SQLITE (PRAGMA для каждого нового соединения)
+# ============================================================
+
+@receiver(connection_created)
+def configure_sqlite(sender, connection, **kwargs):
+    """WAL и synchronous=NORMAL из SQLITE_PRAGMAS (см. settings)"""
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for name, value in getattr(settings, 'SQLITE_PRAGMAS', {}).items():
+            cursor.execute(f'PRAGMA {name} = {value}')
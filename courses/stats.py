@@ -0,0 +1,87 @@
+"""
+Статистика курса: students_count, average_rating, total_reviews.
+
+Поля Course обновляются в той же транзакции, что и событие
+(сигналы Enrollment/Review в courses/signals.py), поэтому счётчики
+корректны при любом способе записи на курс: бесплатная запись,
+checkout, Stripe, админка.
+
+- запись/отписка: F()-инкремент students_count, без чтения курса;
+- отзыв (создание/изменение/модерация/удаление): один UPDATE
+  с подзапросами по одобренным отзывам курса - без гонки
+  "прочитать-изменить-записать" в Python.
+
+Изменение счётчиков помечает кеш каталога устаревшим (stats_changed,
+courses/catalog.py) - страницы обновляются не чаще CATALOG_STATS_REFRESH;
+сверка всех курсов сбрасывает кеш сразу.
+
+Сверка всех курсов: python manage.py recompute_course_stats
+"""
+from django.db.models import (Avg, Count, DecimalField, F, IntegerField, OuterRef,
+                              Subquery, Value)
+from django.db.models.functions import Coalesce, Greatest
+
+from .catalog import invalidate_catalog, stats_changed
+from .models import Course, Enrollment, Review
+
+RATING_FIELD = DecimalField(max_digits=3, decimal_places=2)
+
+
+def enrollment_added(course_id):
+    Course.objects.filter(pk=course_id).update(
+        students_count=F('students_count') + 1
+    )
+    stats_changed()
+
+
+def enrollment_removed(course_id):
+    Course.objects.filter(pk=course_id).update(
+        students_count=Greatest(F('students_count') - 1, Value(0))
+    )
+    stats_changed()
+
+
+def _grouped_subquery(queryset, aggregate):
+    """Агрегат по курсу как коррелированный подзапрос (GROUP BY course_id)"""
+    return Subquery(
+        queryset.filter(course=OuterRef('pk')).order_by()
+        .values('course').annotate(value=aggregate).values('value')
+    )
+
+
+def _rating_expressions():
+    approved = Review.objects.filter(is_approved=True)
+    return {
+        'average_rating': Coalesce(
+            _grouped_subquery(approved, Avg('rating', output_field=RATING_FIELD)),
+            Value(0), output_field=RATING_FIELD,
+        ),
+        'total_reviews': Coalesce(
+            _grouped_subquery(approved, Count('id')),
+            Value(0), output_field=IntegerField(),
+        ),
+    }
+
+
+def refresh_rating(course_id):
+    """Пересчитать рейтинг одного курса (один UPDATE)"""
+    Course.objects.filter(pk=course_id).update(**_rating_expressions())
+    stats_changed()
+
+
+def recompute_course_stats(courses=None):
+    """
+    Сверить статистику курсов с исходными данными одним UPDATE
+    с группирующими подзапросами. Возвращает количество курсов.
+    """
+    if courses is None:
+        courses = Course.objects.all()
+    updated = courses.update(
+        students_count=Coalesce(
+            _grouped_subquery(Enrollment.objects.all(), Count('id')),
+            Value(0), output_field=IntegerField(),
+        ),
+        **_rating_expressions(),
+    )
+    invalidate_catalog()
+    return updated
@@ -0,0 +1,94 @@
+"""
+Вспомогательные средства тестов: бюджет SQL-запросов.
+
+N+1 не виден на маленьком наборе данных, поэтому view проверяется
+дважды - до и после увеличения данных - и число запросов должно
+совпасть и не превышать бюджет:
+
+    class MyViewTest(QueryBudgetMixin, TestCase):
+        def test_budget(self):
+            self.assertConstantQueries(
+                lambda: self.client.get(url), grow=self.add_more_data, budget=8)
+
+Для одиночной проверки - контекстный менеджер / декоратор:
+
+    with query_budget(5):
+        self.client.get(url)
+
+    @query_budget(5)
+    def test_something(self): ...
+"""
+from contextlib import ContextDecorator
+
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test.utils import CaptureQueriesContext
+
+
+def format_queries(queries, limit=50):
+    """Пронумерованный список SQL для сообщения об ошибке"""
+    lines = [f'{i}. {query["sql"]}' for i, query in enumerate(queries[:limit], 1)]
+    if len(queries) > limit:
+        lines.append(f'... ещё {len(queries) - limit}')
+    return '\n'.join(lines)
+
+
+class query_budget(ContextDecorator):
+    """Не более max_queries запросов внутри блока (контекстный менеджер и декоратор)"""
+
+    def __init__(self, max_queries, using=DEFAULT_DB_ALIAS):
+        self.max_queries = max_queries
+        self.using = using
+
+    def __enter__(self):
+        self.captured = CaptureQueriesContext(connections[self.using])
+        self.captured.__enter__()
+        return self.captured
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.captured.__exit__(exc_type, exc_value, traceback)
+        if exc_type is None and len(self.captured) > self.max_queries:
+            raise AssertionError(
+                f'Превышен бюджет запросов: {len(self.captured)} > {self.max_queries}\n'
+                f'{format_queries(self.captured.captured_queries)}'
+            )
+        return False
+
+
+class QueryBudgetMixin:
+    """Проверки числа запросов для TestCase"""
+
+    def countQueries(self, action, using=DEFAULT_DB_ALIAS):
+        """Выполнить action и вернуть (результат, список запросов)"""
+        with CaptureQueriesContext(connections[using]) as captured:
+            result = action()
+        return result, captured.captured_queries
+
+    def assertConstantQueries(self, action, grow, budget, msg=None, setup=None):
+        """
+        Число запросов action не превышает budget и не меняется
+        после grow() - добавления данных, по которым мог бы идти цикл.
+        setup() выполняется перед каждым замером вне подсчёта,
+        его результат передаётся в action.
+        Возвращает число запросов.
+        """
+        def measure():
+            if setup is None:
+                return self.countQueries(action)[1]
+            prepared = setup()
+            return self.countQueries(lambda: action(prepared))[1]
+
+        small = measure()
+        grow()
+        large = measure()
+        prefix = f'{msg}: ' if msg else ''
+        if len(small) != len(large):
+            self.fail(
+                f'{prefix}число запросов зависит от объёма данных: '
+                f'{len(small)} -> {len(large)}\n{format_queries(large)}'
+            )
+        if len(large) > budget:
+            self.fail(
+                f'{prefix}превышен бюджет запросов: {len(large)} > {budget}\n'
+                f'{format_queries(large)}'
+            )
+        return len(large)
@@ -0,0 +1,137 @@
+"""
+CourseMaster - Тесты management-команд
+Тесты команд миграции, генерации данных и бенчмарка
+"""
+
+from io import StringIO
+
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.contrib.auth.models import User
+
+from courses.models import (
+    Course, Section, Lesson, Enrollment, Step, Quiz, Question, QuestionChoice,
+    Assignment, StepMigrationCheckpoint
+)
+
+
+class MigrateToStepsTest(TestCase):
+    """Тесты команды migrate_to_steps (диапазоны, чекпоинты, bulk_create)"""
+    
+    def setUp(self):
+        instructor = User.objects.create_user(username='instructor', password='testpass123')
+        course = Course.objects.create(title='Legacy', slug='legacy', instructor=instructor)
+        section = Section.objects.create(course=course, title='Раздел')
+        self.quiz_lesson = Lesson.objects.create(section=section, title='Тест', order=0)
+        self.assignment_lesson = Lesson.objects.create(section=section, title='Задание', order=1)
+        self.migrated_lesson = Lesson.objects.create(section=section, title='Шаги', order=2)
+        Step.objects.create(lesson=self.migrated_lesson, step_type='text')
+        
+        quiz = Quiz.objects.create(lesson=self.quiz_lesson)
+        for order in range(2):
+            question = Question.objects.create(quiz=quiz, text=f'Q{order}', order=order, points=3)
+            QuestionChoice.objects.create(question=question, text='да', order=0)
+            QuestionChoice.objects.create(question=question, text='нет', order=1, is_correct=True)
+        Assignment.objects.create(lesson=self.assignment_lesson, description='Сделайте', max_points=20)
+    
+    def migrate(self, *args):
+        out = StringIO()
+        call_command('migrate_to_steps', '--execute', '--chunk-size', '1', *args, stdout=out)
+        return out.getvalue()
+    
+    def test_migrate_in_chunks(self):
+        """Тест: шаги создаются, уже мигрированные уроки пропускаются"""
+        output = self.migrate()
+        self.assertIn('Создано 3 шагов для 2 уроков', output)
+        
+        steps = list(self.quiz_lesson.steps.all())
+        self.assertEqual([s.step_type for s in steps], ['quiz_single', 'quiz_single'])
+        self.assertEqual(steps[0].content['correct_index'], 1)
+        self.assertNotIn('correct_index', steps[0].public_content)
+        self.assertEqual(self.assignment_lesson.steps.get().points, 20)
+        self.assertEqual(self.migrated_lesson.steps.count(), 1)
+        self.assertEqual(StepMigrationCheckpoint.objects.count(), 3)
+    
+    def test_resume_skips_finished_chunks(self):
+        """Тест: повторный запуск продолжает с необработанных диапазонов"""
+        from courses.management.commands.migrate_to_steps import migrate_chunk
+        
+        migrate_chunk(self.quiz_lesson.id, self.quiz_lesson.id)
+        output = self.migrate()
+        self.assertIn('Диапазонов: 2 из 3', output)
+        self.assertEqual(self.quiz_lesson.steps.count(), 2)
+        
+        output = self.migrate('--restart')
+        self.assertIn('Создано 0 шагов', output)
+
+
+class GenerateLoadDataTest(TestCase):
+    """Тесты генератора синтетических данных (generate_load_data)"""
+    
+    def generate(self, *args):
+        call_command('generate_load_data', '--courses', '3', '--sections', '2', '--lessons', '2',
+                     '--steps', '3', '--students', '15', *args, stdout=StringIO())
+    
+    def snapshot(self):
+        return list(Enrollment.objects.order_by('student__username', 'course__slug').values_list(
+            'student__username', 'course__slug', 'completed_steps_count'))
+    
+    def test_dataset_is_consistent_and_deterministic(self):
+        """Тест: счётчики согласованы, одинаковый seed - одинаковые данные"""
+        self.generate()
+        self.assertEqual(Step.objects.count(), 3 * 2 * 2 * 3)
+        for course in Course.objects.all():
+            self.assertEqual(course.students_count, course.enrollments.count())
+        enrollment = Enrollment.objects.order_by('-completed_steps_count').first()
+        self.assertEqual(enrollment.completed_steps_count,
+                         enrollment.step_progress.filter(completed=True).count())
+        self.assertFalse(Step.objects.filter(public_content={}).exists())
+        first = self.snapshot()
+        
+        with self.assertRaises(CommandError):
+            self.generate()
+        self.generate('--clear')
+        self.assertFalse(Course.objects.exists())
+        self.generate()
+        self.assertEqual(self.snapshot(), first)
+
+    
+    def test_clear_deletes_in_bulk(self):
+        """Тест: --clear не зависит по числу запросов от объёма данных и сверяет счётчики"""
+        instructor = User.objects.create_user(username='owner', password='testpass123')
+        other = Course.objects.create(title='Чужой курс', slug='other', instructor=instructor)
+        counts = []
+        for students in ('5', '30'):
+            self.generate('--students', students)
+            Enrollment.objects.create(student=User.objects.get(username='load_student_1'), course=other)
+            with CaptureQueriesContext(connection) as queries:
+                self.generate('--clear')
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+        self.assertEqual(list(Course.objects.all()), [other])
+        other.refresh_from_db()
+        self.assertEqual(other.students_count, 0)
+        
+        # Обработчики снова подключены
+        Enrollment.objects.create(student=instructor, course=other)
+        other.refresh_from_db()
+        self.assertEqual(other.students_count, 1)
+
+class BenchmarkCommandTest(TestCase):
+    """Тесты сценариев команды benchmark (на тестовой БД, без создания новой)"""
+    
+    def test_scenarios_measure(self):
+        """Тест: все сценарии выполняются и дают метрики отчёта"""
+        from courses.management.commands import benchmark
+        
+        self.assertEqual(benchmark.percentile([1, 2, 3, 4, 5], 50), 3)
+        call_command('generate_load_data', '--courses', '2', '--students', '10', stdout=StringIO())
+        command = benchmark.Command(stdout=StringIO())
+        fixture = command.build_fixture()
+        self.client.force_login(fixture['student'])
+        for name, scenario in benchmark.SCENARIOS.items():
+            result = command.measure(self.client, fixture, scenario, {'warmup': 0, 'iterations': 2})
+            self.assertGreater(result['queries'], 0, name)
+            self.assertLessEqual(result['p50_ms'], result['p95_ms'])
@@ -0,0 +1,138 @@
+"""
+CourseMaster - Тесты буфера отметок
+Тесты буфера отметок шагов
+"""
+
+import fcntl
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.contrib.auth.models import User
+from django.core.cache import cache
+
+from courses.models import (
+    Course, Section, Lesson, Enrollment, LessonProgress, Step, StepProgress
+)
+from courses import completions
+
+
+class StepCompletionBufferTest(TestCase):
+    """Тесты буфера отметок шагов (courses/completions.py)"""
+    
+    def setUp(self):
+        cache.clear()
+        self.journal_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.journal_dir, ignore_errors=True)
+        settings_override = override_settings(
+            STEP_COMPLETION_BUFFER_SIZE=3,
+            STEP_COMPLETION_FLUSH_INTERVAL_MS=60 * 1000,
+            STEP_COMPLETION_JOURNAL_DIR=self.journal_dir,
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.addCleanup(completions.reset_buffer)
+        
+        instructor = User.objects.create_user(username='instructor', password='testpass123')
+        student = User.objects.create_user(username='student', password='testpass123')
+        course = Course.objects.create(title='Курс', slug='buffer-course', instructor=instructor,
+                                       status='published')
+        section = Section.objects.create(course=course, title='Раздел', order=1)
+        self.lesson = Lesson.objects.create(section=section, title='Урок', order=1)
+        self.steps = [
+            Step.objects.create(lesson=self.lesson, step_type='text', order=i, points=2)
+            for i in range(4)
+        ]
+        self.enrollment = Enrollment.objects.create(student=student, course=course)
+        self.client.force_login(student)
+    
+    def complete_step(self, step):
+        return self.client.post(reverse('api_step_complete', kwargs={'step_id': step.id}))
+    
+    def journal_events(self):
+        return completions.read_journal(completions.get_buffer().path)
+    
+    def test_completions_flushed_in_batch(self):
+        """Тест: отметки копятся в журнале и записываются пакетом"""
+        response = self.complete_step(self.steps[0])
+        self.assertEqual(response.status_code, 202)
+        self.assertTrue(response.json()['queued'])
+        self.complete_step(self.steps[0])  # повтор - одна отметка
+        self.complete_step(self.steps[1])
+        
+        self.assertFalse(StepProgress.objects.exists())
+        self.assertEqual(len(self.journal_events()), 3)
+        
+        with CaptureQueriesContext(connection) as captured:
+            self.complete_step(self.steps[2])
+        self.assertLess(len(captured), 25)
+        
+        self.enrollment.refresh_from_db()
+        self.assertEqual(self.enrollment.completed_steps_count, 3)
+        self.assertEqual(self.enrollment.earned_points, 6)
+        lesson_progress = LessonProgress.objects.get(enrollment=self.enrollment, lesson=self.lesson)
+        self.assertEqual(lesson_progress.completed_steps, 3)
+        self.assertEqual(self.journal_events(), [])
+    
+    def test_journal_synced_before_response(self):
+        """Тест: отметка сохранена на диск (fsync) до ответа клиенту"""
+        buffer = completions.get_buffer()
+        with mock.patch('courses.completions.os.fsync', wraps=os.fsync) as fsync:
+            self.complete_step(self.steps[0])
+        fsync.assert_called_with(buffer.journal.fileno())
+        self.assertEqual(buffer.synced, buffer.written)
+    
+    def test_apply_is_idempotent(self):
+        """Тест: повторное применение отметок не удваивает счётчики"""
+        events = [{'enrollment': self.enrollment.id, 'step': step.id} for step in self.steps[:2]]
+        self.assertEqual(completions.apply_completions(events), 2)
+        self.assertEqual(completions.apply_completions(events + [
+            {'enrollment': self.enrollment.id, 'step': 0}]), 0)
+        
+        self.enrollment.refresh_from_db()
+        self.assertEqual(self.enrollment.completed_steps_count, 2)
+        self.assertEqual(StepProgress.objects.filter(completed=True).count(), 2)
+    
+    def write_journal(self, name, step):
+        path = os.path.join(self.journal_dir, name)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(json.dumps({'enrollment': self.enrollment.id, 'step': step.id}) + '\n')
+            f.write('{"enrollment": ')  # оборванная запись
+        return path
+    
+    def test_journal_of_crashed_process_replayed(self):
+        """Тест: журнал аварийно завершённого процесса применяется, даже если pid занят"""
+        # pid текущего процесса: владелец журнала умер, его pid переиспользован
+        path = self.write_journal(f'completions-{os.getpid()}-1.jsonl', self.steps[3])
+        open(path[:-len('.jsonl')] + '.lock', 'w').close()
+        
+        call_command('flush_step_completions', stdout=StringIO())
+        
+        self.assertFalse(os.path.exists(path))
+        self.assertFalse(os.path.exists(path[:-len('.jsonl')] + '.lock'))
+        self.assertTrue(StepProgress.objects.get(step=self.steps[3]).completed)
+    
+    def test_journal_of_live_process_skipped(self):
+        """Тест: журнал, удерживаемый владельцем (flock), не применяется"""
+        path = self.write_journal('completions-1-2.jsonl', self.steps[3])
+        with open(path[:-len('.jsonl')] + '.lock', 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            call_command('flush_step_completions', stdout=StringIO())
+        
+        self.assertTrue(os.path.exists(path))
+        self.assertFalse(StepProgress.objects.filter(step=self.steps[3], completed=True).exists())
+    
+    @override_settings(STEP_COMPLETION_BUFFER_SIZE=0)
+    def test_disabled_buffer_writes_synchronously(self):
+        """Тест: без буфера отметка записывается сразу"""
+        response = self.complete_step(self.steps[0])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['steps_completed'], 1)
@@ -0,0 +1,306 @@
+"""
+CourseMaster - Тесты проверки ответов
+Тесты проверяющих ответов на шаги и старых тестов
+"""
+
+import json
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.contrib.auth.models import User
+from django.utils import timezone
+from decimal import Decimal
+
+from courses.models import (
+    Course, Section, Lesson, Enrollment, Step, Quiz, Question, QuestionChoice,
+    QuizAttempt, UserAnswer
+)
+from courses import grading, quiz_scoring
+
+
+class GradingTest(TestCase):
+    """Тесты проверяющих ответов (courses/grading.py)"""
+    
+    def setUp(self):
+        instructor = User.objects.create_user(username='instructor', password='testpass123')
+        course = Course.objects.create(title='Grading', slug='grading', instructor=instructor)
+        section = Section.objects.create(course=course, title='Раздел')
+        self.lesson = Lesson.objects.create(section=section, title='Урок')
+    
+    def make_step(self, step_type, content):
+        return Step.objects.create(lesson=self.lesson, step_type=step_type, content=content)
+    
+    def assertGrades(self, step, correct, wrong):
+        self.assertTrue(grading.grade(step, correct).is_correct)
+        self.assertFalse(grading.grade(step, wrong).is_correct)
+    
+    def test_quiz_graders(self):
+        """Тест проверки тестовых типов шагов"""
+        self.assertGrades(self.make_step('quiz_single', {'correct_index': 2}),
+                          {'selected_index': 2}, {'selected_index': 0})
+        self.assertGrades(self.make_step('quiz_multiple', {'correct_indexes': [0, 2]}),
+                          {'selected_indexes': [2, 0]}, {'selected_indexes': [0]})
+        self.assertGrades(self.make_step('quiz_sorting', {'correct_order': ['a', 'b']}),
+                          {'user_order': ['a', 'b']}, {'user_order': ['b', 'a']})
+        self.assertGrades(self.make_step('quiz_matching', {'pairs': [[0, 1], [1, 0]]}),
+                          {'pairs': [[1, 0], [0, 1]]}, {'pairs': [[0, 0], [1, 1]]})
+        self.assertGrades(self.make_step('fill_blanks', {'answers': ['print', 'def']}),
+                          {'answers': [' Print', 'DEF ']}, {'answers': ['print']})
+    
+    def test_answer_graders(self):
+        """Тест проверки числовых, текстовых и свободных ответов"""
+        self.assertGrades(self.make_step('numeric', {'answer': 3.14, 'tolerance': 0.01}),
+                          {'value': 3.141}, {'value': 'abc'})
+        step = self.make_step('text_answer', {'patterns': [r'^def\s+\w+', '[unclosed']})
+        self.assertGrades(step, {'text': 'DEF main'}, {'text': 'class Main'})
+        self.assertTrue(grading.grade(step, {'text': '[UNCLOSED'}).is_correct)
+        self.assertGrades(self.make_step('free_answer', {'min_length': 5}),
+                          {'text': 'Длинный ответ'}, {'text': 'абв'})
+        self.assertGrades(self.make_step('code', {}), {'code': 'print(1)'}, {'code': '  '})
+    
+    def test_sql_grader(self):
+        """Тест SQL-шага: сравнение без учёта порядка, ошибки и лимиты"""
+        step = self.make_step('sql', {
+            'database_schema': "CREATE TABLE users (id INTEGER, name TEXT);"
+                               "INSERT INTO users VALUES (1, 'Анна'), (2, 'Борис');",
+            'expected_query': 'SELECT name FROM users ORDER BY id',
+        })
+        self.assertGrades(step, {'query': 'SELECT name FROM users ORDER BY id DESC'},
+                          {'query': 'SELECT id FROM users'})
+        
+        for query in ('SELECT * FROM missing',
+                      "ATTACH DATABASE 'x.db' AS x",
+                      'SELECT 1; DROP TABLE users'):
+            result = grading.grade(step, {'query': query})
+            self.assertFalse(result.is_correct)
+            self.assertIn('Ошибка SQL', result.message)
+        
+        # Запрос студента выполняется на копии - шаблон не меняется
+        grading.grade(step, {'query': 'DELETE FROM users'})
+        self.assertTrue(grading.grade(step, {'query': 'SELECT name FROM users'}).is_correct)
+    
+    @override_settings(SQL_GRADER_TIMEOUT=0.2, SQL_GRADER_MAX_ROWS=5)
+    def test_sql_grader_limits(self):
+        """Тест ограничения времени и числа строк SQL-запроса"""
+        step = self.make_step('sql', {'database_schema': '', 'expected_result': [[1]]})
+        result = grading.grade(step, {'query': (
+            'WITH RECURSIVE c(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM c) '
+            'SELECT count(*) FROM c')})
+        self.assertIn('время', result.message)
+        result = grading.grade(step, {'query': (
+            'WITH RECURSIVE c(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM c WHERE x < 10) '
+            'SELECT x FROM c')})
+        self.assertIn('строк', result.message)
+    
+    def test_sql_value_size_limited(self):
+        """Тест: огромные строки и blob отклоняются до выделения памяти"""
+        step = self.make_step('sql', {'database_schema': '', 'expected_result': [[1]]})
+        for query in ('SELECT zeroblob(1000000000)',
+                      'SELECT randomblob(1000000000)',
+                      "SELECT replace(hex(zeroblob(30000)), '0', '00')",
+                      'SELECT ' + ' UNION ALL '.join(['SELECT 1'] * 60)):
+            result = grading.grade(step, {'query': query})
+            self.assertFalse(result.is_correct)
+            self.assertIn('Ошибка SQL', result.message, query)
+    
+    @override_settings(SQL_GRADER_TIMEOUT=0.2, SQL_GRADER_MAX_DB_MB=1)
+    def test_sql_schema_restricted(self):
+        """Тест: схема преподавателя выполняется с теми же ограничениями, что и запросы"""
+        for schema in ("ATTACH DATABASE 'x.db' AS x;",
+                       'WITH RECURSIVE c(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM c) '
+                       'SELECT count(*) FROM c;',
+                       'CREATE TABLE t (b BLOB); INSERT INTO t VALUES (zeroblob(2000000));'):
+            step = self.make_step('sql', {'database_schema': schema, 'expected_result': []})
+            result = grading.grade(step, {'query': 'SELECT 1'})
+            self.assertIn('настроена некорректно', result.message, schema)
+    
+    def test_sql_fixture_built_once(self):
+        """Тест: схема выполняется один раз на ревизию шага"""
+        step = self.make_step('sql', {'database_schema': 'CREATE TABLE t (a INTEGER);',
+                                      'expected_result': []})
+        with mock.patch.object(grading.SQLFixture, '__init__',
+                               autospec=True, side_effect=grading.SQLFixture.__init__) as init:
+            for _ in range(3):
+                grading.grade(step, {'query': 'SELECT a FROM t'})
+        self.assertEqual(init.call_count, 1)
+    
+    def test_sql_expected_result_precomputed_on_save(self):
+        """Тест: хеш эталонного результата считается при сохранении в конструкторе"""
+        step = self.make_step('sql', {})
+        self.client.login(username='instructor', password='testpass123')
+        url = reverse('api_step_update', kwargs={'step_id': step.id})
+        content = {
+            'database_schema': 'CREATE TABLE t (a INTEGER); INSERT INTO t VALUES (1), (2);',
+            'expected_query': 'SELECT a FROM t',
+        }
+        
+        response = self.client.post(url, data=json.dumps({'content': content}),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        step.refresh_from_db()
+        self.assertEqual(step.content['expected_hash'],
+                         grading.result_hash([(2,), (1,)]))
+        self.assertEqual(step.content['expected_rows'], 2)
+        
+        # Проверка ответа выполняет только запрос студента
+        with mock.patch.object(grading.SQLFixture, 'execute', autospec=True,
+                               side_effect=grading.SQLFixture.execute) as execute:
+            self.assertTrue(grading.grade(step, {'query': 'SELECT a FROM t ORDER BY a DESC'}).is_correct)
+        self.assertEqual(execute.call_count, 1)
+        
+        content['expected_query'] = 'SELECT b FROM t'
+        response = self.client.post(url, data=json.dumps({'content': content}),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('эталонном запросе', response.json()['error'])
+        step.refresh_from_db()
+        self.assertEqual(step.content['expected_query'], 'SELECT a FROM t')
+    
+    @override_settings(SQL_GRADER_MAX_ROWS=1)
+    def test_sql_expected_result_over_row_limit_rejected(self):
+        """Тест: эталон больше лимита строк не сохраняется, пустой запрос допустим"""
+        step = self.make_step('sql', {})
+        self.client.login(username='instructor', password='testpass123')
+        url = reverse('api_step_update', kwargs={'step_id': step.id})
+        content = {
+            'database_schema': 'CREATE TABLE t (a INTEGER); INSERT INTO t VALUES (1), (2);',
+            'expected_query': 'SELECT a FROM t',
+        }
+        response = self.client.post(url, data=json.dumps({'content': content}),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('больше 1 строк', response.json()['error'])
+        
+        content['expected_query'] = None
+        response = self.client.post(url, data=json.dumps({'content': content}),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+    
+    def test_malformed_answers_rejected(self):
+        """Тест: ответ неверного формата - InvalidAnswer, а не TypeError/AttributeError"""
+        cases = [
+            ('text_answer', {'patterns': ['a']}, {'text': 5}),
+            ('free_answer', {'min_length': 1}, {'text': ['a']}),
+            ('fill_blanks', {'answers': ['a']}, {'answers': [1]}),
+            ('fill_blanks', {'answers': ['a']}, {'answers': 'a'}),
+            ('quiz_matching', {'pairs': [[0, 1]]}, {'pairs': None}),
+            ('quiz_matching', {'pairs': [[0, 1]]}, {'pairs': [[[0], 1]]}),
+            ('quiz_multiple', {'correct_indexes': [0]}, {'selected_indexes': [[0]]}),
+            ('code', {}, {'code': {'a': 1}}),
+            ('sql', {'expected_result': []}, {'query': 1}),
+            ('quiz_single', {'correct_index': 0}, ['selected_index']),
+        ]
+        for step_type, content, answer in cases:
+            with self.assertRaises(grading.InvalidAnswer, msg=(step_type, answer)):
+                grading.grade(self.make_step(step_type, content), answer)
+        # null и числа в скалярных полях допустимы
+        step = self.make_step('numeric', {'answer': 1})
+        self.assertFalse(grading.grade(step, {'value': None}).is_correct)
+        
+        student = User.objects.create_user(username='student', password='testpass123')
+        Enrollment.objects.create(student=student, course=self.lesson.section.course)
+        self.client.login(username='student', password='testpass123')
+        step = self.make_step('text_answer', {'patterns': ['a']})
+        response = self.client.post(reverse('api_step_check', kwargs={'step_id': step.id}),
+                                    data=json.dumps({'text': 5}), content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('error', response.json())
+        response = self.client.post(reverse('api_step_check', kwargs={'step_id': step.id}),
+                                    data=json.dumps([1]), content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+    
+    def test_unknown_step_type(self):
+        """Тест: для типа без проверяющего ответ не засчитывается"""
+        result = grading.grade(self.make_step('text', {}), {})
+        self.assertFalse(result.is_correct)
+    
+    def test_compiled_artifacts_cached_until_step_changes(self):
+        """Тест кеширования скомпилированных артефактов по (step.id, updated_at)"""
+        step = self.make_step('text_answer', {'patterns': ['^yes$']})
+        grader = grading.get_grader('text_answer')
+        with mock.patch.object(grader, 'compile', wraps=grader.compile) as compile_:
+            grading.grade(step, {'text': 'yes'})
+            grading.grade(step, {'text': 'no'})
+            self.assertEqual(compile_.call_count, 1)
+            
+            step.content = {'patterns': ['^no$']}
+            step.save()
+            self.assertTrue(grading.grade(step, {'text': 'no'}).is_correct)
+            self.assertEqual(compile_.call_count, 2)
+
+
+class QuizScoringTest(TestCase):
+    """Тесты проверки попыток старых тестов (courses/quiz_scoring.py)"""
+    
+    def setUp(self):
+        instructor = User.objects.create_user(username='instructor', password='testpass123')
+        self.student = User.objects.create_user(username='student', password='testpass123')
+        course = Course.objects.create(title='Quiz', slug='quiz', instructor=instructor)
+        section = Section.objects.create(course=course, title='Раздел')
+        lesson = Lesson.objects.create(section=section, title='Урок')
+        self.quiz = Quiz.objects.create(lesson=lesson, title='Тест', pass_percentage=60)
+        self.single = Question.objects.create(quiz=self.quiz, type='single', text='2+2?', order=0, points=2)
+        self.wrong = QuestionChoice.objects.create(question=self.single, text='5', order=0)
+        self.right = QuestionChoice.objects.create(question=self.single, text='4', order=1, is_correct=True)
+        self.text = Question.objects.create(quiz=self.quiz, type='text', text='Столица?', order=1, points=3)
+        QuestionChoice.objects.create(question=self.text, text='Москва', order=0, is_correct=True)
+    
+    def make_attempt(self, student, choice, text, completed=True):
+        attempt = QuizAttempt.objects.create(
+            student=student, quiz=self.quiz, completed_at=timezone.now() if completed else None)
+        UserAnswer.objects.create(attempt=attempt, question=self.single, choice=choice)
+        UserAnswer.objects.create(attempt=attempt, question=self.text, text_answer=text)
+        return attempt
+    
+    def test_score_attempt(self):
+        """Тест: баллы, процент и прохождение теста"""
+        attempt = self.make_attempt(self.student, self.wrong, '  москва ', completed=False)
+        result = quiz_scoring.score_attempt(attempt)
+        self.assertEqual((result.score, result.total_points), (Decimal(3), 5))
+        self.assertEqual(result.percentage, Decimal('60.00'))
+        self.assertTrue(result.is_passed)
+        self.assertGreaterEqual(result.elapsed, 0)
+        
+        attempt.refresh_from_db()
+        self.assertIsNotNone(attempt.completed_at)
+        answers = {a.question_id: a for a in attempt.answers.all()}
+        self.assertFalse(answers[self.single.id].is_correct)
+        self.assertEqual(answers[self.text.id].points_earned, Decimal(3))
+    
+    def test_query_count_independent_of_attempts(self):
+        """Тест: все попытки теста проверяются фиксированным числом запросов"""
+        for i in range(20):
+            student = User.objects.create_user(username=f's{i}', password='testpass123')
+            self.make_attempt(student, self.right if i % 2 else self.wrong, 'Питер')
+        
+        with CaptureQueriesContext(connection) as queries:
+            results = quiz_scoring.score_attempts(self.quiz)
+        self.assertEqual(len(results), 20)
+        self.assertLessEqual(len(queries), 8)
+        self.assertEqual(QuizAttempt.objects.filter(is_passed=False).count(), 20)
+        self.assertEqual(UserAnswer.objects.filter(is_correct=True).count(), 10)
+        
+        out = StringIO()
+        call_command('rescore_quizzes', stdout=out)
+        self.assertIn('Перепроверено попыток: 20', out.getvalue())
+    
+    def test_rescore_keeps_open_attempts_open(self):
+        """Тест: перепроверка не завершает и не оценивает незавершённые попытки"""
+        done = self.make_attempt(self.student, self.right, 'Москва')
+        other = User.objects.create_user(username='other', password='testpass123')
+        open_attempt = self.make_attempt(other, self.right, 'Москва', completed=False)
+        
+        out = StringIO()
+        call_command('rescore_quizzes', stdout=out)
+        self.assertIn('Перепроверено попыток: 1', out.getvalue())
+        
+        done.refresh_from_db()
+        open_attempt.refresh_from_db()
+        self.assertTrue(done.is_passed)
+        self.assertIsNone(open_attempt.completed_at)
+        self.assertIsNone(open_attempt.score)
@@ -0,0 +1,189 @@
+"""
+CourseMaster - Тесты проверки кода
+Тесты очереди проверки кода и песочницы
+"""
+
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import timedelta
+from io import StringIO
+
+from django.conf import settings
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.contrib.auth.models import User
+from django.utils import timezone
+
+from courses.models import (
+    Course, Section, Lesson, Enrollment, Step, StepProgress, CodeSubmission
+)
+from courses import judge, sandbox
+
+
+@override_settings(JUDGE_WORKERS=0, JUDGE_ALLOW_UNSANDBOXED=True)
+class CodeJudgeTest(TestCase):
+    """Тесты проверки кода на тестах шага (courses/judge.py, courses/sandbox.py)"""
+    
+    def setUp(self):
+        instructor = User.objects.create_user(username='instructor', password='testpass123')
+        self.student = User.objects.create_user(username='student', password='testpass123')
+        course = Course.objects.create(title='Judge', slug='judge', instructor=instructor)
+        section = Section.objects.create(course=course, title='Раздел')
+        lesson = Lesson.objects.create(section=section, title='Урок')
+        self.step = Step.objects.create(
+            lesson=lesson, step_type='code', points=10,
+            content={'language': 'python', 'time_limit': 1, 'tests': [
+                {'input': '2', 'expected_output': '4'},
+                {'input': '5', 'expected_output': '25'},
+            ]})
+        self.enrollment = Enrollment.objects.create(student=self.student, course=course)
+        self.client.login(username='student', password='testpass123')
+    
+    def send_code(self, code):
+        return self.client.post(
+            reverse('api_step_check', kwargs={'step_id': self.step.id}),
+            data=json.dumps({'code': code}),
+            content_type='application/json'
+        ).json()
+    
+    def test_correct_solution_completes_step(self):
+        """Тест: решение, прошедшее все тесты, засчитывается"""
+        data = self.send_code('n = int(input())\nprint(n * n)')
+        self.assertTrue(data['is_correct'])
+        self.assertEqual((data['passed'], data['total']), (2, 2))
+        
+        poll = self.client.get(data['poll_url']).json()
+        self.assertEqual(poll['status'], 'done')
+        self.assertTrue(poll['completed'])
+        self.enrollment.refresh_from_db()
+        self.assertEqual(self.enrollment.earned_points, 10)
+    
+    def test_failing_solutions(self):
+        """Тест статусов неверного ответа, ошибки и превышения времени"""
+        data = self.send_code('n = int(input())\nprint(n + n)')
+        self.assertFalse(data['is_correct'])
+        self.assertEqual([t['status'] for t in data['tests']], ['ok', 'wrong_answer'])
+        
+        data = self.send_code('raise SystemExit(1)')
+        self.assertEqual(data['tests'][0]['status'], 'runtime_error')
+        
+        self.step.content['tests'] = self.step.content['tests'][:1]
+        self.step.save()
+        data = self.send_code('while True:\n    pass')
+        self.assertEqual(data['tests'][0]['status'], 'timeout')
+        self.assertFalse(StepProgress.objects.get(step=self.step).completed)
+    
+    def test_older_failing_result_does_not_override_newer(self):
+        """Тест: результат старой попытки, пришедший позже, не сбрасывает is_correct"""
+        older = CodeSubmission.objects.create(
+            enrollment=self.enrollment, step=self.step, code='print(0)', total=2)
+        self.assertTrue(self.send_code('n = int(input())\nprint(n * n)')['is_correct'])
+        
+        judge.finish(older.pk, [{'status': sandbox.WRONG_ANSWER}] * 2)
+        progress = StepProgress.objects.get(step=self.step)
+        self.assertTrue(progress.is_correct)
+        self.assertTrue(progress.completed)
+    
+    def test_requeue_stale_submissions(self):
+        """Тест: задания, зависшие в очереди после перезапуска, перепроверяются"""
+        StepProgress.objects.create(enrollment=self.enrollment, step=self.step)
+        stale = CodeSubmission.objects.create(
+            enrollment=self.enrollment, step=self.step,
+            code='n = int(input())\nprint(n * n)', total=2)
+        fresh = CodeSubmission.objects.create(
+            enrollment=self.enrollment, step=self.step, code='print(0)', total=2)
+        CodeSubmission.objects.filter(pk=stale.pk).update(
+            created_at=timezone.now() - timedelta(hours=1))
+        
+        out = StringIO()
+        call_command('requeue_code_submissions', stdout=out)
+        self.assertIn('Перепроверено заданий: 1', out.getvalue())
+        stale.refresh_from_db()
+        fresh.refresh_from_db()
+        self.assertEqual((stale.status, fresh.status), ('done', 'queued'))
+        self.assertTrue(StepProgress.objects.get(step=self.step).completed)
+        
+        call_command('requeue_code_submissions', '--older-than', '0', '--expire', stdout=out)
+        fresh.refresh_from_db()
+        self.assertEqual(fresh.status, 'error')
+    
+    def test_poll_only_own_submissions(self):
+        """Тест: статус задания доступен только его автору"""
+        data = self.send_code('print(4)')
+        User.objects.create_user(username='other', password='testpass123')
+        self.client.login(username='other', password='testpass123')
+        self.assertEqual(self.client.get(data['poll_url']).status_code, 404)
+    
+    @override_settings(JUDGE_SANDBOX_UID=0, JUDGE_ALLOW_UNSANDBOXED=False)
+    def test_refused_without_sandbox_uid(self):
+        """Тест: без uid песочницы код не запускается от пользователя Django"""
+        response = self.client.post(
+            reverse('api_step_check', kwargs={'step_id': self.step.id}),
+            data=json.dumps({'code': 'print(4)'}), content_type='application/json')
+        self.assertEqual(response.status_code, 503)
+        self.assertIn('error', response.json())
+        
+        quiz = Step.objects.create(lesson=self.step.lesson, step_type='quiz_single',
+                                   content={'correct_index': 0})
+        response = self.client.post(
+            reverse('api_lesson_check', kwargs={'lesson_id': self.step.lesson_id}),
+            data=json.dumps({'answers': {str(self.step.id): {'code': 'print(4)'},
+                                         str(quiz.id): {'selected_index': 0}}}),
+            content_type='application/json')
+        code_result, quiz_result = response.json()['results']
+        self.assertIn('error', code_result)
+        self.assertTrue(quiz_result['is_correct'])
+        self.assertFalse(CodeSubmission.objects.exists())
+        with self.assertRaises(judge.SandboxNotConfigured):
+            judge.submit(self.enrollment, self.step, 'print(4)')
+    
+    def test_code_step_without_tests_uses_grader(self):
+        """Тест: шаг без тестов по-прежнему принимается без запуска"""
+        self.step.content = {'language': 'python'}
+        self.step.save()
+        data = self.send_code('print(1)')
+        self.assertTrue(data['is_correct'])
+        self.assertNotIn('job_id', data)
+
+
+class SandboxTest(TestCase):
+    """Тесты изоляции кода студента (courses/sandbox.py)"""
+    
+    TESTS = [{'input': '', 'expected_output': 'ok'}]
+    
+    def run_code(self, code):
+        return sandbox.run_tests(code, self.TESTS, 2)[0]
+    
+    def test_process_group_killed_after_run(self):
+        """Тест: порождённый процесс не переживает завершение проверки"""
+        with tempfile.TemporaryDirectory() as workdir:
+            marker = os.path.join(workdir, 'escaped')
+            code = (
+                'import os, time\n'
+                'if os.fork() == 0:\n'
+                '    os.close(1); os.close(2)\n'
+                '    time.sleep(1)\n'
+                f'    open({marker!r}, "w").close()\n'
+            )
+            returncode, _, _ = sandbox.execute([sys.executable, '-c', code], b'', workdir, 2)
+            self.assertEqual(returncode, 0)
+            time.sleep(1.5)
+            self.assertFalse(os.path.exists(marker))
+    
+    def test_guard_blocks_escape(self):
+        """Тест: запуск процессов, чтение и запись вне рабочего каталога запрещены"""
+        for code in ('import os\nos.fork()',
+                     'import subprocess',
+                     'import ctypes',
+                     'open("/tmp/escaped", "w")',
+                     f'print(open({str(settings.BASE_DIR / "manage.py")!r}).read())'):
+            result = self.run_code(code)
+            self.assertEqual(result['status'], sandbox.RUNTIME_ERROR, code)
+            self.assertIn('PermissionError', result['error'])
+        
+        result = self.run_code('import json, math\nopen("out.txt", "w").write("x")\nprint("ok")')
+        self.assertEqual(result['status'], sandbox.OK)
@@ -324,3 +324,17 @@ class PromoCodeModelTest(TestCase):
             is_active=True
         )
         self.assertFalse(expired_promo.is_valid())
+
+
+class SQLiteSettingsTest(TestCase):
+    """Тесты профиля SQLite (SQLITE_PRAGMAS, busy_timeout)"""
+    
+    def test_connection_pragmas(self):
+        """Тест: PRAGMA применяются к каждому соединению"""
+        from django.db import connection
+        
+        if connection.vendor != 'sqlite':
+            self.skipTest('Только для SQLite')
+        with connection.cursor() as cursor:
+            self.assertEqual(cursor.execute('PRAGMA synchronous').fetchone()[0], 1)  # NORMAL
+            self.assertGreater(cursor.execute('PRAGMA busy_timeout').fetchone()[0], 0)
@@ -0,0 +1,100 @@
+"""
+CourseMaster - Тесты профилирования SQL
+Тесты SQL-профилирования запросов
+"""
+
+import json
+import tempfile
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.contrib.auth.models import User
+
+from courses.models import (
+    Course
+)
+from courses import profiling
+
+
+@override_settings(SQL_PROFILING_ENABLED=True, SQL_PROFILING_SAMPLE_RATE=1.0)
+class SQLProfilingTest(TestCase):
+    """Тесты для SQLProfilingMiddleware и страницы sql_profile"""
+    
+    def setUp(self):
+        profiling.store.reset()
+        self.staff = User.objects.create_user(username='staff', password='testpass123', is_staff=True)
+        self.student = User.objects.create_user(username='student', password='testpass123')
+        instructor = User.objects.create_user(username='instructor', password='testpass123')
+        for i in range(3):
+            Course.objects.create(title=f'Курс {i}', slug=f'course-{i}', instructor=instructor,
+                                  status='published')
+    
+    def test_fingerprint_collapses_in_lists(self):
+        """Тест: IN (%s, %s, ...) сворачивается в один шаблон"""
+        self.assertEqual(profiling.fingerprint('SELECT  *\nFROM t WHERE id IN (%s, %s, %s)'),
+                         'SELECT * FROM t WHERE id IN (...)')
+        self.assertEqual(profiling.fingerprint('SELECT * FROM t WHERE id IN (%s,%s)'),
+                         'SELECT * FROM t WHERE id IN (...)')
+    
+    def test_records_requests_per_url_name(self):
+        """Тест: статистика агрегируется по имени URL, повторы SQL находятся"""
+        self.client.get(reverse('course_list'))
+        self.client.get(reverse('course_list'))
+        self.client.get(reverse('course_detail', kwargs={'slug': 'course-0'}))
+        
+        stats = profiling.store.by_url
+        self.assertEqual(stats['course_list']['requests'], 2)
+        self.assertEqual(stats['course_detail']['requests'], 1)
+        self.assertGreater(stats['course_list']['queries'], 0)
+        self.assertLessEqual(len(stats['course_list']['slowest']), 5)
+        
+        profiling.store.record('n_plus_one', [('SELECT 1 WHERE id = %s', 0.1)] * 4, 1.0)
+        self.assertEqual(profiling.store.by_url['n_plus_one']['duplicates'],
+                         {'SELECT 1 WHERE id = %s': 3})
+    
+    @override_settings(SQL_PROFILING_SAMPLE_RATE=0.0)
+    def test_sampling(self):
+        """Тест: запросы вне выборки не записываются"""
+        self.client.get(reverse('course_list'))
+        self.assertEqual(profiling.store.by_url, {})
+    
+    @override_settings(SQL_PROFILING_ENABLED=False)
+    def test_disabled(self):
+        """Тест: выключенный middleware ничего не записывает"""
+        self.client.get(reverse('course_list'))
+        self.assertEqual(profiling.store.by_url, {})
+    
+    def test_dump_and_report_merge_processes(self):
+        """Тест: JSON-дамп и объединение статистики процессов в отчёте"""
+        with tempfile.TemporaryDirectory() as dump_dir, \
+                override_settings(SQL_PROFILING_DUMP_DIR=dump_dir, SQL_PROFILING_DUMP_INTERVAL=0):
+            self.client.get(reverse('course_list'))
+            with open(profiling.store.dump_path(), encoding='utf-8') as f:
+                dumped = json.load(f)
+            self.assertEqual(dumped['by_url']['course_list']['requests'], 1)
+            
+            # Дамп другого процесса
+            dumped['pid'] = 0
+            with open(f'{dump_dir}/sql-profile-0.json', 'w', encoding='utf-8') as f:
+                json.dump(dumped, f)
+            report = profiling.load_report()
+        
+        self.assertEqual(report['processes'], 2)
+        row = next(row for row in report['urls'] if row['url_name'] == 'course_list')
+        self.assertEqual(row['requests'], 2)
+    
+    def test_dashboard_staff_only(self):
+        """Тест: отчёт доступен только staff"""
+        self.client.get(reverse('course_list'))
+        
+        self.client.force_login(self.student)
+        response = self.client.get(reverse('sql_profile'))
+        self.assertEqual(response.status_code, 403)
+        
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse('sql_profile'))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'course_list')
+        
+        response = self.client.get(reverse('sql_profile'), {'format': 'json'})
+        self.assertIn('course_list', [row['url_name'] for row in response.json()['urls']])
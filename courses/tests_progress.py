@@ -0,0 +1,180 @@
+"""
+CourseMaster - Тесты прогресса
+Тесты счётчиков прогресса студента
+"""
+
+import json
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from decimal import Decimal
+
+from courses.models import (
+    Course, Section, Lesson, Enrollment, LessonProgress, Step, StepProgress
+)
+
+
+class ProgressCountersTest(TestCase):
+    """Тесты инкрементальных счётчиков прогресса (courses/progress.py)"""
+    
+    def setUp(self):
+        cache.clear()
+        instructor = User.objects.create_user(username='instructor', password='testpass123')
+        self.student = User.objects.create_user(username='student', password='testpass123')
+        self.course = Course.objects.create(
+            title='Progress Course',
+            slug='progress-course',
+            instructor=instructor,
+            status='published'
+        )
+        section = Section.objects.create(course=self.course, title='Раздел', order=1)
+        self.lesson1 = Lesson.objects.create(section=section, title='Урок 1', order=1)
+        self.lesson2 = Lesson.objects.create(section=section, title='Урок 2', order=2)
+        self.text_step = Step.objects.create(
+            lesson=self.lesson1, step_type='text', order=0, points=0)
+        self.quiz_step = Step.objects.create(
+            lesson=self.lesson1, step_type='quiz_single', order=1, points=5,
+            content={'question': '2+2?', 'choices': ['3', '4'], 'correct_index': 1})
+        self.enrollment = Enrollment.objects.create(student=self.student, course=self.course)
+        self.client.login(username='student', password='testpass123')
+    
+    def complete_step(self, step):
+        return self.client.post(reverse('api_step_complete', kwargs={'step_id': step.id}))
+    
+    def check_answer(self, step, selected_index):
+        return self.client.post(
+            reverse('api_step_check', kwargs={'step_id': step.id}),
+            data=json.dumps({'selected_index': selected_index}),
+            content_type='application/json'
+        )
+    
+    def test_step_complete_counts_once(self):
+        """Тест: повторная отметка шага не увеличивает счётчики"""
+        data = self.complete_step(self.text_step).json()
+        self.assertEqual(data['steps_completed'], 1)
+        self.assertEqual(data['steps_total'], 2)
+        self.assertFalse(data['lesson_completed'])
+        
+        data = self.complete_step(self.text_step).json()
+        self.assertEqual(data['steps_completed'], 1)
+        self.enrollment.refresh_from_db()
+        self.assertEqual(self.enrollment.completed_steps_count, 1)
+    
+    def test_correct_answer_adds_points(self):
+        """Тест: баллы начисляются только за первый верный ответ"""
+        self.check_answer(self.quiz_step, 0)
+        self.check_answer(self.quiz_step, 1)
+        self.check_answer(self.quiz_step, 1)
+        
+        self.enrollment.refresh_from_db()
+        self.assertEqual(self.enrollment.completed_steps_count, 1)
+        self.assertEqual(self.enrollment.earned_points, 5)
+        progress = StepProgress.objects.get(enrollment=self.enrollment, step=self.quiz_step)
+        self.assertEqual(progress.attempts, 3)
+        self.assertEqual(progress.status, 'completed')
+        lesson_progress = LessonProgress.objects.get(enrollment=self.enrollment, lesson=self.lesson1)
+        self.assertEqual(lesson_progress.completed_steps, 1)
+    
+    def test_lesson_complete_updates_percentage(self):
+        """Тест: завершение урока обновляет процент без пересчёта курса"""
+        url = reverse('lesson_complete', kwargs={'lesson_id': self.lesson1.id})
+        self.client.post(url)
+        self.client.post(url)
+        
+        self.enrollment.refresh_from_db()
+        self.assertEqual(self.enrollment.completed_lessons_count, 1)
+        self.assertEqual(self.enrollment.progress_percentage, Decimal('50.00'))
+        
+        self.client.post(reverse('lesson_complete', kwargs={'lesson_id': self.lesson2.id}))
+        self.enrollment.refresh_from_db()
+        self.assertEqual(self.enrollment.progress_percentage, Decimal('100.00'))
+        self.assertTrue(self.enrollment.completed)
+    
+    def test_lesson_check_grades_steps_in_bulk(self):
+        """Тест пакетной проверки ответов на шаги урока"""
+        extra = Step.objects.create(
+            lesson=self.lesson1, step_type='numeric', order=2, points=3,
+            content={'answer': 42, 'tolerance': 0})
+        url = reverse('api_lesson_check', kwargs={'lesson_id': self.lesson1.id})
+        payload = {'answers': {
+            str(self.quiz_step.id): {'selected_index': 1},
+            str(extra.id): {'value': 41},
+            str(self.text_step.id): {},
+        }}
+        
+        data = self.client.post(url, data=json.dumps(payload),
+                                content_type='application/json').json()
+        results = {result['step_id']: result for result in data['results']}
+        self.assertTrue(results[self.quiz_step.id]['is_correct'])
+        self.assertFalse(results[extra.id]['is_correct'])
+        self.assertIn('error', results[self.text_step.id])
+        self.assertEqual(data['steps_completed'], 1)
+        
+        payload['answers'][str(extra.id)] = {'value': 42}
+        with CaptureQueriesContext(connection) as queries:
+            data = self.client.post(url, data=json.dumps(payload),
+                                    content_type='application/json').json()
+        self.assertLessEqual(len(queries), 16)
+        self.assertEqual(data['steps_completed'], 2)
+        
+        self.enrollment.refresh_from_db()
+        self.assertEqual(self.enrollment.completed_steps_count, 2)
+        self.assertEqual(self.enrollment.earned_points, 8)
+        progress = StepProgress.objects.get(enrollment=self.enrollment, step=self.quiz_step)
+        self.assertEqual(progress.attempts, 2)
+        self.assertEqual(progress.score, 5)
+    
+    def test_lesson_check_rejects_invalid_payload(self):
+        """Тест валидации тела запроса пакетной проверки"""
+        url = reverse('api_lesson_check', kwargs={'lesson_id': self.lesson1.id})
+        response = self.client.post(url, data=json.dumps({'answers': []}),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+    
+    def test_lesson_check_reports_malformed_answers_per_step(self):
+        """Тест: ответ неверного формата - ошибка только своего шага"""
+        text = Step.objects.create(
+            lesson=self.lesson1, step_type='text_answer', order=2, content={'patterns': ['a']})
+        matching = Step.objects.create(
+            lesson=self.lesson1, step_type='quiz_matching', order=3, content={'pairs': [[0, 0]]})
+        url = reverse('api_lesson_check', kwargs={'lesson_id': self.lesson1.id})
+        payload = {'answers': {
+            str(self.quiz_step.id): {'selected_index': 1},
+            str(text.id): {'answer': 5, 'text': 5},
+            str(matching.id): {'pairs': None},
+        }}
+        
+        response = self.client.post(url, data=json.dumps(payload), content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        results = {result['step_id']: result for result in response.json()['results']}
+        self.assertTrue(results[self.quiz_step.id]['is_correct'])
+        self.assertIn('error', results[text.id])
+        self.assertIn('error', results[matching.id])
+        self.assertEqual(StepProgress.objects.get(step=text).attempts, 0)
+    
+    def test_recompute_progress_command(self):
+        """Тест восстановления счётчиков командой recompute_progress"""
+        self.complete_step(self.text_step)
+        self.check_answer(self.quiz_step, 1)
+        self.client.post(reverse('lesson_complete', kwargs={'lesson_id': self.lesson1.id}))
+        
+        Enrollment.objects.filter(pk=self.enrollment.pk).update(
+            completed_steps_count=10, completed_lessons_count=0,
+            earned_points=0, progress_percentage=0)
+        LessonProgress.objects.update(completed_steps=0)
+        
+        call_command('recompute_progress', stdout=StringIO())
+        
+        self.enrollment.refresh_from_db()
+        self.assertEqual(self.enrollment.completed_steps_count, 2)
+        self.assertEqual(self.enrollment.completed_lessons_count, 1)
+        self.assertEqual(self.enrollment.earned_points, 5)
+        self.assertEqual(self.enrollment.progress_percentage, Decimal('50.00'))
+        lesson_progress = LessonProgress.objects.get(enrollment=self.enrollment, lesson=self.lesson1)
+        self.assertEqual(lesson_progress.completed_steps, 2)
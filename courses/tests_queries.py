@@ -0,0 +1,346 @@
+"""
+CourseMaster - Бюджеты SQL-запросов
+Каждый URL из courses/urls.py выполняется на двух объёмах данных:
+число запросов не должно зависеть от объёма (N+1) и превышать бюджет.
+"""
+
+import json
+import shutil
+import tempfile
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from courses import urls
+from courses.models import (
+    Category, Certificate, CodeSubmission, Course, CourseMedia, Enrollment, Lesson,
+    LessonComment, LessonProgress, Purchase, Review, Section, Step, StepProgress
+)
+from courses.testing import QueryBudgetMixin, query_budget
+
+MEDIA_ROOT = tempfile.mkdtemp(prefix='coursemaster-tests-')
+
+
+class Dataset:
+    """Курс с уроками, студентами, отзывами, покупками и медиа"""
+
+    def __init__(self):
+        self.counter = 0
+        self.instructor = User.objects.create_user(username='instructor', password='testpass123')
+        self.student = User.objects.create_user(username='student', password='testpass123')
+        self.staff = User.objects.create_user(username='staff', password='testpass123', is_staff=True)
+        self.category = Category.objects.create(name='Программирование', slug='programming')
+
+        self.course = self.new_course(enroll=True)
+        self.section = Section.objects.create(course=self.course, title='Раздел', order=0)
+        self.lesson = Lesson.objects.create(section=self.section, title='Урок', order=0)
+        self.text_step = self.new_step('text', content={'markdown': '# Теория'})
+        self.quiz_step = self.new_step('quiz_single', content={
+            'question': '2+2?', 'choices': ['3', '4'], 'correct_index': 1})
+        self.code_step = self.new_step('code', content={'language': 'python'})
+        self.enrollment = Enrollment.objects.get(student=self.student, course=self.course)
+        self.submission = CodeSubmission.objects.create(
+            enrollment=self.enrollment, step=self.code_step, code='print(1)', total=1)
+
+        self.comment = LessonComment.objects.create(lesson=self.lesson, author=self.student, content='Вопрос')
+        self.grow(size=1)
+        self.reviewed_course = self.new_course(enroll=True)
+        self.review = Review.objects.create(
+            course=self.reviewed_course, student=self.student, rating=5, comment='Отлично')
+
+        self.checkout_course = self.new_course()
+        self.pending = self.new_purchase('pending')
+        self.completed = self.new_purchase('completed')
+        self.failed = self.new_purchase('failed')
+        self.certificate = Certificate.objects.create(enrollment=self.enrollment)
+        self.media = self.new_media()
+
+    def next(self):
+        self.counter += 1
+        return self.counter
+
+    def new_course(self, enroll=False, **fields):
+        n = self.next()
+        course = Course.objects.create(
+            title=f'Курс {n}', slug=f'course-{n}', instructor=self.instructor,
+            category=self.category, status='published', price=Decimal('990'), **fields)
+        if enroll:
+            Enrollment.objects.create(student=self.student, course=course)
+        return course
+
+    def new_section(self, lessons=0):
+        n = self.next()
+        section = Section.objects.create(course=self.course, title=f'Раздел {n}', order=n)
+        for i in range(lessons):
+            lesson = Lesson.objects.create(section=section, title=f'Урок {n}.{i}', order=i)
+            Step.objects.create(lesson=lesson, step_type='text', content={'markdown': 'Текст'})
+        return section
+
+    def new_lesson(self):
+        n = self.next()
+        return Lesson.objects.create(section=self.section, title=f'Урок {n}', order=n)
+
+    def new_step(self, step_type='text', content=None):
+        return Step.objects.create(
+            lesson=self.lesson, step_type=step_type, order=self.next(),
+            content=content or {'markdown': 'Текст'})
+
+    def new_purchase(self, status, course=None):
+        return Purchase.objects.create(
+            student=self.student, course=course or self.new_course(), status=status,
+            price=Decimal('990'), total_amount=Decimal('990'), transaction_id=f'tx-{self.next()}')
+
+    def new_media(self):
+        n = self.next()
+        return CourseMedia.objects.create(
+            course=self.course, uploaded_by=self.instructor, original_filename=f'file{n}.txt',
+            file=SimpleUploadedFile(f'file{n}.txt', b'content'))
+
+    def new_review_target(self):
+        """Курс, на который записан студент, со свежим отзывом"""
+        course = self.new_course(enroll=True)
+        Review.objects.create(course=course, student=self.student, rating=4, comment='Хорошо')
+        return course
+
+    def grow(self, size=3):
+        """Добавить по size записей во все коллекции, по которым ходят view"""
+        for _ in range(size):
+            n = self.next()
+            other = User.objects.create_user(username=f'other{n}', password='testpass123')
+            enrollment = Enrollment.objects.create(student=other, course=self.course)
+            Review.objects.create(course=self.course, student=other, rating=n % 5 + 1, comment='Отзыв')
+            StepProgress.objects.create(enrollment=enrollment, step=self.text_step, completed=True)
+            reply_to = LessonComment.objects.create(lesson=self.lesson, author=other, content='Комментарий')
+            LessonComment.objects.create(lesson=self.lesson, author=self.student, content='Ответ',
+                                         reply_to=reply_to)
+
+            self.new_section(lessons=2)
+            self.new_step('text')
+            self.new_step('quiz_single', content={'question': '?', 'choices': ['a', 'b'], 'correct_index': 0})
+
+            course = self.new_course(enroll=True)
+            LessonProgress.objects.create(
+                enrollment=Enrollment.objects.get(student=self.student, course=course),
+                lesson=Lesson.objects.create(
+                    section=Section.objects.create(course=course, title='Раздел'), title='Урок'),
+                completed=True)
+            Certificate.objects.create(enrollment=Enrollment.objects.get(student=self.student, course=course))
+            Review.objects.create(course=course, student=other, rating=5, comment='Отзыв')
+            self.new_purchase('completed', course=course)
+            self.new_media()
+            Category.objects.create(name=f'Категория {n}', slug=f'category-{n}')
+            CodeSubmission.objects.create(enrollment=self.enrollment, step=self.code_step, code='', total=1)
+
+
+def get(url, user='student', budget=None):
+    return {'method': 'get', 'url': url, 'user': user, 'budget': budget}
+
+
+def post(url, user='student', data=None, budget=None, as_json=True):
+    return {'method': 'post', 'url': url, 'user': user, 'data': data,
+            'as_json': as_json, 'budget': budget}
+
+
+# Имя URL -> запрос. url/data - функции от Dataset; объекты, которые
+# запрос удаляет или меняет необратимо, создаются заново на каждый вызов
+QUERY_BUDGETS = {
+    # Студент
+    'course_list': get(lambda d: reverse('course_list'), budget=6),
+    'my_courses': get(lambda d: reverse('my_courses'), budget=6),
+    'lesson_view': get(lambda d: reverse('lesson_view', args=[d.lesson.id]), budget=14),
+    'lesson_complete': post(lambda d: reverse('lesson_complete', args=[d.new_lesson().id]),
+                            as_json=False, budget=17),
+    'course_detail': get(lambda d: reverse('course_detail', args=[d.course.slug]), budget=14),
+    'course_enroll': post(lambda d: reverse('course_enroll', args=[d.new_course().slug]),
+                          as_json=False, budget=8),
+
+    # Комментарии
+    'lesson_comment_create': post(lambda d: reverse('lesson_comment_create', args=[d.lesson.id]),
+                                  data=lambda d: {'content': 'Новый комментарий'}, as_json=False, budget=8),
+    'lesson_comment_update': get(lambda d: reverse('lesson_comment_update', args=[d.comment.id]), budget=8),
+    'lesson_comment_delete': post(
+        lambda d: reverse('lesson_comment_delete', args=[
+            LessonComment.objects.create(lesson=d.lesson, author=d.student, content='x').id]),
+        as_json=False, budget=12),
+    'lesson_comment_pin': post(lambda d: reverse('lesson_comment_pin', args=[d.comment.id]),
+                               user='instructor', as_json=False, budget=10),
+
+    # Сертификаты
+    'my_certificates': get(lambda d: reverse('my_certificates'), budget=3),
+    'certificate_detail': get(
+        lambda d: reverse('certificate_detail', args=[d.certificate.certificate_number]), budget=3),
+    'certificate_print': get(
+        lambda d: reverse('certificate_print', args=[d.certificate.certificate_number]), budget=7),
+    'certificate_verify': get(lambda d: reverse('certificate_verify'), user=None, budget=0),
+    'certificate_verify_number': get(
+        lambda d: reverse('certificate_verify_number', args=[d.certificate.certificate_number]),
+        user=None, budget=1),
+
+    # Платежи
+    'course_checkout': get(lambda d: reverse('course_checkout', args=[d.checkout_course.slug]), budget=7),
+    'stripe_payment': get(lambda d: reverse('stripe_payment', args=[d.pending.id]), budget=4),
+    'paypal_payment': get(lambda d: reverse('paypal_payment', args=[d.pending.id]), budget=4),
+    'yookassa_payment': get(lambda d: reverse('yookassa_payment', args=[d.pending.id]), budget=4),
+    'payment_success': get(lambda d: reverse('payment_success', args=[d.completed.id]), budget=4),
+    'payment_failed': get(lambda d: reverse('payment_failed', args=[d.failed.id]), budget=4),
+    'purchase_history': get(lambda d: reverse('purchase_history'), budget=6),
+    'refund_request': get(lambda d: reverse('refund_request', args=[d.completed.id]), budget=5),
+
+    # Конструктор курса (AJAX)
+    'api_course_update': post(lambda d: reverse('api_course_update', args=[d.course.id]),
+                              user='instructor', data=lambda d: {'title': 'Новое название'}, budget=7),
+    'api_course_publish': post(lambda d: reverse('api_course_publish', args=[d.course.id]),
+                               user='instructor', budget=9),
+    'api_course_unpublish': post(lambda d: reverse('api_course_unpublish', args=[d.course.id]),
+                                 user='instructor', budget=7),
+    'api_section_create': post(lambda d: reverse('api_section_create', args=[d.course.id]),
+                               user='instructor', data=lambda d: {'title': 'Раздел'}, budget=7),
+    'api_section_update': post(lambda d: reverse('api_section_update', args=[d.section.id]),
+                               user='instructor', data=lambda d: {'title': 'Раздел'}, budget=7),
+    'api_section_delete': post(lambda d: reverse('api_section_delete', args=[d.new_section(lessons=2).id]),
+                               user='instructor', budget=21),
+    'api_lesson_create': post(lambda d: reverse('api_lesson_create', args=[d.section.id]),
+                              user='instructor', data=lambda d: {'title': 'Урок'}, budget=8),
+    'api_lesson_get': get(lambda d: reverse('api_lesson_get', args=[d.lesson.id]), user='instructor', budget=7),
+    'api_lesson_update': post(lambda d: reverse('api_lesson_update', args=[d.lesson.id]),
+                              user='instructor', data=lambda d: {'title': 'Урок'}, budget=8),
+    'api_lesson_delete': post(lambda d: reverse('api_lesson_delete', args=[d.new_lesson().id]),
+                              user='instructor', budget=13),
+    'api_step_list': get(lambda d: reverse('api_step_list', args=[d.lesson.id]), user='instructor', budget=7),
+    'api_step_create': post(lambda d: reverse('api_step_create', args=[d.lesson.id]),
+                            user='instructor', data=lambda d: {'step_type': 'text'}, budget=9),
+    'api_step_reorder': post(
+        lambda d: reverse('api_step_reorder', args=[d.lesson.id]), user='instructor',
+        data=lambda d: {'step_ids': list(d.lesson.steps.order_by('-order').values_list('id', flat=True))},
+        budget=8),
+    'api_step_get': get(lambda d: reverse('api_step_get', args=[d.text_step.id]), user='instructor', budget=7),
+    'api_step_update': post(lambda d: reverse('api_step_update', args=[d.text_step.id]), user='instructor',
+                            data=lambda d: {'content': {'markdown': '# Новый текст'}}, budget=9),
+    'api_step_delete': post(lambda d: reverse('api_step_delete', args=[d.new_step().id]),
+                            user='instructor', budget=11),
+    'api_step_duplicate': post(lambda d: reverse('api_step_duplicate', args=[d.quiz_step.id]),
+                               user='instructor', budget=10),
+
+    # Прохождение шагов (AJAX)
+    'api_step_check': post(lambda d: reverse('api_step_check', args=[d.quiz_step.id]),
+                           data=lambda d: {'selected_index': 1}, budget=10),
+    'api_step_complete': post(lambda d: reverse('api_step_complete', args=[d.new_step().id]), budget=18),
+    'api_lesson_bootstrap': get(lambda d: reverse('api_lesson_bootstrap', args=[d.lesson.id]), budget=10),
+    'api_lesson_check': post(
+        lambda d: reverse('api_lesson_check', args=[d.lesson.id]),
+        data=lambda d: {'answers': {
+            str(step_id): {'selected_index': 1}
+            for step_id in d.lesson.steps.filter(step_type='quiz_single').values_list('id', flat=True)
+        }}, budget=14),
+    'api_code_submission': get(lambda d: reverse('api_code_submission', args=[d.submission.pk]), budget=4),
+
+    # Преподаватель
+    'instructor_courses': get(lambda d: reverse('instructor_courses'), user='instructor', budget=5),
+    'course_create': get(lambda d: reverse('course_create'), user='instructor', budget=3),
+    'instructor_course_detail': get(
+        lambda d: reverse('instructor_course_detail', args=[d.course.slug]), user='instructor', budget=4),
+    'course_builder': get(lambda d: reverse('course_builder', args=[d.course.slug]), user='instructor', budget=10),
+    'course_update': get(lambda d: reverse('course_update', args=[d.course.slug]), user='instructor', budget=6),
+    'course_delete': post(lambda d: reverse('course_delete', args=[d.new_course(enroll=True).slug]),
+                          user='instructor', as_json=False, budget=19),
+    'course_publish': post(lambda d: reverse('course_publish', args=[d.course.slug]),
+                           user='instructor', as_json=False, budget=10),
+    'course_unpublish': post(lambda d: reverse('course_unpublish', args=[d.course.slug]),
+                             user='instructor', as_json=False, budget=8),
+
+    # Медиа-библиотека
+    'media_library': get(lambda d: reverse('media_library', args=[d.course.slug]), user='instructor', budget=12),
+    'media_upload': get(lambda d: reverse('media_upload', args=[d.course.slug]), user='instructor', budget=5),
+    'media_upload_ajax': post(
+        lambda d: reverse('media_upload_ajax', args=[d.course.slug]), user='instructor', as_json=False,
+        data=lambda d: {'file': SimpleUploadedFile('notes.txt', b'notes')}, budget=5),
+    'media_delete': post(lambda d: reverse('media_delete', args=[d.new_media().id]),
+                         user='instructor', as_json=False, budget=8),
+    'media_delete_ajax': post(lambda d: reverse('media_delete_ajax', args=[d.new_media().id]),
+                              user='instructor', budget=6),
+    'media_get_url': get(lambda d: reverse('media_get_url', args=[d.media.id]), user='instructor', budget=5),
+
+    # Профилирование SQL
+    'sql_profile': get(lambda d: reverse('sql_profile'), user='staff', budget=2),
+
+    # Отзывы
+    'course_reviews': get(lambda d: reverse('course_reviews', args=[d.course.slug]), user=None, budget=4),
+    'review_create': get(lambda d: reverse('review_create', args=[d.course.slug]), budget=6),
+    'review_update': get(lambda d: reverse('review_update', args=[d.reviewed_course.slug]), budget=6),
+    'review_delete': post(lambda d: reverse('review_delete', args=[d.new_review_target().slug]),
+                          as_json=False, budget=6),
+}
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, JUDGE_WORKERS=0,
+                   PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class QueryBudgetTest(QueryBudgetMixin, TestCase):
+    """Число запросов каждого view ограничено и не зависит от объёма данных"""
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.data = Dataset()
+
+    def prepare(self, case):
+        """URL и тело запроса; создание объектов - вне замера"""
+        url = case['url'](self.data)
+        data = case['data'](self.data) if case.get('data') else {}
+        cache.clear()
+        return url, data
+
+    def request(self, case, prepared):
+        url, data = prepared
+        if case['method'] == 'get':
+            response = self.client.get(url)
+        elif case['as_json']:
+            response = self.client.post(url, data=json.dumps(data), content_type='application/json')
+        else:
+            response = self.client.post(url, data=data)
+        self.assertLess(response.status_code, 400, f'{case["method"].upper()} {url}')
+        return response
+
+    def check_budget(self, name):
+        case = QUERY_BUDGETS[name]
+        if case['user']:
+            self.client.force_login(getattr(self.data, case['user']))
+        # Прогрев: первый запрос создаёт прогресс, сессию и т.п.
+        self.request(case, self.prepare(case))
+        self.assertConstantQueries(
+            lambda prepared: self.request(case, prepared),
+            grow=self.data.grow, budget=case['budget'], msg=name,
+            setup=lambda: self.prepare(case),
+        )
+
+    def test_every_url_has_budget(self):
+        """Тест: для каждого URL приложения задан бюджет запросов"""
+        names = {pattern.name for pattern in urls.urlpatterns}
+        self.assertEqual(names - set(QUERY_BUDGETS), set())
+
+    def test_query_budget_context_manager(self):
+        """Тест: query_budget сообщает о превышении бюджета"""
+        with query_budget(1):
+            Course.objects.count()
+        with self.assertRaises(AssertionError):
+            with query_budget(1):
+                Course.objects.count()
+                Course.objects.count()
+
+
+def make_budget_test(name):
+    def test(self):
+        self.check_budget(name)
+    test.__doc__ = f'Тест бюджета запросов: {name}'
+    return test
+
+
+for _name in QUERY_BUDGETS:
+    setattr(QueryBudgetTest, f'test_{_name}', make_budget_test(_name))
@@ -0,0 +1,83 @@
+"""
+CourseMaster - Тесты Markdown
+Тесты рендеринга и кеша Markdown
+"""
+
+import threading
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+
+from courses.models import (
+    Course, Section, Lesson, Step
+)
+from courses import rendering
+from courses.templatetags.markdown_extras import markdown_format
+
+
+class MarkdownRenderingTest(TestCase):
+    """Тесты кеша HTML для Markdown (courses/rendering.py)"""
+    
+    TEXT = '# Заголовок\n\n```python\nprint("hi")\n```'
+    
+    def setUp(self):
+        cache.clear()
+        rendering.local_cache.clear()
+    
+    def test_filter_renders_once_per_text(self):
+        """Тест: повторный рендер того же текста берётся из кеша"""
+        expected = rendering.convert_markdown(self.TEXT)
+        with mock.patch('courses.rendering.convert_markdown',
+                        wraps=rendering.convert_markdown) as convert:
+            self.assertEqual(markdown_format(self.TEXT), expected)
+            self.assertEqual(markdown_format(self.TEXT), expected)
+            markdown_format(self.TEXT + '\n\nНовый абзац')
+        self.assertEqual(convert.call_count, 2)
+    
+    def test_lru_eviction(self):
+        """Тест вытеснения самых старых записей"""
+        lru = rendering.LRUCache(maxsize=2)
+        lru.set('a', 1)
+        lru.set('b', 2)
+        lru.get('a')
+        lru.set('c', 3)
+        self.assertIsNone(lru.get('b'))
+        self.assertEqual(lru.get('a'), 1)
+        self.assertEqual(len(lru), 2)
+    
+    def test_engine_reused_per_thread(self):
+        """Тест: движок создаётся один раз на поток и сбрасывается между документами"""
+        engine = rendering.get_engine()
+        first = rendering.convert_markdown('[TOC]\n# Первый')
+        second = rendering.convert_markdown('[TOC]\n# Второй')
+        self.assertIs(rendering.get_engine(), engine)
+        self.assertNotIn('Первый', second)
+        self.assertEqual(first, rendering.build_engine().convert('[TOC]\n# Первый'))
+        
+        engines = []
+        thread = threading.Thread(target=lambda: engines.append(rendering.get_engine()))
+        thread.start()
+        thread.join()
+        self.assertIsNot(engines[0], engine)
+    
+    def test_benchmark_markdown_command(self):
+        """Тест микро-бенчмарка на корпусе populate_content"""
+        out = StringIO()
+        call_command('benchmark_markdown', rounds=1, stdout=out)
+        self.assertIn('Ускорение Markdown', out.getvalue())
+    
+    @override_settings(MARKDOWN_CACHE_ALIAS='default')
+    def test_step_save_warms_shared_cache(self):
+        """Тест прогрева общего кеша при сохранении текстового шага"""
+        instructor = User.objects.create_user(username='instructor', password='testpass123')
+        course = Course.objects.create(title='Markdown', slug='markdown', instructor=instructor)
+        section = Section.objects.create(course=course, title='Раздел')
+        lesson = Lesson.objects.create(section=section, title='Урок')
+        Step.objects.create(lesson=lesson, step_type='text', content={'markdown': self.TEXT})
+        
+        key = rendering.content_key('markdown', self.TEXT)
+        self.assertEqual(cache.get(key), rendering.convert_markdown(self.TEXT))
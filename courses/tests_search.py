@@ -0,0 +1,119 @@
+"""
+CourseMaster - Тесты поиска
+Тесты полнотекстового поиска по каталогу
+"""
+
+import importlib
+from types import SimpleNamespace
+
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.contrib.auth.models import User
+
+from courses.models import (
+    Course, Category
+)
+
+
+class CourseSearchTest(TestCase):
+    """Тесты полнотекстового поиска по каталогу (courses/search.py)"""
+    
+    def setUp(self):
+        self.instructor = User.objects.create_user(
+            username='instructor',
+            password='testpass123'
+        )
+        self.python_course = Course.objects.create(
+            title='Программирование на Python',
+            subtitle='Основы языка',
+            description='Переменные, циклы и функции',
+            instructor=self.instructor,
+            status='published'
+        )
+        self.web_course = Course.objects.create(
+            title='Web frameworks',
+            description='Building applications with Django',
+            learning_outcomes='Шаблоны и формы',
+            instructor=self.instructor,
+            status='published'
+        )
+    
+    def search(self, query):
+        response = self.client.get(reverse('course_list'), {'q': query})
+        return list(response.context['courses'])
+    
+    def test_russian_stemming(self):
+        """Тест поиска по другой словоформе русского слова"""
+        self.assertEqual(self.search('программированию'), [self.python_course])
+        self.assertEqual(self.search('циклов'), [self.python_course])
+    
+    def test_english_stemming_and_prefix(self):
+        """Тест английского стемминга и префиксного поиска"""
+        self.assertEqual(self.search('framework'), [self.web_course])
+        self.assertEqual(self.search('djan'), [self.web_course])
+    
+    def test_learning_outcomes_indexed(self):
+        """Тест поиска по полю learning_outcomes"""
+        self.assertEqual(self.search('шаблон'), [self.web_course])
+    
+    def test_title_ranked_above_description(self):
+        """Тест ранжирования: совпадение в названии выше, чем в описании"""
+        description_match = Course.objects.create(
+            title='Data science',
+            description='Немного про Python',
+            instructor=self.instructor,
+            status='published'
+        )
+        self.assertEqual(self.search('python'), [self.python_course, description_match])
+    
+    def test_index_updated_on_save_and_delete(self):
+        """Тест синхронизации индекса при сохранении и удалении курса"""
+        self.web_course.title = 'Асинхронный JavaScript'
+        self.web_course.save()
+        self.assertEqual(self.search('javascript'), [self.web_course])
+        
+        self.web_course.delete()
+        self.assertEqual(self.search('javascript'), [])
+    
+    def test_unpublished_courses_excluded(self):
+        """Тест: черновики не попадают в результаты поиска"""
+        self.python_course.status = 'draft'
+        self.python_course.save()
+        self.assertEqual(self.search('python'), [])
+    
+    @override_settings(COURSE_SEARCH_MAX_RESULTS=2)
+    def test_limit_applied_after_catalog_filters(self):
+        """Тест: более релевантные черновики и курсы других категорий не вытесняют результат"""
+        category = Category.objects.create(name='Data', slug='data')
+        for i in range(3):
+            Course.objects.create(title=f'Python Python {i}', instructor=self.instructor,
+                                  status='draft')
+            Course.objects.create(title=f'Python Python web {i}', instructor=self.instructor,
+                                  status='published')
+        data_course = Course.objects.create(
+            title='Анализ данных', description='Немного про python',
+            instructor=self.instructor, status='published', category=category)
+        
+        results = self.search('python')
+        self.assertEqual(len(results), 2)
+        self.assertTrue(all(course.status == 'published' for course in results))
+        response = self.client.get(reverse('course_list'), {'q': 'python', 'category': 'data'})
+        self.assertEqual(list(response.context['courses']), [data_course])
+    
+    def test_migration_backfill_matches_word_forms(self):
+        """Тест: индекс, заполненный миграцией (SQL без стемминга), находит словоформы"""
+        migration = importlib.import_module('courses.migrations.0012_course_search_index')
+        
+        def execute(sql, params=None):
+            with connection.cursor() as cursor:
+                cursor.execute(sql, params)
+        
+        schema_editor = SimpleNamespace(connection=connection, execute=execute)
+        migration.drop_search_index(None, schema_editor)
+        migration.create_search_index(None, schema_editor)
+        
+        self.assertEqual(self.search('программированию'), [self.python_course])
+        self.assertEqual(self.search('циклов'), [self.python_course])
+        self.assertEqual(self.search('frameworks'), [self.web_course])
+        self.assertEqual(self.search('шаблон'), [self.web_course])
@@ -0,0 +1,108 @@
+"""
+CourseMaster - Тесты статистики курсов
+Тесты счётчиков записей и рейтинга курса
+"""
+
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from django.contrib.auth.models import User
+from decimal import Decimal
+
+from courses.models import (
+    Course, Enrollment, Review
+)
+
+
+class CourseStatsTest(TestCase):
+    """Тесты статистики курса (courses/stats.py)"""
+    
+    def setUp(self):
+        self.instructor = User.objects.create_user(username='instructor', password='testpass123')
+        self.students = [
+            User.objects.create_user(username=f'student{i}', password='testpass123')
+            for i in range(3)
+        ]
+        self.course = Course.objects.create(
+            title='Stats Course',
+            slug='stats-course',
+            instructor=self.instructor,
+            status='published'
+        )
+    
+    def test_students_count_follows_enrollments(self):
+        """Тест: любая запись на курс (не только через CourseEnrollView) учитывается"""
+        enrollments = [
+            Enrollment.objects.create(student=student, course=self.course)
+            for student in self.students
+        ]
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.students_count, 3)
+        
+        enrollments[0].delete()
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.students_count, 2)
+    
+    def test_rating_follows_review_views(self):
+        """Тест пересчёта рейтинга при создании, изменении и удалении отзыва"""
+        Enrollment.objects.create(student=self.students[0], course=self.course)
+        Review.objects.create(course=self.course, student=self.students[1], rating=2, comment='-')
+        self.client.login(username='student0', password='testpass123')
+        
+        self.client.post(reverse('review_create', kwargs={'slug': 'stats-course'}),
+                         {'rating': 5, 'title': '', 'comment': 'Отлично'})
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.total_reviews, 2)
+        self.assertEqual(self.course.average_rating, Decimal('3.50'))
+        
+        self.client.post(reverse('review_update', kwargs={'slug': 'stats-course'}),
+                         {'rating': 4, 'title': '', 'comment': 'Хорошо'})
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.average_rating, Decimal('3.00'))
+        
+        self.client.post(reverse('review_delete', kwargs={'slug': 'stats-course'}))
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.total_reviews, 1)
+        self.assertEqual(self.course.average_rating, Decimal('2.00'))
+    
+    def test_unapproved_reviews_not_counted(self):
+        """Тест: отзывы на модерации не влияют на рейтинг"""
+        review = Review.objects.create(
+            course=self.course, student=self.students[0], rating=1, comment='-')
+        review.is_approved = False
+        review.save(update_fields=['is_approved'])
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.total_reviews, 0)
+        self.assertEqual(self.course.average_rating, Decimal('0'))
+    
+    def test_course_edit_keeps_concurrent_counters(self):
+        """Тест: сохранение курса, загруженного до записи и отзыва, не затирает счётчики"""
+        stale = Course.objects.get(pk=self.course.pk)
+        Enrollment.objects.create(student=self.students[0], course=self.course)
+        Review.objects.create(course=self.course, student=self.students[0], rating=5, comment='-')
+        
+        stale.title = 'Renamed'
+        stale.status = 'draft'
+        stale.save()
+        
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.title, 'Renamed')
+        self.assertEqual(self.course.students_count, 1)
+        self.assertEqual(self.course.total_reviews, 1)
+        self.assertEqual(self.course.average_rating, Decimal('5.00'))
+    
+    def test_recompute_course_stats_command(self):
+        """Тест сверки статистики командой recompute_course_stats"""
+        Enrollment.objects.create(student=self.students[0], course=self.course)
+        Review.objects.create(course=self.course, student=self.students[0], rating=4, comment='-')
+        Course.objects.filter(pk=self.course.pk).update(
+            students_count=100, average_rating=1, total_reviews=7)
+        
+        call_command('recompute_course_stats', stdout=StringIO())
+        
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.students_count, 1)
+        self.assertEqual(self.course.total_reviews, 1)
+        self.assertEqual(self.course.average_rating, Decimal('4.00'))
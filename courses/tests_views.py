@@ -3,20 +3,29 @@ CourseMaster - Тесты Views
 Тесты для views приложения courses
 """
 
-from django.test import TestCase, Client
+import json
+
+from django.db import connection
+from django.test import TestCase, Client, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.contrib.auth.models import User
+from django.core.cache import cache
 from decimal import Decimal
 
 from courses.models import (
-    Category, Course, Section, Lesson, Enrollment, Review
+    Category, Course, Section, Lesson, Enrollment, LessonProgress, Review, Step,
+    StepProgress
 )
+from courses import catalog
+from courses.outline import get_course_outline
 
 
 class CourseListViewTest(TestCase):
     """Тесты для CourseListView (каталог курсов)"""
     
     def setUp(self):
+        cache.clear()
         self.client = Client()
         self.instructor = User.objects.create_user(
             username='instructor',
@@ -77,6 +86,85 @@ class CourseListViewTest(TestCase):
         response = self.client.get(reverse('course_list') + '?q=django')
         self.assertContains(response, 'Django Basics')
         self.assertNotContains(response, 'Flask Tutorial')
+    
+    def test_catalog_query_uses_students_count(self):
+        """Тест: сортировка по популярности - по счётчику, без агрегации записей"""
+        cache.clear()
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(reverse('course_list') + '?sort=-students_count')
+        self.assertContains(response, 'Django Basics')
+        self.assertFalse(any('courses_enrollment' in q['sql'] for q in captured.captured_queries))
+    
+    def test_anonymous_catalog_served_from_cache(self):
+        """Тест: повторная страница каталога для анонима - без запросов к БД"""
+        url = reverse('course_list') + '?sort=-created_at&utm_source=mail'
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(reverse('course_list') + '?sort=-created_at')
+        self.assertEqual(len(captured), 0)
+        self.assertContains(response, 'Django Basics')
+    
+    def test_catalog_cache_invalidated(self):
+        """Тест: сохранение курса и изменение статистики сбрасывают кеш каталога"""
+        url = reverse('course_list')
+        self.client.get(url)
+        
+        self.course1.title = 'Django Advanced'
+        self.course1.save()
+        self.assertContains(self.client.get(url), 'Django Advanced')
+        
+        student = User.objects.create_user(username='student', password='testpass123')
+        Enrollment.objects.create(student=student, course=self.course2)
+        response = self.client.get(url + '?sort=-students_count')
+        self.assertEqual(response.context['courses'][0], self.course2)
+        
+        self.course2.status = 'draft'
+        self.course2.save()
+        self.assertNotContains(self.client.get(url), 'Flask Tutorial')
+    
+    def test_card_fragment_follows_category_and_instructor(self):
+        """Тест: карточка перерисовывается после переименования категории и преподавателя"""
+        url = reverse('course_list')
+        self.client.get(url)
+        
+        self.category.name = 'Python 3'
+        self.category.save()
+        self.assertContains(self.client.get(url), 'Python 3')
+        
+        self.instructor.first_name, self.instructor.last_name = 'Иван', 'Петров'
+        self.instructor.save()
+        self.course1.save()  # новая версия страницы; штамп курса тот же у course2
+        self.assertContains(self.client.get(url), 'Иван Петров', count=2)
+    
+    @override_settings(CATALOG_STATS_REFRESH=60)
+    def test_enrollments_refresh_catalog_at_most_once_per_interval(self):
+        """Тест: поток записей на курс не сбрасывает кеш каталога на каждую запись"""
+        url = reverse('course_list') + '?sort=-students_count'
+        self.client.get(url)
+        students = [User.objects.create_user(username=f'student{i}', password='testpass123')
+                    for i in range(2)]
+        
+        Enrollment.objects.create(student=students[0], course=self.course2)
+        self.assertEqual(self.client.get(url).context['courses'][0], self.course2)
+        
+        for course in (self.course1, self.course1):
+            Enrollment.objects.create(student=students.pop(), course=course)
+            with CaptureQueriesContext(connection) as captured:
+                self.client.get(url)
+            self.assertEqual(len(captured), 0)
+        
+        cache.delete(catalog.CATALOG_STATS_LOCK_KEY)  # окно истекло
+        self.assertEqual(self.client.get(url).context['courses'][0], self.course1)
+    
+    def test_enrolled_badge_not_shared_between_users(self):
+        """Тест: отметка "Записан" не попадает в кеш других пользователей"""
+        student = User.objects.create_user(username='student', password='testpass123')
+        Enrollment.objects.create(student=student, course=self.course1)
+        self.client.force_login(student)
+        self.assertContains(self.client.get(reverse('course_list')), 'Записан')
+        
+        self.client.logout()
+        self.assertNotContains(self.client.get(reverse('course_list')), 'Записан')
 
 
 class CourseDetailViewTest(TestCase):
@@ -225,6 +313,287 @@ class MyCoursesViewTest(TestCase):
         response = self.client.get(reverse('my_courses'))
         self.assertEqual(response.status_code, 200)
         self.assertContains(response, 'My Course')
+    
+    def create_course_with_lessons(self, title, lessons=3):
+        course = Course.objects.create(
+            title=title,
+            instructor=self.instructor,
+            status='published'
+        )
+        section = Section.objects.create(course=course, title='Раздел', order=1)
+        lessons = [
+            Lesson.objects.create(section=section, title=f'{title} {i}', order=i)
+            for i in range(lessons)
+        ]
+        enrollment = Enrollment.objects.create(student=self.student, course=course)
+        return enrollment, lessons
+    
+    def test_next_lesson_is_first_unfinished(self):
+        """Тест выбора следующего непройденного урока"""
+        enrollment, lessons = self.create_course_with_lessons('Resume')
+        LessonProgress.objects.create(enrollment=enrollment, lesson=lessons[0], completed=True)
+        LessonProgress.objects.create(enrollment=enrollment, lesson=lessons[1], completed=False)
+        self.client.login(username='student', password='testpass123')
+        
+        response = self.client.get(reverse('my_courses'))
+        data = {item['enrollment'].id: item['next_lesson'] for item in response.context['enrollments_data']}
+        self.assertEqual(data[enrollment.id], lessons[1])
+    
+    def test_next_lesson_falls_back_to_first_when_finished(self):
+        """Тест: если все уроки пройдены - предлагается первый урок"""
+        enrollment, lessons = self.create_course_with_lessons('Finished', lessons=2)
+        for lesson in lessons:
+            LessonProgress.objects.create(enrollment=enrollment, lesson=lesson, completed=True)
+        enrollment.completed = True
+        enrollment.progress_percentage = 100
+        enrollment.save()
+        self.client.login(username='student', password='testpass123')
+        
+        response = self.client.get(reverse('my_courses'))
+        data = {item['enrollment'].id: item['next_lesson'] for item in response.context['enrollments_data']}
+        self.assertEqual(data[enrollment.id], lessons[0])
+        self.assertEqual(response.context['completed_courses'], 1)
+        self.assertEqual(response.context['in_progress_courses'], 1)
+        self.assertEqual(response.context['avg_progress'], 50)
+    
+    def test_query_count_independent_of_enrollments(self):
+        """Тест: число запросов не зависит от количества курсов студента"""
+        self.client.login(username='student', password='testpass123')
+        self.create_course_with_lessons('First')
+        with CaptureQueriesContext(connection) as small:
+            self.client.get(reverse('my_courses'))
+        for i in range(5):
+            self.create_course_with_lessons(f'Course {i}')
+        with CaptureQueriesContext(connection) as large:
+            self.client.get(reverse('my_courses'))
+        self.assertEqual(len(small), len(large))
+
+
+class LessonViewTest(TestCase):
+    """Тесты для LessonView и структуры курса (courses/outline.py)"""
+    
+    def setUp(self):
+        cache.clear()
+        self.instructor = User.objects.create_user(
+            username='instructor',
+            password='testpass123'
+        )
+        self.student = User.objects.create_user(
+            username='student',
+            password='testpass123'
+        )
+        self.course = Course.objects.create(
+            title='Outline Course',
+            slug='outline-course',
+            instructor=self.instructor,
+            status='published'
+        )
+        self.section1 = Section.objects.create(course=self.course, title='Раздел 1', order=1)
+        self.section2 = Section.objects.create(course=self.course, title='Раздел 2', order=2)
+        self.lesson1 = Lesson.objects.create(section=self.section1, title='Урок 1', order=1)
+        self.lesson2 = Lesson.objects.create(section=self.section1, title='Урок 2', order=2)
+        self.lesson3 = Lesson.objects.create(section=self.section2, title='Урок 3', order=1)
+        Enrollment.objects.create(student=self.student, course=self.course)
+        self.client.login(username='student', password='testpass123')
+    
+    def get_lesson(self, lesson):
+        return self.client.get(reverse('lesson_view', kwargs={'lesson_id': lesson.id}))
+    
+    def test_previous_and_next_lesson_across_sections(self):
+        """Тест соседних уроков на границе разделов"""
+        response = self.get_lesson(self.lesson2)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['previous_lesson'].id, self.lesson1.id)
+        self.assertEqual(response.context['next_lesson'].id, self.lesson3.id)
+        
+        response = self.get_lesson(self.lesson1)
+        self.assertIsNone(response.context['previous_lesson'])
+    
+    def test_sidebar_lists_all_lessons(self):
+        """Тест боковой панели с программой курса"""
+        response = self.get_lesson(self.lesson1)
+        self.assertContains(response, 'Урок 2')
+        self.assertContains(response, 'Урок 3')
+    
+    def test_outline_cached_without_queries(self):
+        """Тест: повторное получение outline не обращается к БД"""
+        course = Course.objects.get(pk=self.course.pk)
+        get_course_outline(course)
+        with self.assertNumQueries(0):
+            outline = get_course_outline(course)
+        self.assertEqual([lesson.id for lesson in outline.lessons],
+                         [self.lesson1.id, self.lesson2.id, self.lesson3.id])
+    
+    def test_outline_invalidated_by_builder(self):
+        """Тест инвалидации outline при изменении структуры в конструкторе"""
+        self.get_lesson(self.lesson1)
+        
+        self.client.login(username='instructor', password='testpass123')
+        response = self.client.post(
+            reverse('api_lesson_create', kwargs={'section_id': self.section2.id}),
+            data=json.dumps({'title': 'Урок 4'}),
+            content_type='application/json'
+        )
+        new_lesson_id = response.json()['lesson_id']
+        
+        response = self.get_lesson(self.lesson3)
+        self.assertEqual(response.context['next_lesson'].id, new_lesson_id)
+        
+        self.client.post(reverse('api_lesson_delete', kwargs={'lesson_id': new_lesson_id}))
+        response = self.get_lesson(self.lesson3)
+        self.assertIsNone(response.context['next_lesson'])
+    
+    def test_step_reorder_invalidates_outline(self):
+        """Тест инвалидации outline при изменении порядка шагов"""
+        step1 = Step.objects.create(lesson=self.lesson1, order=0)
+        step2 = Step.objects.create(lesson=self.lesson1, order=1)
+        self.course.refresh_from_db()
+        self.assertEqual(get_course_outline(self.course).get_lesson(self.lesson1.id).step_ids,
+                         (step1.id, step2.id))
+        
+        self.client.login(username='instructor', password='testpass123')
+        self.client.post(
+            reverse('api_step_reorder', kwargs={'lesson_id': self.lesson1.id}),
+            data=json.dumps({'step_ids': [step2.id, step1.id]}),
+            content_type='application/json'
+        )
+        self.course.refresh_from_db()
+        self.assertEqual(get_course_outline(self.course).get_lesson(self.lesson1.id).step_ids,
+                         (step2.id, step1.id))
+    
+    def count_lesson_queries(self, lesson):
+        self.get_lesson(lesson)  # прогрев кеша outline и LessonProgress
+        with CaptureQueriesContext(connection) as queries:
+            response = self.get_lesson(lesson)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+    
+    def test_step_progress_read_in_single_query(self):
+        """Тест прогресса по шагам: без создания записей при просмотре"""
+        steps = [Step.objects.create(lesson=self.lesson1, order=i) for i in range(3)]
+        enrollment = Enrollment.objects.get(student=self.student, course=self.course)
+        StepProgress.objects.create(enrollment=enrollment, step=steps[1], completed=True)
+        
+        response = self.get_lesson(self.lesson1)
+        self.assertEqual(response.context['completed_step_ids'], {steps[1].id})
+        self.assertEqual(response.context['steps_progress_percent'], 33)
+        self.assertEqual(StepProgress.objects.filter(enrollment=enrollment).count(), 1)
+    
+    def test_lesson_query_budget_independent_of_step_count(self):
+        """Тест: число запросов урока не зависит от количества шагов"""
+        for i in range(3):
+            Step.objects.create(lesson=self.lesson1, order=i)
+        for i in range(30):
+            Step.objects.create(lesson=self.lesson2, order=i)
+        
+        small = self.count_lesson_queries(self.lesson1)
+        large = self.count_lesson_queries(self.lesson2)
+        self.assertEqual(small, large)
+        self.assertLessEqual(large, 12)
+    
+    def test_course_save_keeps_outline_version(self):
+        """Тест: сохранение устаревшего объекта курса не откатывает версию outline"""
+        stale_course = Course.objects.get(pk=self.course.pk)
+        Lesson.objects.create(section=self.section2, title='Урок 4', order=2)
+        stale_course.title = 'Новое название'
+        stale_course.save()
+        
+        self.course.refresh_from_db()
+        self.assertGreater(self.course.outline_version, stale_course.outline_version)
+        self.assertEqual(len(get_course_outline(self.course)), 4)
+    
+    def test_step_page_uses_public_content(self):
+        """Тест: страница урока не содержит правильных ответов"""
+        step = Step.objects.create(
+            lesson=self.lesson1, step_type='numeric',
+            content={'question': 'Сколько?', 'answer': 4242, 'tolerance': 0.5})
+        self.assertEqual(step.public_content, {'question': 'Сколько?', 'tolerance': 0.5})
+        
+        response = self.get_lesson(self.lesson1)
+        self.assertContains(response, 'Сколько?')
+        self.assertNotContains(response, '4242')
+        
+        step.content['answer'] = 7
+        step.content['question'] = 'Новый вопрос'
+        step.save(update_fields=['content'])
+        step.refresh_from_db()
+        self.assertEqual(step.public_content['question'], 'Новый вопрос')
+        self.assertNotIn('answer', step.public_content)
+
+
+class LessonBootstrapTest(TestCase):
+    """Тесты JSON-представления урока для клиентской навигации"""
+    
+    def setUp(self):
+        instructor = User.objects.create_user(username='instructor', password='testpass123')
+        self.student = User.objects.create_user(username='student', password='testpass123')
+        self.course = Course.objects.create(title='Bootstrap', slug='bootstrap', instructor=instructor)
+        section = Section.objects.create(course=self.course, title='Раздел')
+        self.lesson = Lesson.objects.create(section=section, title='Урок 1', order=0)
+        self.next_lesson = Lesson.objects.create(section=section, title='Урок 2', order=1)
+        Step.objects.create(lesson=self.lesson, step_type='text', order=0,
+                            content={'markdown': '# Заголовок'})
+        Step.objects.create(lesson=self.lesson, step_type='quiz_single', order=1,
+                            content={'question': 'Q', 'options': ['a', 'b'],
+                                     'correct_index': 1, 'explanation': 'потому что'})
+        Step.objects.create(lesson=self.lesson, step_type='code', order=2,
+                            content={'language': 'python', 'tests': [
+                                {'input': '1', 'expected_output': '1'}]})
+        self.enrollment = Enrollment.objects.create(student=self.student, course=self.course)
+        self.url = reverse('api_lesson_bootstrap', kwargs={'lesson_id': self.lesson.id})
+        self.client.login(username='student', password='testpass123')
+    
+    def test_answers_are_not_exposed(self):
+        """Тест: правильные ответы и тесты не попадают в ответ"""
+        data = self.client.get(self.url).json()
+        text, quiz, code = data['steps']
+        self.assertIn('<h1', text['content']['html'])
+        self.assertEqual(quiz['content']['options'], ['a', 'b'])
+        self.assertNotIn('correct_index', quiz['content'])
+        self.assertNotIn('explanation', quiz['content'])
+        self.assertNotIn('tests', code['content'])
+        self.assertEqual(data['navigation']['next_lesson']['id'], self.next_lesson.id)
+        self.assertEqual(data['current_step_id'], text['id'])
+    
+    def test_lesson_page_switches_steps_from_bootstrap(self):
+        """Тест: страница урока загружает данные шагов для переключения без перезагрузки"""
+        response = self.client.get(reverse('lesson_view', kwargs={'lesson_id': self.lesson.id}))
+        self.assertContains(response, f'data-bootstrap-url="{self.url}"')
+        for step in self.lesson.steps.all():
+            self.assertContains(response, f'data-step-id="{step.id}"')
+        data = self.client.get(self.url).json()
+        self.assertEqual(data['course']['url'],
+                         reverse('course_detail', kwargs={'slug': self.course.slug}))
+    
+    def test_progress_and_current_step(self):
+        """Тест: текущий шаг - первый непройденный"""
+        text = self.lesson.steps.get(order=0)
+        StepProgress.objects.create(enrollment=self.enrollment, step=text, completed=True)
+        data = self.client.get(self.url).json()
+        self.assertTrue(data['steps'][0]['completed'])
+        self.assertEqual(data['current_step_id'], data['steps'][1]['id'])
+        self.assertEqual(data['progress']['steps_completed'], 1)
+    
+    def test_not_enrolled_forbidden(self):
+        """Тест: без записи на курс урок недоступен"""
+        User.objects.create_user(username='other', password='testpass123')
+        self.client.login(username='other', password='testpass123')
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+    
+    def test_query_count_independent_of_steps(self):
+        """Тест: число запросов не зависит от количества шагов"""
+        self.client.get(self.url)  # прогрев outline
+        with CaptureQueriesContext(connection) as few:
+            self.client.get(self.url)
+        Step.objects.bulk_create(
+            Step(lesson=self.lesson, step_type='numeric', order=3 + i,
+                 content={'question': str(i), 'answer': i})
+            for i in range(30)
+        )
+        with CaptureQueriesContext(connection) as many:
+            data = self.client.get(self.url).json()
+        self.assertEqual(len(data['steps']), 33)
+        self.assertEqual(len(few), len(many))
 
 
 class InstructorCoursesViewTest(TestCase):
@@ -263,6 +632,20 @@ class InstructorCoursesViewTest(TestCase):
         response = self.client.get(reverse('instructor_courses'))
         self.assertContains(response, 'My Course')
         self.assertNotContains(response, 'Other Course')
+    
+    def test_instructor_stats_from_counters(self):
+        """Тест: статистика преподавателя - из students_count, без JOIN записей"""
+        student = User.objects.create_user(username='student', password='testpass123')
+        Enrollment.objects.create(student=student, course=self.course1)
+        self.client.login(username='instructor', password='testpass123')
+        
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(reverse('instructor_courses'))
+        self.assertEqual(response.context['total_courses'], 1)
+        self.assertEqual(response.context['published_courses'], 0)
+        self.assertEqual(response.context['draft_courses'], 1)
+        self.assertEqual(response.context['total_students'], 1)
+        self.assertFalse(any('courses_enrollment' in q['sql'] for q in captured.captured_queries))
 
 
 class ReviewViewsTest(TestCase):
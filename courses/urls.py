@@ -91,6 +91,12 @@ urlpatterns = [
          views.StepCheckAnswerView.as_view(), name='api_step_check'),
     path('api/step/<int:step_id>/complete/',
          views.StepCompleteView.as_view(), name='api_step_complete'),
+    path('api/lesson/<int:lesson_id>/bootstrap/',
+         views.LessonBootstrapView.as_view(), name='api_lesson_bootstrap'),
+    path('api/lesson/<int:lesson_id>/check/',
+         views.LessonCheckAnswersView.as_view(), name='api_lesson_check'),
+    path('api/code/<uuid:job_id>/',
+         views.CodeSubmissionStatusView.as_view(), name='api_code_submission'),
 
     # Преподаватель - Курсы
     path('instructor/', views.InstructorCoursesView.as_view(),
@@ -124,6 +130,10 @@ urlpatterns = [
     path('instructor/media/<int:media_id>/url/',
          views.MediaGetUrlView.as_view(), name='media_get_url'),
 
+    # Профилирование SQL (staff)
+    path('instructor/sql-profile/',
+         views.SQLProfileView.as_view(), name='sql_profile'),
+
     # Отзывы и рейтинги
     path('<slug:slug>/reviews/',
          views.CourseReviewsView.as_view(), name='course_reviews'),
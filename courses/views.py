@@ -4,27 +4,33 @@ from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
-from django.db.models import Avg, Count, Q
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Prefetch, Q, Sum
+from django.db.models.functions import Coalesce
 from django.http import HttpResponse, JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
 from django.template.loader import render_to_string
 from django.urls import reverse, reverse_lazy
 from django.utils import timezone
-from django.views.generic import (CreateView, DeleteView, DetailView, ListView,
-                                  UpdateView, View)
+from django.views.generic import (CreateView, DeleteView, DetailView, FormView,
+                                  ListView, UpdateView, View)
 
 # Импорт AJAX views для Step (шаги уроков)
 # Импорт AJAX views для course builder
-from .ajax_views import (CourseBuilderView, CoursePublishAjaxView,
-                         CourseUnpublishAjaxView, CourseUpdateAjaxView,
-                         LessonCreateAjaxView, LessonDeleteAjaxView,
-                         LessonGetAjaxView, LessonUpdateAjaxView,
-                         SectionCreateAjaxView, SectionDeleteAjaxView,
+from .ajax_views import (CodeSubmissionStatusView, CourseBuilderView,
+                         CoursePublishAjaxView, CourseUnpublishAjaxView,
+                         CourseUpdateAjaxView, LessonBootstrapView,
+                         LessonCheckAnswersView, LessonCreateAjaxView,
+                         LessonDeleteAjaxView, LessonGetAjaxView,
+                         LessonUpdateAjaxView, SectionCreateAjaxView,
+                         SectionDeleteAjaxView,
                          SectionUpdateAjaxView, StepCheckAnswerView,
                          StepCompleteView, StepCreateAjaxView,
                          StepDeleteAjaxView, StepDuplicateAjaxView,
                          StepGetAjaxView, StepListAjaxView,
                          StepReorderAjaxView, StepUpdateAjaxView)
+from .catalog import get_categories, page_cache_key
 from .forms import (CheckoutForm, CourseForm, CourseMediaEditForm,
                     CourseMediaUploadForm, CoursePublishForm,
                     LessonCommentForm, LessonForm, PromoCodeForm,
@@ -34,6 +40,11 @@ from .models import (Category, Certificate, Course, CourseMedia, Enrollment,
                      Lesson, LessonComment, LessonProgress, Payment,
                      PaymentMethod, PromoCode, Purchase, Refund, Review,
                      Section, Step, StepProgress)
+from .outline import get_course_outline
+from .profiling import load_report
+from .progress import (annotate_next_lesson, complete_lesson, resume_learning,
+                       student_stats)
+from .search import search_courses
 
 
 class CourseListView(ListView):
@@ -46,20 +57,16 @@ class CourseListView(ListView):
     paginate_by = 12
 
     def get_queryset(self):
+        # Число студентов - поддерживаемый счётчик students_count (courses/stats.py),
+        # без JOIN и GROUP BY по записям на курс
         queryset = Course.objects.filter(status='published').exclude(slug='').select_related(
             'instructor', 'category'
-        ).annotate(
-            enrollments_count=Count('enrollments')
         )
 
-        # Поиск
-        search_query = self.request.GET.get('q')
+        # Поиск (полнотекстовый индекс, см. courses/search.py)
+        search_query = self.request.GET.get('q', '').strip()
         if search_query:
-            queryset = queryset.filter(
-                Q(title__icontains=search_query) |
-                Q(description__icontains=search_query) |
-                Q(subtitle__icontains=search_query)
-            )
+            queryset = search_courses(queryset, search_query)
 
         # Фильтр по категории
         category_slug = self.request.GET.get('category')
@@ -78,30 +85,61 @@ class CourseListView(ListView):
         elif price_filter == 'paid':
             queryset = queryset.filter(is_free=False)
 
-        # Сортировка
-        sort_by = self.request.GET.get('sort', '-created_at')
+        # Сортировка (при поиске без явной сортировки - по релевантности)
+        sort_by = self.request.GET.get('sort', '' if search_query else '-created_at')
         valid_sorts = ['-created_at', 'price', '-price',
                        '-average_rating', '-students_count']
         if sort_by in valid_sorts:
             queryset = queryset.order_by(sort_by)
 
+        # Ограничение выдачи поиска - после всех фильтров
+        if search_query:
+            queryset = queryset[:settings.COURSE_SEARCH_MAX_RESULTS]
+
         return queryset
 
+    def get(self, request, *args, **kwargs):
+        # Анонимным пользователям - страница результатов из кеша (courses/catalog.py)
+        self.results_cache_key = None
+        if not request.user.is_authenticated:
+            self.results_cache_key = page_cache_key(request.GET)
+            results_html = cache.get(self.results_cache_key)
+            if results_html is not None:
+                return render(request, self.template_name, {
+                    **self.get_filter_context(), 'results_html': results_html,
+                })
+        return super().get(request, *args, **kwargs)
+
+    def get_filter_context(self):
+        search_query = self.request.GET.get('q', '')
+        return {
+            'categories': get_categories(),
+            'current_category': self.request.GET.get('category', ''),
+            'current_level': self.request.GET.get('level', ''),
+            'current_price': self.request.GET.get('price', ''),
+            'search_query': search_query,
+            'sort_by': self.request.GET.get('sort', '' if search_query else '-created_at'),
+        }
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['categories'] = Category.objects.all()
-        context['current_category'] = self.request.GET.get('category', '')
-        context['current_level'] = self.request.GET.get('level', '')
-        context['current_price'] = self.request.GET.get('price', '')
-        context['search_query'] = self.request.GET.get('q', '')
-        context['sort_by'] = self.request.GET.get('sort', '-created_at')
+        context.update(self.get_filter_context())
+        context['catalog_cache_timeout'] = settings.CATALOG_CACHE_TIMEOUT
 
         # Статистика для студента
+        my_enrollments = set()
         if self.request.user.is_authenticated:
-            context['my_enrollments'] = Enrollment.objects.filter(
+            my_enrollments = set(Enrollment.objects.filter(
                 student=self.request.user
-            ).values_list('course_id', flat=True)
-
+            ).values_list('course_id', flat=True))
+        context['my_enrollments'] = my_enrollments
+        for course in context['courses']:
+            course.is_enrolled = course.id in my_enrollments
+
+        if self.results_cache_key:
+            context['results_html'] = render_to_string(
+                'courses/catalog/_results.html', context, self.request)
+            cache.set(self.results_cache_key, context['results_html'], settings.CATALOG_CACHE_TIMEOUT)
         return context
 
 
@@ -142,16 +180,11 @@ class CourseDetailView(DetailView):
         # Отзывы
         context['reviews'] = course.reviews.filter(
             is_approved=True).select_related('student')[:10]
-        context['reviews_count'] = course.reviews.filter(
-            is_approved=True).count()
 
-        # Статистика рейтинга
-        rating_stats = course.reviews.filter(is_approved=True).aggregate(
-            avg_rating=Avg('rating'),
-            total_reviews=Count('id')
-        )
-        context['avg_rating'] = rating_stats['avg_rating'] or 0
-        context['total_reviews'] = rating_stats['total_reviews']
+        # Статистика рейтинга (поддерживается courses/stats.py)
+        context['reviews_count'] = course.total_reviews
+        context['avg_rating'] = course.average_rating
+        context['total_reviews'] = course.total_reviews
 
         # Проверка записи пользователя
         if self.request.user.is_authenticated:
@@ -201,10 +234,7 @@ class CourseEnrollView(LoginRequiredMixin, View):
         )
 
         if created:
-            # Увеличиваем счетчик студентов
-            course.students_count += 1
-            course.save(update_fields=['students_count'])
-
+            # students_count обновляется сигналом (courses/stats.py)
             messages.success(
                 request,
                 f'Вы успешно записались на курс "{course.title}"!'
@@ -228,64 +258,23 @@ class MyCoursesView(LoginRequiredMixin, ListView):
     paginate_by = 10
 
     def get_queryset(self):
-        return Enrollment.objects.filter(
-            student=self.request.user
-        ).select_related(
-            'course__instructor', 'course__category'
-        ).prefetch_related(
-            'course__sections__lessons',
-            'lesson_progress'
+        return annotate_next_lesson(
+            Enrollment.objects.filter(
+                student=self.request.user
+            ).select_related(
+                'course__instructor', 'course__category', 'certificate'
+            )
         ).order_by('-enrolled_at')
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
 
-        # Статистика студента
-        enrollments = self.get_queryset()
-        context['total_courses'] = enrollments.count()
-        context['completed_courses'] = enrollments.filter(
-            completed=True).count()
-        context['in_progress_courses'] = enrollments.filter(
-            completed=False).count()
-
-        # Средний прогресс
-        if context['total_courses'] > 0:
-            total_progress = sum(e.progress_percentage for e in enrollments)
-            context['avg_progress'] = total_progress / context['total_courses']
-        else:
-            context['avg_progress'] = 0
-
-        # Для каждого enrollment найти следующий непройденный урок
-        enrollments_with_next_lesson = []
-        for enrollment in context['enrollments']:
-            # Получить все уроки курса в правильном порядке
-            all_lessons = Lesson.objects.filter(
-                section__course=enrollment.course
-            ).order_by('section__order', 'order')
-
-            # Получить ID пройденных уроков
-            completed_lesson_ids = set(
-                enrollment.lesson_progress.filter(
-                    completed=True).values_list('lesson_id', flat=True)
-            )
-
-            # Найти первый непройденный урок
-            next_lesson = None
-            for lesson in all_lessons:
-                if lesson.id not in completed_lesson_ids:
-                    next_lesson = lesson
-                    break
-
-            # Если все уроки пройдены, показать первый урок
-            if next_lesson is None and all_lessons.exists():
-                next_lesson = all_lessons.first()
-
-            enrollments_with_next_lesson.append({
-                'enrollment': enrollment,
-                'next_lesson': next_lesson,
-            })
+        # Статистика студента (один aggregate-запрос)
+        context.update(student_stats(self.request.user))
 
-        context['enrollments_data'] = enrollments_with_next_lesson
+        # Следующий непройденный урок для каждой записи на странице
+        # (вычислен подзапросом в get_queryset, уроки - одним запросом)
+        context['enrollments_data'] = resume_learning(context['enrollments'])
 
         return context
 
@@ -304,8 +293,8 @@ class LessonView(LoginRequiredMixin, DetailView):
         return Lesson.objects.select_related(
             'section__course__instructor'
         ).prefetch_related(
-            'section__lessons',
-            'steps'  # Prefetch steps for Step-based lessons
+            # Студенту нужна только публичная проекция контента шагов
+            Prefetch('steps', queryset=Step.objects.defer('content'))
         )
 
     def get_context_data(self, **kwargs):
@@ -317,43 +306,32 @@ class LessonView(LoginRequiredMixin, DetailView):
         context['course'] = course
         context['section'] = lesson.section
 
+        # Запись на курс (один запрос, используется ниже повторно)
+        enrollment = Enrollment.objects.filter(
+            student=self.request.user,
+            course=course
+        ).first()
+        is_instructor = course.instructor == self.request.user
+
         # Проверка доступа
         if not lesson.is_preview:
             # Только для записанных студентов или преподавателя
-            is_enrolled = Enrollment.objects.filter(
-                student=self.request.user,
-                course=course
-            ).exists()
-            is_instructor = course.instructor == self.request.user
-
-            if not (is_enrolled or is_instructor):
+            if not (enrollment or is_instructor):
                 messages.error(
                     self.request,
                     'Запишитесь на курс для просмотра этого урока.'
                 )
                 return context
 
-        # Все разделы и уроки для навигации
-        context['sections'] = course.sections.prefetch_related('lessons').all()
-
-        # Предыдущий и следующий урок
-        all_lessons = Lesson.objects.filter(
-            section__course=course
-        ).order_by('section__order', 'order')
-
-        lesson_list = list(all_lessons)
-        current_index = lesson_list.index(lesson)
-
-        context['previous_lesson'] = lesson_list[current_index -
-                                                 1] if current_index > 0 else None
-        context['next_lesson'] = lesson_list[current_index +
-                                             1] if current_index < len(lesson_list) - 1 else None
+        # Разделы, уроки и соседние уроки - из закешированной структуры курса
+        outline = get_course_outline(course)
+        context['outline'] = outline
+        context['sections'] = outline.sections
+        context['previous_lesson'] = outline.previous_lesson(lesson.id)
+        context['next_lesson'] = outline.next_lesson(lesson.id)
 
         # Прогресс урока
-        enrollment = None
-        if Enrollment.objects.filter(student=self.request.user, course=course).exists():
-            enrollment = Enrollment.objects.get(
-                student=self.request.user, course=course)
+        if enrollment:
             lesson_progress, _ = LessonProgress.objects.get_or_create(
                 enrollment=enrollment,
                 lesson=lesson
@@ -365,63 +343,56 @@ class LessonView(LoginRequiredMixin, DetailView):
         # ============================================================
         # STEP-BASED CONTENT (Шаги урока)
         # ============================================================
-        steps = lesson.steps.all().order_by('order')
+        # Шаги уже загружены prefetch_related('steps') в get_queryset
+        steps = list(lesson.steps.all())
         context['steps'] = steps
-        context['has_steps'] = steps.exists()
-        context['steps_count'] = steps.count()
+        context['has_steps'] = bool(steps)
+        context['steps_count'] = len(steps)
 
         # Получить текущий шаг (из GET параметра или первый)
-        current_step_id = self.request.GET.get('step')
         current_step = None
         current_step_index = 0
 
-        if steps.exists():
+        if steps:
+            current_step = steps[0]
+            current_step_id = self.request.GET.get('step')
             if current_step_id:
-                try:
-                    current_step = steps.get(id=current_step_id)
-                    current_step_index = list(steps).index(current_step)
-                except Step.DoesNotExist:
-                    current_step = steps.first()
-                    current_step_index = 0
-            else:
-                current_step = steps.first()
-                current_step_index = 0
+                for index, step in enumerate(steps):
+                    if str(step.id) == current_step_id:
+                        current_step, current_step_index = step, index
+                        break
 
         context['current_step'] = current_step
         context['current_step_index'] = current_step_index
 
         # Предыдущий и следующий шаг
-        step_list = list(steps)
         if current_step:
-            context['previous_step'] = step_list[current_step_index -
-                                                 1] if current_step_index > 0 else None
-            context['next_step'] = step_list[current_step_index +
-                                             1] if current_step_index < len(step_list) - 1 else None
-
-        # Прогресс по шагам
-        if enrollment and steps.exists():
-            step_progress_dict = {}
-            completed_steps = 0
-
-            for step in steps:
-                progress, _ = StepProgress.objects.get_or_create(
+            context['previous_step'] = steps[current_step_index -
+                                             1] if current_step_index > 0 else None
+            context['next_step'] = steps[current_step_index +
+                                         1] if current_step_index < len(steps) - 1 else None
+
+        # Прогресс по шагам: один запрос, недостающие записи StepProgress
+        # не создаются - они появляются при первом ответе/отметке шага
+        if enrollment and steps:
+            step_progress_dict = {
+                progress.step_id: progress
+                for progress in StepProgress.objects.filter(
                     enrollment=enrollment,
-                    step=step,
-                    defaults={'status': 'not_started'}
+                    step__lesson=lesson
                 )
-                step_progress_dict[step.id] = progress
-                if progress.completed:
-                    completed_steps += 1
+            }
+            completed_step_ids = {
+                step_id for step_id, progress in step_progress_dict.items()
+                if progress.completed
+            }
+            completed_steps = len(completed_step_ids)
 
             context['step_progress'] = step_progress_dict
+            context['completed_step_ids'] = completed_step_ids
             context['completed_steps'] = completed_steps
-
-            # Прогресс в процентах
-            if steps.count() > 0:
-                context['steps_progress_percent'] = round(
-                    (completed_steps / steps.count()) * 100)
-            else:
-                context['steps_progress_percent'] = 0
+            context['steps_progress_percent'] = round(
+                (completed_steps / len(steps)) * 100)
 
             # Прогресс текущего шага
             if current_step:
@@ -438,10 +409,7 @@ class LessonView(LoginRequiredMixin, DetailView):
         context['comment_form'] = LessonCommentForm()
 
         # Проверка: можно ли оставлять комментарии
-        is_enrolled = Enrollment.objects.filter(
-            student=self.request.user, course=course).exists()
-        is_instructor = course.instructor == self.request.user
-        context['can_comment'] = is_enrolled or is_instructor
+        context['can_comment'] = bool(enrollment) or is_instructor
 
         return context
 
@@ -452,7 +420,8 @@ class LessonCompleteView(LoginRequiredMixin, View):
     """
 
     def post(self, request, lesson_id):
-        lesson = get_object_or_404(Lesson, id=lesson_id)
+        lesson = get_object_or_404(
+            Lesson.objects.select_related('section__course'), id=lesson_id)
         course = lesson.section.course
 
         # Проверка записи на курс
@@ -465,48 +434,42 @@ class LessonCompleteView(LoginRequiredMixin, View):
             messages.error(request, 'Вы не записаны на этот курс.')
             return redirect('course_detail', slug=course.slug)
 
-        # Отметить урок как пройденный
-        lesson_progress, created = LessonProgress.objects.get_or_create(
-            enrollment=enrollment,
-            lesson=lesson
-        )
-
-        if not lesson_progress.completed:
-            lesson_progress.completed = True
-            lesson_progress.completed_at = timezone.now()
-            lesson_progress.save()
-
-            # Обновить прогресс курса
-            total_lessons = Lesson.objects.filter(
-                section__course=course).count()
-            completed_lessons = LessonProgress.objects.filter(
+        # Отметить урок как пройденный (счётчики обновляются инкрементально)
+        with transaction.atomic():
+            lesson_progress, created = LessonProgress.objects.get_or_create(
                 enrollment=enrollment,
-                completed=True
-            ).count()
-
-            enrollment.progress_percentage = (
-                completed_lessons / total_lessons) * 100 if total_lessons > 0 else 0
-
-            # Проверка завершения курса
-            if enrollment.progress_percentage >= 100:
-                enrollment.completed = True
-                enrollment.completed_at = timezone.now()
-
-                # Автоматически выдать сертификат
-                if not hasattr(enrollment, 'certificate'):
-                    Certificate.objects.create(enrollment=enrollment)
-                    messages.success(
-                        request,
-                        f'🎉 Поздравляем! Вы завершили курс "{course.title}" и получили сертификат!'
-                    )
-                else:
-                    messages.success(
-                        request,
-                        f'🎉 Поздравляем! Вы завершили курс "{course.title}"!'
-                    )
-
-            enrollment.save()
+                lesson=lesson
+            )
+            total_lessons = len(get_course_outline(course))
+            newly_completed = complete_lesson(
+                enrollment, lesson_progress, total_lessons)
+
+            if newly_completed:
+                update_fields = ['progress_percentage']
+
+                # Проверка завершения курса
+                if enrollment.progress_percentage >= 100 and not enrollment.completed:
+                    enrollment.completed = True
+                    enrollment.completed_at = timezone.now()
+                    update_fields += ['completed', 'completed_at']
+
+                    # Автоматически выдать сертификат
+                    if not hasattr(enrollment, 'certificate'):
+                        Certificate.objects.create(enrollment=enrollment)
+                        messages.success(
+                            request,
+                            f'🎉 Поздравляем! Вы завершили курс "{course.title}" и получили сертификат!'
+                        )
+                    else:
+                        messages.success(
+                            request,
+                            f'🎉 Поздравляем! Вы завершили курс "{course.title}"!'
+                        )
+
+                # Только вычисленные поля - счётчики уже обновлены F()-выражениями
+                enrollment.save(update_fields=update_fields)
 
+        if newly_completed:
             messages.success(
                 request, f'Урок "{lesson.title}" отмечен как пройденный.')
 
@@ -534,20 +497,18 @@ class InstructorCoursesView(LoginRequiredMixin, ListView):
     def get_queryset(self):
         return Course.objects.filter(
             instructor=self.request.user
-        ).annotate(
-            enrollments_count=Count('enrollments')
         ).order_by('-created_at')
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        courses = self.get_queryset()
 
-        # Статистика преподавателя
-        context['total_courses'] = courses.count()
-        context['published_courses'] = courses.filter(
-            status='published').count()
-        context['draft_courses'] = courses.filter(status='draft').count()
-        context['total_students'] = sum(c.students_count for c in courses)
+        # Статистика преподавателя одним aggregate() по счётчикам курсов
+        context.update(Course.objects.filter(instructor=self.request.user).aggregate(
+            total_courses=Count('id'),
+            published_courses=Count('id', filter=Q(status='published')),
+            draft_courses=Count('id', filter=Q(status='draft')),
+            total_students=Coalesce(Sum('students_count'), 0),
+        ))
 
         return context
 
@@ -755,27 +716,12 @@ class ReviewCreateView(LoginRequiredMixin, CreateView):
         form.instance.course = self.course
         form.instance.student = self.request.user
 
+        # Рейтинг курса обновляется сигналом (courses/stats.py)
         response = super().form_valid(form)
 
-        # Обновить средний рейтинг курса
-        self._update_course_rating()
-
         messages.success(self.request, 'Спасибо за ваш отзыв!')
         return response
 
-    def _update_course_rating(self):
-        """Обновить средний рейтинг и количество отзывов курса"""
-        stats = Review.objects.filter(
-            course=self.course,
-            is_approved=True
-        ).aggregate(
-            avg_rating=Avg('rating'),
-            total_reviews=Count('id')
-        )
-        self.course.average_rating = stats['avg_rating'] or 0
-        self.course.total_reviews = stats['total_reviews']
-        self.course.save(update_fields=['average_rating', 'total_reviews'])
-
     def get_success_url(self):
         return reverse('course_detail', kwargs={'slug': self.course.slug})
 
@@ -799,28 +745,12 @@ class ReviewUpdateView(LoginRequiredMixin, UpdateView):
         return context
 
     def form_valid(self, form):
+        # Рейтинг курса обновляется сигналом (courses/stats.py)
         response = super().form_valid(form)
 
-        # Обновить средний рейтинг курса
-        self._update_course_rating()
-
         messages.success(self.request, 'Ваш отзыв обновлен!')
         return response
 
-    def _update_course_rating(self):
-        """Обновить средний рейтинг и количество отзывов курса"""
-        course = self.object.course
-        stats = Review.objects.filter(
-            course=course,
-            is_approved=True
-        ).aggregate(
-            avg_rating=Avg('rating'),
-            total_reviews=Count('id')
-        )
-        course.average_rating = stats['avg_rating'] or 0
-        course.total_reviews = stats['total_reviews']
-        course.save(update_fields=['average_rating', 'total_reviews'])
-
     def get_success_url(self):
         return reverse('course_detail', kwargs={'slug': self.object.course.slug})
 
@@ -841,23 +771,11 @@ class ReviewDeleteView(LoginRequiredMixin, DeleteView):
         context['course'] = self.object.course
         return context
 
-    def delete(self, request, *args, **kwargs):
-        course = self.get_object().course
-        response = super().delete(request, *args, **kwargs)
-
-        # Обновить средний рейтинг курса
-        stats = Review.objects.filter(
-            course=course,
-            is_approved=True
-        ).aggregate(
-            avg_rating=Avg('rating'),
-            total_reviews=Count('id')
-        )
-        course.average_rating = stats['avg_rating'] or 0
-        course.total_reviews = stats['total_reviews']
-        course.save(update_fields=['average_rating', 'total_reviews'])
+    def form_valid(self, form):
+        # Рейтинг курса обновляется сигналом (courses/stats.py)
+        response = super().form_valid(form)
 
-        messages.success(request, 'Ваш отзыв удален.')
+        messages.success(self.request, 'Ваш отзыв удален.')
         return response
 
     def get_success_url(self):
@@ -884,26 +802,16 @@ class CourseReviewsView(ListView):
         context = super().get_context_data(**kwargs)
         context['course'] = self.course
 
-        # Статистика рейтинга
-        stats = Review.objects.filter(
-            course=self.course,
-            is_approved=True
-        ).aggregate(
-            avg_rating=Avg('rating'),
-            total_reviews=Count('id')
+        # Статистика рейтинга (поддерживается courses/stats.py)
+        context['avg_rating'] = self.course.average_rating
+        context['total_reviews'] = self.course.total_reviews
+
+        # Распределение оценок (один GROUP BY)
+        rating_distribution = dict.fromkeys(range(1, 6), 0)
+        rating_distribution.update(
+            Review.objects.filter(course=self.course, is_approved=True)
+            .order_by().values_list('rating').annotate(count=Count('id'))
         )
-        context['avg_rating'] = stats['avg_rating'] or 0
-        context['total_reviews'] = stats['total_reviews']
-
-        # Распределение оценок
-        rating_distribution = {}
-        for i in range(1, 6):
-            count = Review.objects.filter(
-                course=self.course,
-                is_approved=True,
-                rating=i
-            ).count()
-            rating_distribution[i] = count
         context['rating_distribution'] = rating_distribution
 
         # Проверка: пользователь записан и может оставить отзыв
@@ -1411,11 +1319,10 @@ class PurchaseHistoryView(LoginRequiredMixin, ListView):
         return context
 
 
-class RefundRequestView(LoginRequiredMixin, CreateView):
+class RefundRequestView(LoginRequiredMixin, FormView):
     """
     Запрос на возврат денежных средств
     """
-    model = Refund
     form_class = RefundRequestForm
     template_name = 'courses/payments/refund_request.html'
 
@@ -1432,14 +1339,19 @@ class RefundRequestView(LoginRequiredMixin, CreateView):
         return super().dispatch(request, *args, **kwargs)
 
     def form_valid(self, form):
-        refund = form.save(commit=False)
-        refund.purchase = self.purchase
-        refund.student = self.request.user
-        refund.refund_amount = self.purchase.total_amount
-        refund.save()
+        # RefundRequestForm - обычная форма: причина и подробности в одном поле
+        reason = dict(form.fields['reason'].choices)[form.cleaned_data['reason']]
+        if form.cleaned_data['details']:
+            reason = f"{reason}\n\n{form.cleaned_data['details']}"
+        Refund.objects.create(
+            purchase=self.purchase,
+            student=self.request.user,
+            reason=reason,
+            refund_amount=self.purchase.total_amount,
+        )
 
         messages.success(
-            request, 'Ваш запрос на возврат отправлен. Мы свяжемся с вами в течение 3-5 дней.')
+            self.request, 'Ваш запрос на возврат отправлен. Мы свяжемся с вами в течение 3-5 дней.')
         return redirect('purchase_history')
 
     def get_context_data(self, **kwargs):
@@ -1693,3 +1605,28 @@ class MediaGetUrlView(LoginRequiredMixin, View):
             'markdown': media.markdown_embed,
             'html': media.html_embed,
         })
+
+
+# ============================================================
+# SQL PROFILING (только staff)
+# ============================================================
+
+class SQLProfileView(LoginRequiredMixin, UserPassesTestMixin, View):
+    """
+    Отчёт профилирования SQL по URL (courses/profiling.py)
+    ?format=json - тот же отчёт в JSON
+    """
+    template_name = 'courses/instructor/sql_profile.html'
+
+    def test_func(self):
+        return self.request.user.is_staff
+
+    def get(self, request):
+        report = load_report()
+        if request.GET.get('format') == 'json':
+            return JsonResponse(report, json_dumps_params={'ensure_ascii': False})
+        return render(request, self.template_name, {
+            'report': report,
+            'enabled': settings.SQL_PROFILING_ENABLED,
+            'sample_rate': settings.SQL_PROFILING_SAMPLE_RATE,
+        })